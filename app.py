@@ -1,30 +1,218 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify, g, has_request_context, make_response
+from flask import Response, stream_with_context, abort, before_render_template, template_rendered
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from functools import wraps
 import os
-from datetime import datetime
-import razorpay
-import markdown
-import os
+from datetime import datetime, timedelta
 from pathlib import Path
 import secrets
+import re
+import logging
+import math
+import sys
+import click
+import json
+import base64
+import binascii
+import hashlib
+import csv
+import io
+import itertools
+import zipfile
+import pickle
+import shutil
+import signal
+import socket
+import threading
+import time
+import sqlite3
+from collections import Counter, OrderedDict
+from flask_sqlalchemy.session import Session as SessionBase
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Application factory
+# create_app() builds the Flask app; routes, hooks and CLI commands live on the
+# `main` blueprint and each section registers its own config defaults with
+# @main.record_once, read from the environment when the app is created.
+# Importing this module does no I/O: the schema is created and migrated by
+# `flask init-db`, and the payment client and Markdown renderer are built on
+# first use. warm_up() does that work ahead of time in a preloading master
+# (see gunicorn.conf.py) so forked workers start warm.
+class RoutingSession(SessionBase):
+    """Sends plain SELECTs to the replica bind while the request allows it (see replica_reads)"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and getattr(clause, 'is_select', False)
+                and clause._for_update_arg is None and reads_from_replica()):
+            db_routing_stats['replica_reads'] += 1
+            g.used_replica = True
+            return self._db.engines['replica']
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+main = Blueprint('main', __name__, cli_group=None)
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///odbyte.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config or {})
+    configure_engines(app.config)
+    configure_logging()
+    
+    db.init_app(app)
+    app.register_blueprint(main)
+    if app.config['TRUSTED_PROXY_COUNT']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+    return app
+
+def warm_up(app):
+    """Do the lazy first-use work now, in a master process that workers fork from"""
+    with app.app_context():
+        get_payment_service()
+        get_blog_index().refresh(force=True)
+        search_backend()
+        precompile_templates(app)
+        # Never hand pooled connections to forked children
+        for engine in db.engines.values():
+            engine.dispose()
+    return app
+
+# Database engines
+# configure_engines() sizes the connection pool per deployment (DB_POOL_SIZE,
+# DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE), pre-pings connections
+# that sat idle and caps statement time on Postgres at DB_STATEMENT_TIMEOUT ms
+# (run the worker or long maintenance commands with DB_STATEMENT_TIMEOUT=0).
+# SQLite connections switch to WAL so readers never wait on the writer.
+#
+# With DATABASE_REPLICA_URL set, the views marked @replica_reads serve their
+# plain SELECTs from the 'replica' bind. Flushes, DML and SELECT ... FOR UPDATE
+# always go to the primary, as does every read after the request has written.
+# A request that writes pins that browser to the primary for
+# REPLICA_STICKY_SECONDS, so it reads its own writes however far the replica lags.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+}
+
+db_routing_stats = {'replica_reads': 0, 'sticky_requests': 0, 'sticky_writes': 0}
+
+def database_url(url):
+    # Fix for PostgreSQL URI
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+def engine_options(url, config):
+    options = {'pool_pre_ping': True}
+    url = db.make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # One shared in-memory connection; there is no pool to size
+        return options
+    options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                   pool_timeout=config['DB_POOL_TIMEOUT'], pool_recycle=config['DB_POOL_RECYCLE'])
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT']:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}"}
+    return options
+
+def configure_engines(config):
+    """Fill in pool options and the replica bind; runs before db.init_app() builds the engines"""
+    config.setdefault('DB_POOL_SIZE', int(os.environ.get('DB_POOL_SIZE', 5)))
+    config.setdefault('DB_MAX_OVERFLOW', int(os.environ.get('DB_MAX_OVERFLOW', 10)))
+    config.setdefault('DB_POOL_TIMEOUT', float(os.environ.get('DB_POOL_TIMEOUT', 10)))
+    config.setdefault('DB_POOL_RECYCLE', int(os.environ.get('DB_POOL_RECYCLE', 1800)))
+    config.setdefault('DB_STATEMENT_TIMEOUT', int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000)))
+    config.setdefault('DATABASE_REPLICA_URL', os.environ.get('DATABASE_REPLICA_URL'))
+    config.setdefault('REPLICA_STICKY_SECONDS', int(os.environ.get('REPLICA_STICKY_SECONDS', 10)))
+    
+    config['SQLALCHEMY_DATABASE_URI'] = database_url(config['SQLALCHEMY_DATABASE_URI'])
+    config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(config['SQLALCHEMY_DATABASE_URI'], config))
+    if config['DATABASE_REPLICA_URL']:
+        replica_url = database_url(config['DATABASE_REPLICA_URL'])
+        config.setdefault('SQLALCHEMY_BINDS', {}).setdefault(
+            'replica', {'url': replica_url, **engine_options(replica_url, config)})
+
+@db.event.listens_for(db.Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///odbyte.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def reads_from_replica():
+    return has_request_context() and g.get('read_replica', False) and not g.get('wrote_primary', False)
 
-# Fix for PostgreSQL URI
-if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
-    app.config['SQLALCHEMY_DATABASE_URI'] = app.config['SQLALCHEMY_DATABASE_URI'].replace('postgres://', 'postgresql://', 1)
+def replica_reads(f):
+    """Serve this view's plain reads from the replica unless this browser wrote recently"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'replica' in db.engines:
+            g.read_replica = session.get('read_primary_until', 0) < time.time()
+            if not g.read_replica:
+                db_routing_stats['sticky_requests'] += 1
+        return f(*args, **kwargs)
+    return decorated_function
 
-db = SQLAlchemy(app)
+@db.event.listens_for(db.Session, 'after_flush')
+def note_flush_write(session, flush_context):
+    if has_request_context():
+        g.wrote_primary = True
+
+@db.event.listens_for(db.Session, 'do_orm_execute')
+def note_dml_write(orm_execute_state):
+    if has_request_context() and not orm_execute_state.is_select:
+        g.wrote_primary = True
+
+@main.after_app_request
+def stick_to_primary(response):
+    if g.get('wrote_primary') and 'replica' in db.engines:
+        session['read_primary_until'] = int(time.time()) + current_app.config['REPLICA_STICKY_SECONDS']
+        db_routing_stats['sticky_writes'] += 1
+    return response
+
+def pool_status():
+    return {key or 'primary': {'backend': engine.dialect.name, 'pool': engine.pool.status()}
+            for key, engine in db.engines.items()}
 
 # Razorpay Configuration
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'rzp_test_your_key_id')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'your_key_secret')
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+
+@main.record_once
+def payment_settings(state):
+    config = state.app.config
+    config.setdefault('RAZORPAY_API_URL', os.environ.get('RAZORPAY_API_URL', 'https://api.razorpay.com/v1'))
+    config.setdefault('RAZORPAY_WEBHOOK_SECRET', os.environ.get('RAZORPAY_WEBHOOK_SECRET'))
+    config.setdefault('RAZORPAY_TIMEOUT', float(os.environ.get('RAZORPAY_TIMEOUT', 10)))
+    config.setdefault('PAYMENT_ORDER_WAIT', float(os.environ.get('PAYMENT_ORDER_WAIT', 2)))
+    # Longer than any gateway call with its retries can take: an order still 'creating' by then has lost its thread
+    config.setdefault('PAYMENT_ORDER_EXPIRY', int(os.environ.get('PAYMENT_ORDER_EXPIRY', 120)))
+
+payment_service_lock = threading.Lock()
+
+def get_payment_service():
+    """The app's RazorpayService, built (and requests imported) on first use"""
+    extensions = current_app.extensions
+    if 'payment_service' not in extensions:
+        with payment_service_lock:
+            if 'payment_service' not in extensions:
+                from payments import RazorpayService
+                config = current_app.config
+                extensions['payment_service'] = RazorpayService(
+                    RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET,
+                    webhook_secret=config['RAZORPAY_WEBHOOK_SECRET'],
+                    api_url=config['RAZORPAY_API_URL'],
+                    read_timeout=config['RAZORPAY_TIMEOUT'])
+    return extensions['payment_service']
 
 # Database Models
 class User(db.Model):
@@ -38,11 +226,23 @@ class User(db.Model):
     prompts = db.relationship('Prompt', backref='author', lazy=True, cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', backref='user', lazy=True, cascade='all, delete-orphan')
 
+# List views render Prompt.excerpt, a short copy of the description stored on
+# the row. description and content are deferred (the 'body' group), so cards
+# never fetch them; pages showing the whole prompt undefer_group('body').
+EXCERPT_LENGTH = 200
+
+def prompt_excerpt(description):
+    description = description or ''
+    if len(description) <= EXCERPT_LENGTH:
+        return description
+    return description[:EXCERPT_LENGTH].rstrip() + '...'
+
 class Prompt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    description = db.deferred(db.Column(db.Text, nullable=False), group='body')
+    content = db.deferred(db.Column(db.Text, nullable=False), group='body')
+    excerpt = db.Column(db.String(EXCERPT_LENGTH + 3))  # prompt_excerpt(description), kept by set_excerpt()
     tags = db.Column(db.String(500))
     category = db.Column(db.String(100))
     ai_model = db.Column(db.String(100))
@@ -51,13 +251,38 @@ class Prompt(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     is_premium = db.Column(db.Boolean, default=False)  # NEW FIELD
     premium_status = db.Column(db.String(20), default='none')  # NEW FIELD: 'none', 'pending', 'approved', 'rejected'
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Kept by toggle_favorite()
+    trending_score = db.Column(db.Float, nullable=False, default=0, server_default='0')  # Set by recompute_trending()
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Keys the card fragment cache
+    content_excerpt = db.query_expression()  # Start of content, computed in SQL by list queries that need it
     favorites = db.relationship('Favorite', backref='prompt', lazy=True, cascade='all, delete-orphan')
+    bundle_links = db.relationship('BundlePrompt', backref='prompt', lazy=True, cascade='all, delete-orphan')
+    __table_args__ = (
+        db.Index('ix_prompt_visibility_created_at', 'visibility', 'created_at', 'id'),
+        db.Index('ix_prompt_visibility_category_created_at', 'visibility', 'category', 'created_at', 'id'),
+        db.Index('ix_prompt_visibility_ai_model_created_at', 'visibility', 'ai_model', 'created_at', 'id'),
+        db.Index('ix_prompt_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_prompt_premium_status_created_at', 'premium_status', 'created_at', 'id'),
+        db.Index('ix_prompt_visibility_favorite_count', 'visibility', 'favorite_count', 'id'),
+        db.Index('ix_prompt_visibility_trending_score', 'visibility', 'trending_score', 'id'),
+    )
+
+    @db.validates('description')
+    def set_excerpt(self, key, description):
+        self.excerpt = prompt_excerpt(description)
+        return description
 
 class Favorite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     prompt_id = db.Column(db.Integer, db.ForeignKey('prompt.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('uq_favorite_user_id_prompt_id', 'user_id', 'prompt_id', unique=True),
+        db.Index('ix_favorite_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_favorite_prompt_id', 'prompt_id'),
+        db.Index('ix_favorite_created_at', 'created_at'),
+    )
 
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +294,21 @@ class Payment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class PaymentOrder(db.Model):
+    __tablename__ = 'payment_order'
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(100), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    plan_type = db.Column(db.String(20), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+    currency = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='creating')  # 'creating', 'created', 'failed', 'paid'
+    order_id = db.Column(db.String(200), unique=True)  # Razorpay order id once the gateway has answered
+    payment_id = db.Column(db.String(200))
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    paid_at = db.Column(db.DateTime)
+
 class PromptBundle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -76,34 +316,1177 @@ class PromptBundle(db.Model):
     unique_link = db.Column(db.String(100), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    prompt_ids = db.Column(db.Text)
+    prompt_ids = db.Column(db.Text)  # Legacy CSV membership, moved into bundle_prompt by migrate_bundle_prompt_ids()
+    author = db.relationship('User', lazy=True)
+    prompt_links = db.relationship('BundlePrompt', backref='bundle', lazy=True, cascade='all, delete-orphan',
+                                   order_by='BundlePrompt.position')
+    __table_args__ = (
+        db.Index('ix_prompt_bundle_user_id_created_at', 'user_id', 'created_at'),
+    )
 
-    def get_prompts(self):
-        if not self.prompt_ids:
-            return []
-        ids = [int(id.strip()) for id in self.prompt_ids.split(',') if id.strip()]
-        return Prompt.query.filter(Prompt.id.in_(ids)).all()
+    def prompts_query(self):
+        return (Prompt.query.join(BundlePrompt, BundlePrompt.prompt_id == Prompt.id)
+                .filter(BundlePrompt.bundle_id == self.id)
+                .order_by(BundlePrompt.position))
+
+    def get_prompts(self, full=False):
+        """The bundle's prompts in order; full also loads description and content"""
+        query = self.prompts_query()
+        if full:
+            query = query.options(db.undefer_group('body'))
+        return query.all()
+    
+    def get_prompt_ids(self):
+        rows = (db.session.query(BundlePrompt.prompt_id)
+                .filter_by(bundle_id=self.id)
+                .order_by(BundlePrompt.position))
+        return [row[0] for row in rows]
+    
+    def set_prompts(self, prompt_ids):
+        """Replace the bundle's prompts, keeping the given order"""
+        # Reuse existing link rows so the flush never inserts a duplicate key before deleting the old one
+        existing = {link.prompt_id: link for link in self.prompt_links}
+        links = []
+        for position, prompt_id in enumerate(dict.fromkeys(prompt_ids)):
+            link = existing.get(prompt_id) or BundlePrompt(prompt_id=prompt_id)
+            link.position = position
+            links.append(link)
+        self.prompt_links = links
     
     def add_prompt(self, prompt_id):
-        if not self.prompt_ids:
-            self.prompt_ids = str(prompt_id)
-        else:
-            ids = self.prompt_ids.split(',')
-            if str(prompt_id) not in ids:
-                ids.append(str(prompt_id))
-                self.prompt_ids = ','.join(ids)
+        if any(link.prompt_id == prompt_id for link in self.prompt_links):
+            return
+        position = max((link.position for link in self.prompt_links), default=-1) + 1
+        self.prompt_links.append(BundlePrompt(prompt_id=prompt_id, position=position))
     
     def remove_prompt(self, prompt_id):
-        if self.prompt_ids:
-            ids = [id for id in self.prompt_ids.split(',') if id.strip() != str(prompt_id)]
-            self.prompt_ids = ','.join(ids)
+        self.prompt_links = [link for link in self.prompt_links if link.prompt_id != prompt_id]
+
+class BundlePrompt(db.Model):
+    __tablename__ = 'bundle_prompt'
+    bundle_id = db.Column(db.Integer, db.ForeignKey('prompt_bundle.id', ondelete='CASCADE'), primary_key=True)
+    prompt_id = db.Column(db.Integer, db.ForeignKey('prompt.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_bundle_prompt_bundle_position', 'bundle_id', 'position'),
+        db.Index('ix_bundle_prompt_prompt_id', 'prompt_id'),
+    )
+
+def bundle_prompt_counts(bundles):
+    """Map bundle id -> number of prompts, using one grouped query for all bundles"""
+    counts = {bundle.id: 0 for bundle in bundles}
+    if counts:
+        rows = (db.session.query(BundlePrompt.bundle_id, db.func.count())
+                .filter(BundlePrompt.bundle_id.in_(counts))
+                .group_by(BundlePrompt.bundle_id))
+        counts.update(rows)
+    return counts
+
+def owned_prompt_ids(user_id, selected):
+    """Keep only the selected prompt ids that belong to the user, in selection order"""
+    ids = [int(id) for id in selected if id.strip().isdigit()]
+    if not ids:
+        return []
+    owned = {row[0] for row in db.session.query(Prompt.id).filter(Prompt.id.in_(ids), Prompt.user_id == user_id)}
+    return [id for id in ids if id in owned]
+
+def migrate_bundle_prompt_ids():
+    """Move legacy comma-separated PromptBundle.prompt_ids into bundle_prompt rows"""
+    legacy = PromptBundle.query.filter(PromptBundle.prompt_ids.isnot(None), PromptBundle.prompt_ids != '').all()
+    if not legacy:
+        return 0
+    
+    parsed = {bundle.id: [int(id) for id in bundle.prompt_ids.split(',') if id.strip().isdigit()]
+              for bundle in legacy}
+    all_ids = set().union(*parsed.values())
+    existing = {row[0] for row in db.session.query(Prompt.id).filter(Prompt.id.in_(all_ids))} if all_ids else set()
+    
+    for bundle in legacy:
+        bundle.set_prompts([id for id in parsed[bundle.id] if id in existing])
+        bundle.prompt_ids = None
+    db.session.commit()
+    return len(legacy)
+
+# Facets
+# Explore's filter lists read per-value counts of public prompts from
+# facet_count instead of scanning prompt, and tag filters go through the
+# normalized tag/prompt_tag tables. Both are kept current from the ORM flush
+# (track_prompt_facets / apply_prompt_facets); inserts that bypass the ORM
+# call record_inserted_prompts, and `flask refresh-facets` rebuilds them.
+FACET_SOURCE_COLUMNS = ('visibility', 'category', 'ai_model', 'tags', 'is_premium', 'premium_status')
+MAX_TAGS_PER_PROMPT = 20
+MAX_TAG_LENGTH = 50
+EXPLORE_TAG_LIMIT = 30
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(MAX_TAG_LENGTH), unique=True, nullable=False)
+
+class PromptTag(db.Model):
+    __tablename__ = 'prompt_tag'
+    prompt_id = db.Column(db.Integer, db.ForeignKey('prompt.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True)
+    __table_args__ = (
+        db.Index('ix_prompt_tag_tag_id', 'tag_id', 'prompt_id'),
+    )
+
+class FacetCount(db.Model):
+    __tablename__ = 'facet_count'
+    facet = db.Column(db.String(20), primary_key=True)  # 'category', 'ai_model', 'tag', 'premium'
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_facet_count_facet_count', 'facet', 'count'),
+    )
+
+def dialect_insert(table, bind=None):
+    """INSERT supporting on_conflict_do_* for the database behind bind (SQLite or Postgres)"""
+    dialect = (bind or db.engine).dialect.name
+    return (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+
+def parse_tags(text):
+    """Normalize free-text tags ("SEO, Marketing #blog") into unique lowercase names"""
+    tags = []
+    for tag in re.split(r'[,;#\n]', text or ''):
+        tag = ' '.join(tag.split()).lower()[:MAX_TAG_LENGTH]
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags[:MAX_TAGS_PER_PROMPT]
+
+def prompt_facet_values(values):
+    """The (facet, value) pairs a prompt counts towards, from its FACET_SOURCE_COLUMNS values"""
+    if values.get('visibility') != 'public':
+        return set()
+    pairs = {(facet, values[facet]) for facet in ('category', 'ai_model') if values.get(facet)}
+    pairs.update(('tag', tag) for tag in parse_tags(values.get('tags')))
+    if values.get('is_premium') and values.get('premium_status') == 'approved':
+        pairs.add(('premium', 'true'))
+    return pairs
+
+def committed_prompt_values(prompt):
+    """FACET_SOURCE_COLUMNS as they are in the database, before this flush"""
+    state = db.inspect(prompt)
+    values = {}
+    for name in FACET_SOURCE_COLUMNS:
+        history = state.attrs[name].history
+        if history.has_changes():
+            values[name] = history.deleted[0] if history.deleted else None
+        else:
+            values[name] = getattr(prompt, name)
+    return values
+
+def current_prompt_values(prompt):
+    return {name: getattr(prompt, name) for name in FACET_SOURCE_COLUMNS}
+
+def apply_facet_deltas(connection, deltas):
+    rows = [{'facet': facet, 'value': value, 'count': delta} for (facet, value), delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = FacetCount.__table__
+    insert = dialect_insert(table, connection)
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.facet, table.c.value],
+        set_={'count': table.c.count + insert.excluded.count},
+    ), rows)
+
+def sync_prompt_tags(connection, tags_by_prompt):
+    """Replace the prompt_tag rows of each prompt id with the given tag names"""
+    if not tags_by_prompt:
+        return
+    names = set().union(*tags_by_prompt.values())
+    tag_ids = {}
+    if names:
+        connection.execute(dialect_insert(Tag.__table__, connection).on_conflict_do_nothing(),
+                           [{'name': name} for name in names])
+        tag_ids = dict(connection.execute(db.select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+
+    connection.execute(db.delete(PromptTag).where(PromptTag.prompt_id.in_(tags_by_prompt)))
+    rows = [{'prompt_id': prompt_id, 'tag_id': tag_ids[name]}
+            for prompt_id, tags in tags_by_prompt.items() for name in tags]
+    if rows:
+        connection.execute(db.insert(PromptTag), rows)
+
+def record_inserted_prompts(connection, rows):
+    """Facet and tag bookkeeping for prompts inserted outside the ORM; rows are (id, values) pairs"""
+    deltas = Counter()
+    tags_by_prompt = {}
+    for prompt_id, values in rows:
+        deltas.update(prompt_facet_values(values))
+        tags = parse_tags(values.get('tags'))
+        if tags:
+            tags_by_prompt[prompt_id] = tags
+    apply_facet_deltas(connection, deltas)
+    sync_prompt_tags(connection, tags_by_prompt)
+
+@db.event.listens_for(db.Session, 'before_flush')
+def track_prompt_facets(session, flush_context, instances):
+    # Old values have to be read before the flush: deleted rows are gone afterwards
+    deltas = Counter()
+    retag = []
+    deleted = []
+    with session.no_autoflush:
+        for prompt in session.new:
+            if isinstance(prompt, Prompt):
+                deltas.update(prompt_facet_values(current_prompt_values(prompt)))
+                retag.append(prompt)
+        for prompt in session.dirty:
+            if isinstance(prompt, Prompt) and session.is_modified(prompt, include_collections=False):
+                deltas.subtract(prompt_facet_values(committed_prompt_values(prompt)))
+                deltas.update(prompt_facet_values(current_prompt_values(prompt)))
+                if db.inspect(prompt).attrs.tags.history.has_changes():
+                    retag.append(prompt)
+        for prompt in session.deleted:
+            if isinstance(prompt, Prompt):
+                deltas.subtract(prompt_facet_values(committed_prompt_values(prompt)))
+                deleted.append(prompt.id)
+
+    if deleted:
+        session.connection().execute(db.delete(PromptTag).where(PromptTag.prompt_id.in_(deleted)))
+    if deltas or retag:
+        session.info['prompt_facets'] = (deltas, retag)
+
+@db.event.listens_for(db.Session, 'after_flush')
+def apply_prompt_facets(session, flush_context):
+    # New prompts only have ids once the flush has inserted them
+    deltas, retag = session.info.pop('prompt_facets', (None, None))
+    if deltas is None:
+        return
+    connection = session.connection()
+    apply_facet_deltas(connection, deltas)
+    sync_prompt_tags(connection, {prompt.id: parse_tags(prompt.tags) for prompt in retag})
+
+def refresh_facets(batch_size=1000):
+    """Rebuild prompt_tag, tag and facet_count from the prompt table"""
+    connection = db.session.connection()
+    connection.execute(db.delete(PromptTag))
+    connection.execute(db.delete(FacetCount))
+
+    columns = [Prompt.id] + [getattr(Prompt, name) for name in FACET_SOURCE_COLUMNS]
+    last_id = 0
+    while True:
+        rows = connection.execute(db.select(*columns).where(Prompt.id > last_id)
+                                  .order_by(Prompt.id).limit(batch_size)).all()
+        if not rows:
+            break
+        record_inserted_prompts(connection, [(row.id, row._asdict()) for row in rows])
+        last_id = rows[-1].id
+
+    connection.execute(db.delete(Tag).where(~db.exists().where(PromptTag.tag_id == Tag.id)))
+
+def explore_facets(tag_limit=EXPLORE_TAG_LIMIT):
+    """Facet values with counts for the explore filters: every category/model, the top tags"""
+    facets = {'category': [], 'ai_model': [], 'tag': [], 'premium': []}
+    listed = (FacetCount.query.filter(FacetCount.facet.in_(('category', 'ai_model', 'premium')),
+                                      FacetCount.count > 0)
+              .order_by(FacetCount.facet, FacetCount.value))
+    top_tags = (FacetCount.query.filter(FacetCount.facet == 'tag', FacetCount.count > 0)
+                .order_by(FacetCount.count.desc(), FacetCount.value).limit(tag_limit))
+    for row in itertools.chain(listed, top_tags):
+        facets[row.facet].append((row.value, row.count))
+    return facets
+
+# Usage counters
+# usage_counter holds, per user, how many prompts, bundles and favorites they
+# have in total (period 'all') and how many of those were created in each
+# calendar month ('YYYY-MM'), so plan limits and dashboard totals are a
+# primary-key lookup. Like the facets, rows are adjusted by upserts from the
+# ORM flush, in the same transaction as the write; deletes give the month's
+# quota back. `flask reconcile-usage` recomputes everything from the source
+# tables.
+USAGE_MODELS = {'prompts': Prompt, 'bundles': PromptBundle, 'favorites': Favorite}
+ALL_TIME = 'all'
+
+class UsageCounter(db.Model):
+    __tablename__ = 'usage_counter'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    metric = db.Column(db.String(20), primary_key=True)  # a USAGE_MODELS key
+    period = db.Column(db.String(7), primary_key=True)  # ALL_TIME or 'YYYY-MM'
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+def usage_period(when=None):
+    return (when or datetime.utcnow()).strftime('%Y-%m')
+
+def usage_keys(metric, user_id, created_at):
+    return [(user_id, metric, ALL_TIME), (user_id, metric, usage_period(created_at))]
+
+def apply_usage_deltas(connection, deltas):
+    rows = [{'user_id': user_id, 'metric': metric, 'period': period, 'count': delta}
+            for (user_id, metric, period), delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = UsageCounter.__table__
+    insert = dialect_insert(table, connection)
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.metric, table.c.period],
+        set_={'count': table.c.count + insert.excluded.count},
+    ), rows)
+
+def usage_counts(user_id, when=None):
+    """{metric: {'total': n, 'month': n}} for one user, from a single indexed query"""
+    period = usage_period(when)
+    counts = {metric: {'total': 0, 'month': 0} for metric in USAGE_MODELS}
+    rows = UsageCounter.query.filter(UsageCounter.user_id == user_id,
+                                     UsageCounter.period.in_((ALL_TIME, period)))
+    for row in rows:
+        counts[row.metric]['total' if row.period == ALL_TIME else 'month'] = row.count
+    return counts
+
+def monthly_usage(user_id, metric, when=None):
+    counter = db.session.get(UsageCounter, (user_id, metric, usage_period(when)))
+    return counter.count if counter else 0
+
+@db.event.listens_for(db.Session, 'before_flush')
+def track_usage(session, flush_context, instances):
+    deltas = Counter()
+    models = tuple(USAGE_MODELS.values())
+    metrics = {model: metric for metric, model in USAGE_MODELS.items()}
+    deleted_users = {user.id for user in session.deleted if isinstance(user, User)}
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, models):
+                deltas.update(usage_keys(metrics[type(obj)], obj.user_id, obj.created_at))
+        for obj in session.deleted:
+            if isinstance(obj, models) and obj.user_id not in deleted_users:
+                deltas.subtract(usage_keys(metrics[type(obj)], obj.user_id, obj.created_at))
+
+    if deleted_users:
+        session.connection().execute(db.delete(UsageCounter).where(UsageCounter.user_id.in_(deleted_users)))
+    if deltas:
+        session.info['usage_deltas'] = deltas
+
+@db.event.listens_for(db.Session, 'after_flush')
+def apply_usage(session, flush_context):
+    deltas = session.info.pop('usage_deltas', None)
+    if deltas:
+        apply_usage_deltas(session.connection(), deltas)
+
+def reconcile_usage():
+    """Recompute every usage counter from the prompt, bundle and favorite tables"""
+    connection = db.session.connection()
+    deltas = Counter()
+    for metric, model in USAGE_MODELS.items():
+        month = db.func.strftime('%Y-%m', model.created_at) if connection.dialect.name == 'sqlite' \
+            else db.func.to_char(model.created_at, 'YYYY-MM')
+        rows = connection.execute(db.select(model.user_id, month, db.func.count())
+                                  .group_by(model.user_id, month))
+        for user_id, period, count in rows:
+            deltas[(user_id, metric, ALL_TIME)] += count
+            deltas[(user_id, metric, period or usage_period())] += count
+    connection.execute(db.delete(UsageCounter))
+    apply_usage_deltas(connection, deltas)
+    return deltas
+
+# Ranking
+# Prompt.favorite_count is adjusted in the same transaction as each favorite
+# write (record_favorite_changes), and Prompt.trending_score is the sum of every recent favorite
+# decayed by its age, recomputed in batch by the recompute_trending job the
+# worker reruns every few minutes (or `flask recompute-trending`). Both columns are indexed with
+# visibility and id, so the popular and trending sorts page with a keyset like
+# newest does, however many favorites there are.
+TRENDING_HALF_LIFE_HOURS = 48
+TRENDING_WINDOW_DAYS = 14
+RANKING_BATCH_SIZE = 1000
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+def update_prompt_column(column, values, touch=True):
+    """Write {prompt id: value} into one Prompt column with batched UPDATE ... WHERE id = ?
+
+    With touch the write also bumps updated_at, so cached cards showing the column are rebuilt."""
+    # Without it, a bare table clause rather than Prompt.__table__ leaves updated_at alone:
+    # for columns no card shows, and for databases that have no updated_at column yet
+    table = Prompt.__table__ if touch else db.table('prompt', db.column('id'), db.column(column))
+    statement = (db.update(table).where(table.c.id == db.bindparam('prompt_id'))
+                 .values({column: db.bindparam('value')}))
+    for batch in batched(values.items(), RANKING_BATCH_SIZE):
+        db.session.execute(statement, [{'prompt_id': prompt_id, 'value': value} for prompt_id, value in batch])
+
+def recompute_trending(now=None):
+    """Recompute every trending_score from the favorites of the last TRENDING_WINDOW_DAYS"""
+    now = now or datetime.utcnow()
+    since = now - timedelta(days=TRENDING_WINDOW_DAYS)
+    scores = Counter()
+    rows = db.session.execute(db.select(Favorite.prompt_id, Favorite.created_at)
+                              .where(Favorite.created_at >= since)
+                              .execution_options(yield_per=RANKING_BATCH_SIZE))
+    for prompt_id, created_at in rows:
+        age_hours = max((now - created_at).total_seconds() / 3600, 0)
+        scores[prompt_id] += 0.5 ** (age_hours / TRENDING_HALF_LIFE_HOURS)
+
+    # Prompts that fell out of the window go back to zero
+    stale = db.session.execute(db.select(Prompt.id).where(Prompt.trending_score != 0)).scalars()
+    values = {prompt_id: 0.0 for prompt_id in stale}
+    values.update((prompt_id, round(score, 6)) for prompt_id, score in scores.items())
+    update_prompt_column('trending_score', values, touch=False)
+    return len(scores)
+
+def recount_favorites(touch=True):
+    """Repair favorite_count from the favorite table; returns how many prompts had drifted"""
+    counts = (db.select(Favorite.prompt_id, db.func.count().label('favorites'))
+              .group_by(Favorite.prompt_id).subquery())
+    actual = db.func.coalesce(counts.c.favorites, 0)
+    drifted = dict(db.session.execute(
+        db.select(Prompt.id, actual)
+        .outerjoin(counts, counts.c.prompt_id == Prompt.id)
+        .where(Prompt.favorite_count != actual)
+    ).all())
+    update_prompt_column('favorite_count', drifted, touch)
+    return len(drifted)
+
+# Full-text search
+# SQLite keeps an FTS5 index in sync with triggers; Postgres uses a GIN index
+# over the same tsvector expression the queries use. Anything else (or a
+# SQLite build without FTS5) falls back to LIKE scans.
+PG_SEARCH_VECTOR = (
+    "to_tsvector('english', coalesce(prompt.title, '') || ' ' || coalesce(prompt.description, '')"
+    " || ' ' || coalesce(prompt.tags, '') || ' ' || coalesce(prompt.content, ''))"
+)
+
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS prompt_fts USING fts5(
+        title, description, tags, content, content='prompt', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS prompt_fts_ai AFTER INSERT ON prompt BEGIN
+        INSERT INTO prompt_fts(rowid, title, description, tags, content)
+        VALUES (new.id, new.title, new.description, new.tags, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS prompt_fts_ad AFTER DELETE ON prompt BEGIN
+        INSERT INTO prompt_fts(prompt_fts, rowid, title, description, tags, content)
+        VALUES ('delete', old.id, old.title, old.description, old.tags, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS prompt_fts_au AFTER UPDATE OF title, description, tags, content ON prompt BEGIN
+        INSERT INTO prompt_fts(prompt_fts, rowid, title, description, tags, content)
+        VALUES ('delete', old.id, old.title, old.description, old.tags, old.content);
+        INSERT INTO prompt_fts(rowid, title, description, tags, content)
+        VALUES (new.id, new.title, new.description, new.tags, new.content);
+    END""",
+]
+
+# External-content FTS tables start empty: fill them from prompt when the table is new
+SQLITE_SEARCH_REBUILD = "INSERT INTO prompt_fts(prompt_fts) VALUES ('rebuild')"
+
+PG_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_prompt_search ON prompt USING GIN ("
+    + PG_SEARCH_VECTOR.replace('prompt.', '') + ")",
+]
+
+prompt_fts = db.table('prompt_fts', db.column('rowid'))
+
+def init_search():
+    """Create the search index for the current database and pick a backend"""
+    dialect = db.engine.dialect.name
+    backend = 'like'
+    try:
+        if dialect == 'sqlite':
+            created = not db.inspect(db.session.connection()).has_table('prompt_fts')
+            for statement in SQLITE_SEARCH_DDL:
+                db.session.execute(db.text(statement))
+            if created:
+                # Index the existing prompts in the same transaction, before the triggers see an update
+                db.session.execute(db.text(SQLITE_SEARCH_REBUILD))
+            backend = 'fts5'
+        elif dialect == 'postgresql':
+            # CREATE INDEX indexes the existing rows itself
+            for statement in PG_SEARCH_DDL:
+                db.session.execute(db.text(statement))
+            backend = 'tsvector'
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning('Full-text search unavailable, falling back to LIKE: %s', e)
+    current_app.config['SEARCH_BACKEND'] = backend
+
+def search_backend():
+    """The backend init_search() set up, detected from the schema on first use in this process"""
+    config = current_app.config
+    if 'SEARCH_BACKEND' not in config:
+        dialect = db.engine.dialect.name
+        backend = 'like'
+        if dialect == 'sqlite':
+            if db.inspect(db.engine).has_table('prompt_fts'):
+                backend = 'fts5'
+        elif dialect == 'postgresql':
+            backend = 'tsvector'
+        config['SEARCH_BACKEND'] = backend
+    return config['SEARCH_BACKEND']
+
+def rebuild_search_index():
+    backend = search_backend()
+    if backend == 'fts5':
+        db.session.execute(db.text(SQLITE_SEARCH_REBUILD))
+    elif backend == 'tsvector':
+        db.session.execute(db.text("REINDEX INDEX ix_prompt_search"))
+    db.session.commit()
+    return backend
+
+def fts_match_expression(search):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    terms = re.findall(r'\w+', search.lower())[:16]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def apply_search(query, search):
+    """Filter a Prompt query by search text and order it by relevance"""
+    backend = search_backend()
+    
+    if backend == 'fts5':
+        match = fts_match_expression(search)
+        if not match:
+            return query
+        return (query.join(prompt_fts, prompt_fts.c.rowid == Prompt.id)
+                .filter(db.text('prompt_fts MATCH :search_match').bindparams(search_match=match))
+                .order_by(db.text('bm25(prompt_fts, 10.0, 4.0, 6.0, 1.0)')))
+    
+    if backend == 'tsvector':
+        vector = db.literal_column(PG_SEARCH_VECTOR)
+        ts_query = db.func.websearch_to_tsquery(db.literal_column("'english'"), search)
+        return (query.filter(vector.op('@@')(ts_query))
+                .order_by(db.func.ts_rank(vector, ts_query).desc()))
+    
+    return query.filter(
+        (Prompt.title.contains(search)) | 
+        (Prompt.description.contains(search)) |
+        (Prompt.tags.contains(search))
+    )
+
+# SQL query accounting
+# Every statement run inside a request is counted and timed on flask.g. Routes
+# listed in SQL_QUERY_BUDGETS (or everything, via SQL_QUERY_BUDGET) fail loudly
+# under TESTING when they exceed their budget and log a warning otherwise.
+@main.record_once
+def query_budget_settings(state):
+    state.app.config.setdefault('SQL_QUERY_BUDGET', None)
+    state.app.config.setdefault('SQL_QUERY_BUDGETS', {
+        'main.index': 3,
+        'main.explore': 5,
+        'main.explore_more': 3,
+        'main.dashboard': 6,
+        'main.dashboard_more': 1,
+        'main.favorites': 1,
+        'main.favorites_more': 1,
+        'main.bundles': 4,
+        'main.view_bundle': 3,
+        'main.view_shared_bundle': 3,
+        'main.admin_panel': 4,
+        'main.admin_more': 2,
+        'main.api_prompts': 3,
+        'main.api_search': 3,
+        'main.api_prompt_batch': 3,
+        'main.api_prompt': 3,
+        'main.api_bundle': 4,
+        'main.api_favorites': 3,
+    })
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@db.event.listens_for(db.Engine, 'before_cursor_execute')
+def count_sql_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_query_count = g.get('sql_query_count', 0) + 1
+        conn.info['query_started'] = time.perf_counter()
+
+@db.event.listens_for(db.Engine, 'after_cursor_execute')
+def time_sql_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    if started is not None and has_request_context():
+        g.sql_query_time = g.get('sql_query_time', 0) + time.perf_counter() - started
+
+@main.before_app_request
+def reset_query_count():
+    g.sql_query_count = 0
+    g.sql_query_time = 0
+
+@main.after_app_request
+def check_query_budget(response):
+    count = g.get('sql_query_count', 0)
+    if current_app.debug or current_app.testing:
+        response.headers['X-SQL-Queries'] = str(count)
+    
+    config = current_app.config
+    budget = config['SQL_QUERY_BUDGETS'].get(request.endpoint, config['SQL_QUERY_BUDGET'])
+    if budget is not None and count > budget:
+        message = f'{request.endpoint} ran {count} SQL queries (budget {budget})'
+        if current_app.testing:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    return response
+
+# Instrumentation
+# Each request's latency, SQL statement count and SQL time, and every
+# render_template() call's render time, go into in-process histograms. Those
+# and the cache, replica-routing and pool counters are exposed in Prometheus
+# text format on /metrics, for admins or a scraper sending
+# "Authorization: Bearer $METRICS_TOKEN". Like the local page cache, numbers
+# are per process: with several gunicorn workers a scrape sees the worker that
+# answered it, so sum rates across scrapes rather than reading one as the total.
+#
+# Requests slower than SLOW_REQUEST_MS log one structured line. With
+# PROFILE_SLOW_REQUESTS_MS set, a sampling profiler watches every request and
+# writes the folded stacks of those over the threshold to PROFILE_DIR, ready
+# for flamegraph.pl or speedscope. Text logs append a record's extra fields as
+# key=value pairs; LOG_FORMAT=json switches all logging to one JSON object per line.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+UNINSTRUMENTED_ENDPOINTS = {'static', 'main.metrics'}
+
+logger = logging.getLogger(__name__)
+
+@main.record_once
+def instrumentation_settings(state):
+    config = state.app.config
+    config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+    config.setdefault('SLOW_REQUEST_MS', float(os.environ.get('SLOW_REQUEST_MS', 1000)))
+    config.setdefault('PROFILE_SLOW_REQUESTS_MS', float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0)))
+    config.setdefault('PROFILE_INTERVAL_MS', float(os.environ.get('PROFILE_INTERVAL_MS', 5)))
+    config.setdefault('PROFILE_DIR', os.environ.get('PROFILE_DIR', os.path.join(state.app.instance_path, 'profiles')))
+
+LOG_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+def log_extras(record):
+    return {key: value for key, value in vars(record).items() if key not in LOG_RECORD_FIELDS}
+
+class TextLogFormatter(logging.Formatter):
+    """One line per record, with any `extra` fields appended as key=value pairs"""
+    
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+    
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        extras = ' '.join(f'{key}={value}' for key, value in log_extras(record).items())
+        return f'{line} {extras}' if extras else line
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record, with the request and any `extra` fields alongside the message"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if has_request_context():
+            entry.update(method=request.method, path=request.path, endpoint=request.endpoint)
+        entry.update(log_extras(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging():
+    """Send every logger through one root handler, formatted per LOG_FORMAT (text or json)"""
+    root = logging.getLogger()
+    if any(getattr(handler, 'odbyte', False) for handler in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.odbyte = True
+    if os.environ.get('LOG_FORMAT', 'text') == 'json':
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(TextLogFormatter())
+    root.addHandler(handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one series per label tuple"""
+    
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['count'] += 1
+            series['sum'] += value
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            for label_values, data in series:
+                labels = metric_labels(zip(self.labels, label_values))
+                for bound, count in zip(self.buckets, data['buckets']):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {data["count"]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {data["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {data["count"]}')
+        return lines
+
+def metric_labels(pairs):
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+def counter_lines(name, help, label, values, kind='counter'):
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    lines.extend(f'{name}{{{metric_labels([(label, key)])}}} {value}' for key, value in sorted(values.items()))
+    return lines
+
+request_latency = Histogram('odbyte_request_duration_seconds', 'Time to build the response',
+                            ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+request_sql_queries = Histogram('odbyte_request_sql_queries', 'SQL statements run per request',
+                                ('endpoint',), QUERY_COUNT_BUCKETS)
+request_sql_time = Histogram('odbyte_request_sql_seconds', 'Time spent in SQL statements per request',
+                             ('endpoint',), LATENCY_BUCKETS)
+template_render_time = Histogram('odbyte_template_render_seconds', 'render_template() time per template',
+                                 ('template',), LATENCY_BUCKETS)
+
+class SamplingProfiler:
+    """Samples the stacks of the threads it watches every `interval` seconds from one daemon thread"""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def watch(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='odbyte-profiler', daemon=True)
+                self._thread.start()
+    
+    def unwatch(self, thread_id):
+        """Stop sampling the thread and return its {folded stack: samples}"""
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._samples.items())
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            for thread_id, samples in watched:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if stack:
+                    samples[';'.join(reversed(stack))] += 1
+
+profiler_lock = threading.Lock()
+
+def get_profiler():
+    extensions = current_app.extensions
+    if 'profiler' not in extensions:
+        with profiler_lock:
+            extensions.setdefault('profiler', SamplingProfiler(current_app.config['PROFILE_INTERVAL_MS'] / 1000))
+    return extensions['profiler']
+
+def write_profile(samples, elapsed_ms):
+    directory = current_app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    endpoint = (request.endpoint or 'unknown').replace('.', '-')
+    path = os.path.join(directory, f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint}.folded')
+    with open(path, 'w') as f:
+        f.writelines(f'{stack} {count}\n' for stack, count in samples.most_common())
+    logger.info('Profiled slow request', extra={'profile': path, 'duration_ms': round(elapsed_ms, 1)})
+
+@main.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.template_time = 0
+    if current_app.config['PROFILE_SLOW_REQUESTS_MS'] and request.endpoint not in UNINSTRUMENTED_ENDPOINTS:
+        get_profiler().watch(threading.get_ident())
+        g.profiling = True
+
+@main.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None or request.endpoint in UNINSTRUMENTED_ENDPOINTS:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.observe((endpoint, request.method, str(response.status_code)), elapsed)
+    request_sql_queries.observe((endpoint,), g.get('sql_query_count', 0))
+    request_sql_time.observe((endpoint,), g.get('sql_query_time', 0))
+    
+    config = current_app.config
+    elapsed_ms = elapsed * 1000
+    if g.pop('profiling', False):
+        samples = get_profiler().unwatch(threading.get_ident())
+        if elapsed_ms >= config['PROFILE_SLOW_REQUESTS_MS'] and samples:
+            write_profile(samples, elapsed_ms)
+    if config['SLOW_REQUEST_MS'] and elapsed_ms >= config['SLOW_REQUEST_MS']:
+        logger.warning('Slow request', extra={
+            'status': response.status_code,
+            'duration_ms': round(elapsed_ms, 1),
+            'sql_queries': g.get('sql_query_count', 0),
+            'sql_ms': round(g.get('sql_query_time', 0) * 1000, 1),
+            'template_ms': round(g.get('template_time', 0) * 1000, 1),
+        })
+    return response
+
+@main.teardown_app_request
+def stop_profiling(exc):
+    # After-request hooks never ran if the view raised
+    if g.pop('profiling', False):
+        get_profiler().unwatch(threading.get_ident())
+
+@before_render_template.connect
+def start_template_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+@template_rendered.connect
+def record_template_time(sender, template, context, **extra):
+    if has_request_context() and g.get('template_started'):
+        elapsed = time.perf_counter() - g.template_started.pop()
+        g.template_time = g.get('template_time', 0) + elapsed
+        template_render_time.observe((template.name or 'string',), elapsed)
+
+def render_metrics():
+    lines = []
+    for histogram in (request_latency, request_sql_queries, request_sql_time, template_render_time):
+        lines.extend(histogram.render())
+    lines.extend(counter_lines('odbyte_page_cache_events_total', 'Response cache lookups and invalidations',
+                               'event', page_cache_stats))
+    lines.extend(counter_lines('odbyte_user_flags_cache_events_total', 'User flags cache lookups',
+                               'event', user_flags_stats))
+    lines.extend(counter_lines('odbyte_fragment_cache_events_total', 'Prompt card fragment cache lookups',
+                               'event', fragment_cache_stats))
+    lines.extend(counter_lines('odbyte_db_routing_events_total', 'Replica routing decisions',
+                               'event', db_routing_stats))
+    lines.extend(counter_lines('odbyte_db_pool_checked_out', 'Connections checked out of each engine pool',
+                               'bind', {key or 'primary': getattr(engine.pool, 'checkedout', lambda: 0)()
+                                        for key, engine in db.engines.items()}, kind='gauge'))
+    lines.extend(counter_lines('odbyte_rate_limit_allowed_total', 'Requests let through by the rate limiter',
+                               'route_class', rate_limit_stats['allowed']))
+    lines.extend(counter_lines('odbyte_rate_limit_limited_total', 'Requests answered 429 by the rate limiter',
+                               'route_class', rate_limit_stats['limited']))
+    lines.extend(counter_lines('odbyte_rate_limit_unavailable_total', 'Requests let through because the store failed',
+                               'route_class', rate_limit_stats['unavailable']))
+    return '\n'.join(lines) + '\n'
+
+@main.route('/metrics')
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    authorized = bool(token) and secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized:
+        flags = current_user_flags()
+        if not flags or not flags['is_admin']:
+            abort(403)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Response cache
+# Anonymous GETs of the hot public pages are cached as rendered bytes. Keys embed
+# a generation number per tag ('prompts', 'bundles', ...); writes call
+# invalidate_pages() to bump the generation, which orphans every page built
+# from the old data. With the local backend each gunicorn worker has its own
+# cache and generations, so other workers catch up within PAGE_CACHE_TTL; use
+# the redis backend to share both across workers.
+#
+# A page that read from the replica within REPLICA_STICKY_SECONDS of an
+# invalidation of one of its tags may predate the write, so it is served but
+# not stored under the new generation.
+@main.record_once
+def page_cache_settings(state):
+    config = state.app.config
+    config.setdefault('PAGE_CACHE_BACKEND', os.environ.get('PAGE_CACHE_BACKEND', 'local'))
+    config.setdefault('PAGE_CACHE_URL', os.environ.get('PAGE_CACHE_URL', 'redis://localhost:6379/0'))
+    config.setdefault('PAGE_CACHE_TTL', int(os.environ.get('PAGE_CACHE_TTL', 60)))
+    config.setdefault('PAGE_CACHE_MAX_ENTRIES', int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 1024)))
+
+class LocalCache:
+    """In-process LRU cache with a TTL per entry"""
+    
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    # Counters live outside the LRU so an eviction can never roll a generation back
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+    
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+class FakeSharedCache(LocalCache):
+    """Stands in for the shared backend in tests: values are pickled like they would be over the wire"""
+    
+    def get(self, key):
+        value = super().get(key)
+        return pickle.loads(value) if value is not None else None
+    
+    def set(self, key, value, ttl):
+        super().set(key, pickle.dumps(value), ttl)
+
+class RedisCache:
+    """Shared cache for multiple workers; needs the optional redis package"""
+    
+    def __init__(self, url, prefix='odbyte:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('PAGE_CACHE_BACKEND=redis requires the redis package (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+    
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+    
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+    
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+    
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+    
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+    
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+class NullCache:
+    def get(self, key):
+        return None
+    def set(self, key, value, ttl):
+        pass
+    def delete(self, key):
+        pass
+    def get_counter(self, key):
+        return 0
+    def incr(self, key):
+        return 0
+    def clear(self):
+        pass
+
+def make_page_cache(config):
+    backend = config['PAGE_CACHE_BACKEND']
+    if backend == 'redis':
+        return RedisCache(config['PAGE_CACHE_URL'])
+    if backend == 'fake':
+        return FakeSharedCache(config['PAGE_CACHE_MAX_ENTRIES'])
+    if backend == 'none':
+        return NullCache()
+    return LocalCache(config['PAGE_CACHE_MAX_ENTRIES'])
+
+def get_page_cache():
+    extensions = current_app.extensions
+    if 'page_cache' not in extensions:
+        extensions.setdefault('page_cache', make_page_cache(current_app.config))
+    return extensions['page_cache']
+
+page_cache_stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'not_modified': 0, 'invalidations': 0,
+                    'replica_skipped': 0}
+
+def invalidate_pages(*tags):
+    """Drop every cached page built from data under these tags"""
+    page_cache = get_page_cache()
+    for tag in tags:
+        page_cache.incr(f'generation:{tag}')
+        if 'replica' in db.engines:
+            page_cache.set(f'invalidated:{tag}', True, current_app.config['REPLICA_STICKY_SECONDS'])
+    page_cache_stats['invalidations'] += len(tags)
+
+def page_may_be_stale(page_cache, tags):
+    # The replica may not have the write behind a recent invalidation yet
+    return g.get('used_replica', False) and any(page_cache.get(f'invalidated:{tag}') for tag in tags)
+
+def page_is_cacheable():
+    # Logged-in users see per-user content and pending flashes are one-shot
+    return request.method == 'GET' and 'user_id' not in session and '_flashes' not in session
+
+def cached_page(*tags):
+    """Cache an anonymous page until TTL expiry or invalidation of one of its tags, with ETag support"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not page_is_cacheable():
+                page_cache_stats['bypassed'] += 1
+                return f(*args, **kwargs)
+            
+            page_cache = get_page_cache()
+            generations = ','.join(str(page_cache.get_counter(f'generation:{tag}')) for tag in tags)
+            key = f'page:{request.full_path}:{generations}'
+            entry = page_cache.get(key)
+            
+            if entry is None:
+                page_cache_stats['misses'] += 1
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or session.modified:
+                    return response
+                body = response.get_data()
+                entry = {'body': body, 'mimetype': response.mimetype, 'etag': hashlib.sha1(body).hexdigest()}
+                if page_may_be_stale(page_cache, tags):
+                    page_cache_stats['replica_skipped'] += 1
+                else:
+                    page_cache.set(key, entry, current_app.config['PAGE_CACHE_TTL'])
+            else:
+                page_cache_stats['hits'] += 1
+            
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            response.vary.add('Cookie')
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                page_cache_stats['not_modified'] += 1
+            return response
+        return decorated_function
+    return decorator
+
+# Templates
+# Every prompt list renders its cards through the prompt_card macro
+# (_prompt_card.html). The part built only from the prompt row comes from
+# card_fragment(), cached per (prompt id, updated_at); any write to the row
+# bumps updated_at, so an edited prompt never shows a stale card and old
+# entries just age out of the LRU. Compiled templates are kept as bytecode in
+# JINJA_BYTECODE_CACHE_DIR; `flask precompile-templates` fills it at deploy
+# time so cold workers load templates instead of parsing them.
+CARD_TEMPLATES = {'summary': '_prompt_card_summary.html', 'full': '_prompt_card_full.html'}
+
+@main.record_once
+def template_settings(state):
+    config = state.app.config
+    config.setdefault('FRAGMENT_CACHE_TTL', int(os.environ.get('FRAGMENT_CACHE_TTL', 3600)))
+    config.setdefault('FRAGMENT_CACHE_MAX_ENTRIES', int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 10000)))
+    config.setdefault('JINJA_BYTECODE_CACHE_DIR', os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR', os.path.join(state.app.instance_path, 'jinja-cache')))
+    if config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        state.app.jinja_env.bytecode_cache = FileSystemBytecodeCache(config['JINJA_BYTECODE_CACHE_DIR'])
+
+fragment_cache_stats = {'hits': 0, 'misses': 0}
+
+def get_fragment_cache():
+    extensions = current_app.extensions
+    if 'fragment_cache' not in extensions:
+        extensions.setdefault('fragment_cache', LocalCache(max_entries=current_app.config['FRAGMENT_CACHE_MAX_ENTRIES']))
+    return extensions['fragment_cache']
+
+def precompile_templates(app):
+    """Compile every template now, writing each to the bytecode cache when one is set"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+@main.app_template_global()
+def card_fragment(prompt, variant='summary'):
+    """The viewer-independent HTML of a prompt card, rendered once per (id, updated_at)"""
+    template = current_app.jinja_env.get_template(CARD_TEMPLATES[variant])
+    if prompt.updated_at is None:
+        return Markup(template.render(prompt=prompt))
     
+    fragment_cache = get_fragment_cache()
+    key = f'card:{variant}:{prompt.id}:{prompt.updated_at.isoformat()}'
+    html = fragment_cache.get(key)
+    if html is None:
+        fragment_cache_stats['misses'] += 1
+        html = template.render(prompt=prompt)
+        fragment_cache.set(key, html, current_app.config['FRAGMENT_CACHE_TTL'])
+    else:
+        fragment_cache_stats['hits'] += 1
+    return Markup(html)
+
+# Current user
+# current_user() loads the logged-in User at most once per request and keeps
+# it on flask.g. Checks that only need the plan or admin flag go through
+# current_user_flags(), which is served from a small per-process cache for
+# USER_FLAGS_TTL seconds, so explore, view_prompt and admin_required usually
+# skip the user table entirely. Plan changes call invalidate_user_flags();
+# other workers pick the change up when their entry expires.
+@main.record_once
+def user_flags_settings(state):
+    state.app.config.setdefault('USER_FLAGS_TTL', int(os.environ.get('USER_FLAGS_TTL', 30)))
+
+user_flags_cache = LocalCache(max_entries=4096)
+user_flags_stats = {'hits': 0, 'misses': 0}
+
+def user_flags(user):
+    return {'plan': user.plan, 'is_admin': bool(user.is_admin)}
+
+def current_user():
+    """The logged-in User (or None), loaded at most once per request"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        user = db.session.get(User, user_id) if user_id else None
+        if user:
+            user_flags_cache.set(user.id, user_flags(user), current_app.config['USER_FLAGS_TTL'])
+        g.current_user = user
+    return g.current_user
+
+def current_user_flags():
+    """{'plan', 'is_admin'} for the logged-in user (or None), cached across requests"""
+    if 'current_user_flags' not in g:
+        user_id = session.get('user_id')
+        flags = user_flags_cache.get(user_id) if user_id else None
+        if user_id:
+            user_flags_stats['hits' if flags is not None else 'misses'] += 1
+        if flags is None and user_id:
+            user = current_user()
+            flags = user_flags(user) if user else None
+        g.current_user_flags = flags
+    return g.current_user_flags
+
+def invalidate_user_flags(user_id):
+    user_flags_cache.delete(user_id)
+    g.pop('current_user_flags', None)
+
+@main.app_context_processor
+def inject_current_user_flags():
+    return {'current_user_flags': current_user_flags}
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             flash('Please login to access this page.', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 def admin_required(f):
@@ -111,59 +1494,338 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             flash('Please login to access this page.', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin:
+        flags = current_user_flags()
+        if not flags or not flags['is_admin']:
             flash('Admin access required!', 'error')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         return f(*args, **kwargs)
     return decorated_function
 
+# Rate limiting
+# Routes that are expensive or invite abuse are throttled with token buckets.
+# RATE_LIMITS gives each route class ('auth', 'search', 'favorite', 'payment')
+# a rate such as "60/minute" per plan, with 'anonymous' for visitors who are
+# not logged in and 'default' for everyone else. A bucket holds that many
+# tokens and refills continuously, so short bursts pass and a steady flood
+# gets 429 with Retry-After. Buckets are per user, or per client IP for
+# anonymous visitors and for the auth class, where the password checks are.
+# @rate_limited answers before the view runs: a rejected request does no
+# database work beyond the plan lookup, which current_user_flags() usually
+# serves from cache. The local store keeps buckets per process, so each
+# gunicorn worker allows the full rate; RATE_LIMIT_BACKEND=redis shares them.
+# Behind a load balancer set TRUSTED_PROXY_COUNT so the client IP is read
+# from X-Forwarded-For.
+RATE_LIMIT_DEFAULTS = {
+    'auth': {'default': '10/minute'},
+    'search': {'anonymous': '30/minute', 'default': '60/minute', 'silver': '120/minute',
+               'diamond': '240/minute', 'premium': '240/minute'},
+    'favorite': {'default': '60/minute', 'silver': '120/minute', 'diamond': '240/minute', 'premium': '240/minute'},
+    'payment': {'default': '10/minute'},
+}
+RATE_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+@main.record_once
+def rate_limit_settings(state):
+    config = state.app.config
+    config.setdefault('RATE_LIMIT_BACKEND', os.environ.get('RATE_LIMIT_BACKEND', 'local'))
+    config.setdefault('RATE_LIMIT_URL', os.environ.get('RATE_LIMIT_URL', 'redis://localhost:6379/0'))
+    config.setdefault('RATE_LIMIT_MAX_KEYS', int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000)))
+    config.setdefault('TRUSTED_PROXY_COUNT', int(os.environ.get('TRUSTED_PROXY_COUNT', 0)))
+    # RATE_LIMITS='{"search": {"free": "20/minute"}}' overrides single plans of a class
+    limits = {route_class: dict(rates) for route_class, rates in RATE_LIMIT_DEFAULTS.items()}
+    for route_class, rates in json.loads(os.environ.get('RATE_LIMITS') or '{}').items():
+        limits.setdefault(route_class, {}).update(rates)
+    config.setdefault('RATE_LIMITS', limits)
+
+def parse_rate(rate):
+    """'60/minute' -> (capacity 60, refill 1.0 token per second)"""
+    count, period = rate.split('/')
+    return int(count), int(count) / RATE_PERIODS[period.strip()]
+
+def take_token(state, capacity, refill, now):
+    """Spend one token from a (tokens, updated) bucket; returns (allowed, new state)"""
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + max(0, now - updated) * refill)
+    if tokens >= 1:
+        return True, (tokens - 1, now)
+    return False, (tokens, now)
+
+class LocalRateLimitStore:
+    """Buckets in this process; the least recently used are dropped past max_keys, which refills them"""
+    
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def take(self, key, capacity, refill):
+        """Spend a token from key's bucket; returns (allowed, tokens left)"""
+        with self._lock:
+            allowed, state = take_token(self.load(key), capacity, refill, self.clock())
+            self.save(key, state)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, state[0]
+    
+    def load(self, key):
+        state = self._buckets.get(key)
+        if state is not None:
+            self._buckets.move_to_end(key)
+        return state
+    
+    def save(self, key, state):
+        self._buckets[key] = state
+    
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+class FakeSharedRateLimitStore(LocalRateLimitStore):
+    """Stands in for the redis store in tests: wall-clock time and state stored as strings, as in the hash"""
+    
+    def __init__(self, max_keys=100000, clock=time.time):
+        super().__init__(max_keys, clock)
+    
+    def load(self, key):
+        state = super().load(key)
+        return tuple(float(value) for value in state.split(':')) if state is not None else None
+    
+    def save(self, key, state):
+        super().save(key, '%r:%r' % state)
+
+class RedisRateLimitStore:
+    """Buckets shared by every worker; a Lua script does the refill and spend atomically on the server"""
+    
+    # Same arithmetic as take_token(); tokens go back as a string so Redis keeps the fraction
+    TAKE_TOKEN = """
+        local capacity, refill, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill) + 1)
+        return {allowed, tostring(tokens)}
+    """
+    
+    def __init__(self, url, prefix='odbyte:ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_BACKEND=redis requires the redis package (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.errors = redis.RedisError
+        self._take = self.client.register_script(self.TAKE_TOKEN)
+    
+    def take(self, key, capacity, refill):
+        """Spend a token from key's bucket; returns (allowed, tokens left), or None if Redis is unreachable"""
+        try:
+            allowed, tokens = self._take(keys=[self.prefix + key], args=[capacity, refill, time.time()])
+        except self.errors:
+            return None
+        return bool(allowed), float(tokens)
+    
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+class NullRateLimitStore:
+    def take(self, key, capacity, refill):
+        return True, capacity
+    def clear(self):
+        pass
+
+def make_rate_limit_store(config):
+    backend = config['RATE_LIMIT_BACKEND']
+    if backend == 'redis':
+        return RedisRateLimitStore(config['RATE_LIMIT_URL'])
+    if backend == 'fake':
+        return FakeSharedRateLimitStore(config['RATE_LIMIT_MAX_KEYS'])
+    if backend == 'none':
+        return NullRateLimitStore()
+    return LocalRateLimitStore(config['RATE_LIMIT_MAX_KEYS'])
+
+def get_rate_limit_store():
+    extensions = current_app.extensions
+    if 'rate_limit_store' not in extensions:
+        extensions.setdefault('rate_limit_store', make_rate_limit_store(current_app.config))
+    return extensions['rate_limit_store']
+
+# Per route class; 'unavailable' counts requests let through because the shared store failed
+rate_limit_stats = {'allowed': Counter(), 'limited': Counter(), 'unavailable': Counter()}
+
+def rate_limit_bucket(route_class, by):
+    """(bucket key, plan whose limit applies) for the caller; plan is None for per-IP buckets"""
+    user_id = session.get('user_id')
+    if by == 'user' and user_id:
+        flags = current_user_flags()
+        return f'{route_class}:user:{user_id}', flags['plan'] if flags else None
+    return f'{route_class}:ip:{request.remote_addr}', None
+
+def too_many_requests(retry_after):
+    message = f'Too many requests, try again in {retry_after} seconds.'
+    if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html':
+        response = current_app.response_class(message, mimetype='text/plain')
+    else:
+        response = jsonify({'error': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def check_rate_limit(route_class, by='user'):
+    """A 429 response if the caller's bucket for route_class is empty, otherwise None after spending a token"""
+    key, plan = rate_limit_bucket(route_class, by)
+    rates = current_app.config['RATE_LIMITS'].get(route_class, {})
+    rate = rates.get(plan or 'anonymous') or rates.get('default')
+    if not rate:
+        return None
+    
+    capacity, refill = parse_rate(rate)
+    taken = get_rate_limit_store().take(key, capacity, refill)
+    if taken is None:
+        rate_limit_stats['unavailable'][route_class] += 1
+        return None
+    allowed, tokens = taken
+    if allowed:
+        rate_limit_stats['allowed'][route_class] += 1
+        return None
+    rate_limit_stats['limited'][route_class] += 1
+    return too_many_requests(math.ceil((1 - tokens) / refill))
+
+def rate_limited(route_class, by='user', when=None):
+    """Throttle a view by route class, keyed by user (or IP when anonymous) or always by IP with by='ip'"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if when is None or when():
+                response = check_rate_limit(route_class, by)
+                if response is not None:
+                    return response
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def is_post():
+    return request.method == 'POST'
+
+def is_search():
+    return bool(request.args.get('search'))
+
+# Pagination
+# Listing routes page with a keyset cursor on (sort column, id) so every page
+# costs one indexed range scan no matter how deep the user scrolls.
+PAGE_SIZE = 24
+
+def encode_cursor(values):
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return [datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v for v in payload]
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+
+def cursor_value_fits(column, value):
+    # A cursor from another sort order (say a date for a count column) is ignored, not compared
+    expected = column.type.python_type
+    if expected is float:
+        expected = (int, float)
+    return isinstance(value, expected) and not isinstance(value, bool)
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=PAGE_SIZE):
+    """Return (items, next_cursor) for a query ordered by (sort_column, id_column) descending"""
+    after = decode_cursor(cursor)
+    if after and len(after) == 2 and cursor_value_fits(sort_column, after[0]):
+        sort_value, last_id = after
+        query = query.filter(db.or_(
+            sort_column < sort_value,
+            db.and_(sort_column == sort_value, id_column < last_id)
+        ))
+    
+    items = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    if len(items) <= per_page:
+        return items, None
+    
+    items = items[:per_page]
+    last = items[-1]
+    return items, encode_cursor([getattr(last, sort_column.key), getattr(last, id_column.key)])
+
+def offset_paginate(query, cursor=None, per_page=PAGE_SIZE):
+    """Pagination for relevance-ordered search results, which have no stable keyset"""
+    after = decode_cursor(cursor)
+    offset = after[0] if after and len(after) == 1 and isinstance(after[0], int) else 0
+    
+    items = query.offset(offset).limit(per_page + 1).all()
+    if len(items) <= per_page:
+        return items, None
+    return items[:per_page], encode_cursor([offset + per_page])
+
+def next_page_urls(endpoint, more_endpoint, next_cursor, **values):
+    """Links for the next page: a full page for plain links and a JSON endpoint for load-more"""
+    if not next_cursor:
+        return None
+    args = request.args.to_dict()
+    args.update(values)
+    args['cursor'] = next_cursor
+    return {'page': url_for(endpoint, **args), 'more': url_for(more_endpoint, **args)}
+
+def load_more_response(template, next_page, **context):
+    """JSON body for infinite scroll: the rendered cards plus the next load-more URL"""
+    return jsonify({
+        'html': render_template(template, **context),
+        'next_url': next_page['more'] if next_page else None
+    })
+
+# Plan limits, counted per calendar month (see usage_counter)
+PROMPT_LIMITS = {'diamond': 200}
+DEFAULT_PROMPT_LIMIT = 10  # Free/Silver and any other plan value
+
+def prompt_limit_for(plan):
+    return PROMPT_LIMITS.get(plan, DEFAULT_PROMPT_LIMIT)
+
+BUNDLE_LIMITS = {'diamond': 30}
+DEFAULT_BUNDLE_LIMIT = 3
+
+def bundle_limit_for(plan):
+    return BUNDLE_LIMITS.get(plan, DEFAULT_BUNDLE_LIMIT)
+
 def generate_bundle_link():
     """Generate a unique random link for bundles"""
     return secrets.token_urlsafe(16)
     
     
-@app.route('/')
+@main.route('/')
+@cached_page('prompts', 'blog')
+@replica_reads
 def index():
     # Get 6 most recent public prompts for homepage
     recent_prompts = Prompt.query.filter_by(visibility='public').order_by(Prompt.created_at.desc()).limit(6).all()
     
-    # Get 3 most recent blog posts
-    recent_posts = []
-    blog_dir = Path('blog_posts')
+    # And the 3 trending ones
+    trending_prompts = (Prompt.query.filter_by(visibility='public').filter(Prompt.trending_score > 0)
+                        .order_by(Prompt.trending_score.desc(), Prompt.id.desc()).limit(3).all())
     
-    if blog_dir.exists():
-        for file in sorted(blog_dir.glob('*.md'), reverse=True)[:3]:  # Get latest 3
-            try:
-                with open(file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                    if content.startswith('---'):
-                        parts = content.split('---', 2)
-                        if len(parts) >= 3:
-                            metadata_text = parts[1]
-                            
-                            metadata = {}
-                            for line in metadata_text.strip().split('\n'):
-                                if ':' in line:
-                                    key, value = line.split(':', 1)
-                                    metadata[key.strip()] = value.strip()
-                            
-                            recent_posts.append({
-                                'title': metadata.get('title', 'Untitled'),
-                                'slug': metadata.get('slug', ''),
-                                'excerpt': metadata.get('excerpt', ''),
-                                'category': metadata.get('category', 'General')
-                            })
-            except Exception as e:
-                print(f"Error reading {file}: {e}")
-                continue
+    # Get 3 most recent blog posts
+    recent_posts = get_blog_index().recent(3)
     
-    return render_template('index.html', recent_prompts=recent_prompts, recent_posts=recent_posts)
+    return render_template('index.html', recent_prompts=recent_prompts, trending_prompts=trending_prompts,
+                           recent_posts=recent_posts)
 
-@app.route('/signup', methods=['GET', 'POST'])
+@main.route('/signup', methods=['GET', 'POST'])
+@rate_limited('auth', by='ip', when=is_post)
 def signup():
     if request.method == 'POST':
         name = request.form.get('name')
@@ -172,7 +1834,7 @@ def signup():
         
         if User.query.filter_by(email=email).first():
             flash('Email already registered!', 'error')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
         
         hashed_password = generate_password_hash(password)
         new_user = User(name=name, email=email, password=hashed_password)
@@ -180,11 +1842,12 @@ def signup():
         db.session.commit()
         
         flash('Account created successfully! Please login.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('signup.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
+@rate_limited('auth', by='ip', when=is_post)
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -197,60 +1860,81 @@ def login():
             session['user_name'] = user.name
             session['user_plan'] = user.plan
             flash(f'Welcome back, {user.name}!', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash('Invalid email or password!', 'error')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@main.route('/logout')
 def logout():
     session.clear()
     flash('Logged out successfully!', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/dashboard')
+@main.route('/dashboard')
 @login_required
 def dashboard():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     if not user:
         session.clear()
         flash('Session expired. Please login again.', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
-    prompts = Prompt.query.filter_by(user_id=user.id).order_by(Prompt.created_at.desc()).all()
-    prompt_count = len(prompts)
+    prompts, next_cursor = keyset_paginate(Prompt.query.filter_by(user_id=user.id),
+                                           Prompt.created_at, Prompt.id, request.args.get('cursor'))
+    usage = usage_counts(user.id)
     
     # Get user's bundles
     bundles = PromptBundle.query.filter_by(user_id=user.id).order_by(PromptBundle.created_at.desc()).limit(5).all()
-    bundle_count = PromptBundle.query.filter_by(user_id=user.id).count()
+    notifications = (Notification.query.filter_by(user_id=user.id, read_at=None)
+                     .order_by(Notification.created_at.desc()).limit(NOTIFICATION_LIMIT).all())
     
-    return render_template('dashboard.html', user=user, prompts=prompts, 
-                         prompt_count=prompt_count, bundles=bundles, bundle_count=bundle_count)
+    return render_template('dashboard.html', user=user, prompts=prompts, notifications=notifications,
+                         prompt_count=usage['prompts']['total'], monthly_prompt_count=usage['prompts']['month'],
+                         prompt_limit=prompt_limit_for(user.plan),
+                         bundles=bundles, bundle_count=usage['bundles']['total'],
+                         prompt_counts=bundle_prompt_counts(bundles),
+                         next_page=next_page_urls('main.dashboard', 'main.dashboard_more', next_cursor))
+
+@main.route('/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    db.session.execute(db.update(Notification)
+                       .where(Notification.user_id == session['user_id'], Notification.read_at.is_(None))
+                       .values(read_at=datetime.utcnow()))
+    db.session.commit()
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/prompt/new', methods=['GET', 'POST'])
+@main.route('/dashboard/more')
+@login_required
+def dashboard_more():
+    prompts, next_cursor = keyset_paginate(Prompt.query.filter_by(user_id=session['user_id']),
+                                           Prompt.created_at, Prompt.id, request.args.get('cursor'))
+    return load_more_response('_dashboard_cards.html',
+                              next_page_urls('main.dashboard', 'main.dashboard_more', next_cursor),
+                              prompts=prompts)
+
+@main.route('/prompt/new', methods=['GET', 'POST'])
 @login_required
 def new_prompt():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     if request.method == 'POST':
-        # Get current prompt count FIRST (before any checks)
-        current_prompt_count = Prompt.query.filter_by(user_id=user.id).count()
+        # Get this month's prompt count FIRST (before any checks)
+        current_prompt_count = monthly_usage(user.id, 'prompts')
         
         # Check prompt limit based on plan
-        if user.plan == 'silver':
-            if current_prompt_count >= 10:
+        if current_prompt_count >= prompt_limit_for(user.plan):
+            if user.plan == 'silver':
                 flash('Silver plan limit reached! Upgrade to Diamond for 200 prompts/month.', 'error')
-                return redirect(url_for('pricing'))
-        elif user.plan == 'diamond':
-            if current_prompt_count >= 200:
+                return redirect(url_for('main.pricing'))
+            elif user.plan == 'diamond':
                 flash('Monthly limit reached (200 prompts). Limit resets next month.', 'error')
-                return redirect(url_for('dashboard'))
-        else:
-            # Default to silver limits for any other plan value
-            if current_prompt_count >= 10:
+                return redirect(url_for('main.dashboard'))
+            else:
                 flash('Free plan limit reached! Upgrade to Diamond for 200 prompts/month.', 'error')
-                return redirect(url_for('pricing'))
+                return redirect(url_for('main.pricing'))
         
         title = request.form.get('title')
         description = request.form.get('description')
@@ -287,6 +1971,7 @@ def new_prompt():
         
         db.session.add(new_prompt_obj)
         db.session.commit()
+        invalidate_pages('prompts')
         
         # Show success message with count
         new_count = current_prompt_count + 1
@@ -297,19 +1982,19 @@ def new_prompt():
         else:
             flash(f'Prompt saved as public! ({new_count}/10 Silver prompts used)', 'success')
         
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('new_prompt.html', user=user)
 
-@app.route('/prompt/<int:id>/edit', methods=['GET', 'POST'])
+@main.route('/prompt/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_prompt(id):
-    prompt = Prompt.query.get_or_404(id)
-    user = User.query.get(session['user_id'])
+    prompt = Prompt.query.options(db.undefer_group('body')).get_or_404(id)
+    user = current_user()
     
     if prompt.user_id != session['user_id']:
         flash('Unauthorized access!', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     if request.method == 'POST':
         prompt.title = request.form.get('title')
@@ -328,90 +2013,451 @@ def edit_prompt(id):
             prompt.visibility = visibility  # Diamond users can choose
         
         db.session.commit()
+        invalidate_pages('prompts')
         flash('Prompt updated successfully!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('edit_prompt.html', prompt=prompt, user=user)
 
-@app.route('/bulk-upload', methods=['GET', 'POST'])
-@login_required
-def bulk_upload():
-    user = User.query.get(session['user_id'])
-    
+# Bulk import
+# Uploads are parsed incrementally (CSV rows, JSON array elements or JSONL
+# lines), validated, and inserted with executemany in chunked transactions,
+# so memory use does not grow with the size of the file. Uploads larger than
+# BULK_IMPORT_INLINE_BYTES are spooled to IMPORT_SPOOL_DIR and imported by the
+# import_prompts job, which notifies the user with the report; the spool
+# directory must be shared with the workers.
+@main.record_once
+def bulk_import_settings(state):
+    config = state.app.config
+    config.setdefault('BULK_IMPORT_INLINE_BYTES', int(os.environ.get('BULK_IMPORT_INLINE_BYTES', 1 << 20)))
+    config.setdefault('IMPORT_SPOOL_DIR', os.environ.get('IMPORT_SPOOL_DIR',
+                                                         os.path.join(state.app.instance_path, 'imports')))
+IMPORT_FIELDS = ('title', 'description', 'content', 'tags', 'category', 'ai_model', 'visibility')
+IMPORT_MAX_LENGTHS = {'title': 200, 'tags': 500, 'category': 100, 'ai_model': 100}
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_ERRORS = 100
+
+def iter_csv_records(stream):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield reader.line_num, row
+
+def skip_array_element(text, state):
+    """Return the index of the comma or bracket that ends the current top-level array element,
+    or -1 with the (depth, in_string, escaped) state to carry into the next chunk"""
+    depth, in_string, escaped = state
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}':
+            if depth == 0:
+                return i, state
+            depth -= 1
+        elif char == ',' and depth == 0:
+            return i, state
+    return -1, (depth, in_string, escaped)
+
+def iter_json_records(stream, chunk_size=65536, max_record_size=1024 * 1024):
+    """Yield objects from a JSON array, JSONL or concatenated JSON without reading the whole stream
+
+    A malformed record yields a ValueError and parsing resumes at the next array element,
+    or for a document that is not an array, on the next line."""
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer = ''
+    record = 0
+    eof = False
+    array = None
+    skip = None
+    while True:
+        if skip is not None:
+            # Drop the rest of the malformed record, reading on until its end arrives
+            if array:
+                end, skip = skip_array_element(buffer, skip)
+            else:
+                end = buffer.find('\n')
+            if end < 0 and not eof:
+                buffer = ''
+                chunk = text.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            buffer = buffer[end:] if end >= 0 else ''
+            skip = None
+        if array is None and buffer.strip():
+            array = buffer.lstrip().startswith('[')
+        buffer = buffer.lstrip(' \t\r\n[],')
+        if not buffer:
+            if eof:
+                return
+            chunk = text.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            # Only a record cut off by the end of the buffer needs more input; anything else is malformed
+            truncated = e.pos >= len(buffer) or e.msg == 'Unterminated string starting at'
+            if truncated and not eof and len(buffer) < max_record_size:
+                chunk = text.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            record += 1
+            yield record, ValueError(f'Invalid JSON: {e.msg}')
+            if not array:
+                buffer = buffer[e.pos:]
+            skip = (0, False, False)
+            continue
+        record += 1
+        yield record, value
+        buffer = buffer[end:]
+
+def detect_import_format(filename, declared, head):
+    if declared in ('csv', 'json', 'jsonl'):
+        return declared
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in ('csv', 'json', 'jsonl'):
+        return extension
+    return 'json' if head.lstrip()[:1] in (b'[', b'{') else 'csv'
+
+def validate_import_row(row, user):
+    """Return a Prompt insert dict for a raw record, or raise ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError('Expected an object with prompt fields')
+    
+    values = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, list):
+            value = ', '.join(str(item) for item in value)
+        values[field] = value.strip() if isinstance(value, str) else value
+    
+    for field in ('title', 'description', 'content'):
+        if not values[field] or not isinstance(values[field], str):
+            raise ValueError(f'Missing {field}')
+    for field, max_length in IMPORT_MAX_LENGTHS.items():
+        if values[field] and len(str(values[field])) > max_length:
+            raise ValueError(f'{field} is longer than {max_length} characters')
+    
+    visibility = values['visibility'] or 'public'
+    if visibility not in ('public', 'private'):
+        raise ValueError(f'Unknown visibility "{visibility}"')
+    if user.plan != 'diamond':
+        visibility = 'public'
+    
+    values['visibility'] = visibility
+    values['excerpt'] = prompt_excerpt(values['description'])
+    values['user_id'] = user.id
+    values['created_at'] = datetime.utcnow()
+    return values
+
+def import_prompts(user, records, remaining=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Validate and insert prompts from (record number, raw record) pairs; returns a report dict"""
+    report = {'imported': 0, 'failed': 0, 'over_limit': 0, 'errors': []}
+    batch = []
+    
+    def record_error(number, message):
+        report['failed'] += 1
+        if len(report['errors']) < IMPORT_MAX_ERRORS:
+            report['errors'].append({'record': number, 'error': message})
+    
+    def flush():
+        if batch:
+            ids = db.session.scalars(db.insert(Prompt).returning(Prompt.id, sort_by_parameter_order=True), batch).all()
+            connection = db.session.connection()
+            record_inserted_prompts(connection, zip(ids, batch))
+            apply_usage_deltas(connection, Counter(key for row in batch
+                                                   for key in usage_keys('prompts', row['user_id'], row['created_at'])))
+            db.session.commit()
+            report['imported'] += len(batch)
+            batch.clear()
+            if progress:
+                progress(report)
+    
+    for number, raw in records:
+        if isinstance(raw, Exception):
+            record_error(number, str(raw))
+            continue
+        if remaining is not None and report['imported'] + len(batch) >= remaining:
+            report['over_limit'] += 1
+            continue
+        try:
+            batch.append(validate_import_row(raw, user))
+        except ValueError as e:
+            record_error(number, str(e))
+            continue
+        if len(batch) >= chunk_size:
+            flush()
+    
+    flush()
+    if report['imported']:
+        invalidate_pages('prompts')
+    return report
+
+def open_import_upload():
+    """Return (stream, filename) for the uploaded file or pasted bulk_data"""
+    upload = request.files.get('bulk_file')
+    if upload and upload.filename:
+        return upload.stream, upload.filename
+    bulk_data = request.form.get('bulk_data') or ''
+    return io.BytesIO(bulk_data.encode('utf-8')), None
+
+def spool_import(user, stream, import_format):
+    """Save an upload to the spool directory and queue its import; returns the Job"""
+    spool_dir = current_app.config['IMPORT_SPOOL_DIR']
+    os.makedirs(spool_dir, exist_ok=True)
+    path = os.path.join(spool_dir, f'{user.id}-{secrets.token_hex(8)}.{import_format}')
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(stream, f, 1 << 20)
+    row = enqueue('import_prompts', {'user_id': user.id, 'path': path, 'import_format': import_format,
+                                     'link': url_for('main.dashboard')})
+    db.session.commit()
+    return row
+
+@main.route('/bulk-upload', methods=['GET', 'POST'])
+@login_required
+def bulk_upload():
+    user = current_user()
+    
     # Only Diamond users can access bulk upload
     if user.plan != 'diamond':
         flash('Bulk upload is a Diamond feature. Upgrade to access it!', 'error')
-        return redirect(url_for('pricing'))
+        return redirect(url_for('main.pricing'))
     
+    report = None
     if request.method == 'POST':
-        # Get bulk data (could be textarea with JSON/CSV format)
-        bulk_data = request.form.get('bulk_data')
+        stream, filename = open_import_upload()
+        head = stream.read(64)
+        stream.seek(0)
+        import_format = detect_import_format(filename, request.form.get('format'), head)
         
-        # For now, just show coming soon message
-        flash('Bulk upload feature coming soon! We\'re working on it.', 'info')
-        return redirect(url_for('dashboard'))
+        if (request.content_length or 0) > current_app.config['BULK_IMPORT_INLINE_BYTES']:
+            import_job = spool_import(user, stream, import_format)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'job_id': import_job.id, 'status': 'queued'}), 202
+            flash('Your file is being imported in the background. '
+                  'You\'ll get a notification with the report when it is done.', 'info')
+            return redirect(url_for('main.dashboard'))
+        
+        records = iter_csv_records(stream) if import_format == 'csv' else iter_json_records(stream)
+        
+        current_prompt_count = monthly_usage(user.id, 'prompts')
+        remaining = max(prompt_limit_for(user.plan) - current_prompt_count, 0)
+        report = import_prompts(user, records, remaining=remaining)
+        
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(report)
+        
+        category = 'success' if report['imported'] and not report['failed'] else 'info'
+        flash(f"Imported {report['imported']} prompts ({report['failed']} failed, "
+              f"{report['over_limit']} over your plan limit).", category)
     
-    return render_template('bulk_upload.html', user=user)
+    return render_template('bulk_upload.html', user=user, report=report)
 
-@app.route('/prompt/<int:id>')
-def view_prompt(id):
-    prompt = Prompt.query.get_or_404(id)
+# Export
+# Exports stream straight from a yield_per cursor (server-side on Postgres)
+# through the chunked response, so memory stays flat however large the
+# library is. prompts.jsonl/csv use the bulk import fields and re-import as-is.
+EXPORT_BATCH_SIZE = 1000
+EXPORT_PROMPT_FIELDS = ('id',) + IMPORT_FIELDS + ('created_at',)
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def stream_rows(statement):
+    return db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+def iter_user_prompts(user_id):
+    columns = [getattr(Prompt, field) for field in EXPORT_PROMPT_FIELDS]
+    statement = db.select(*columns).where(Prompt.user_id == user_id).order_by(Prompt.id)
+    for row in stream_rows(statement):
+        yield {field: export_value(value) for field, value in zip(EXPORT_PROMPT_FIELDS, row)}
+
+def iter_user_favorites(user_id):
+    statement = (db.select(Favorite.prompt_id, Prompt.title, Favorite.created_at)
+                 .join(Prompt, Prompt.id == Favorite.prompt_id)
+                 .where(Favorite.user_id == user_id)
+                 .order_by(Favorite.id))
+    for prompt_id, title, created_at in stream_rows(statement):
+        yield {'prompt_id': prompt_id, 'title': title, 'created_at': export_value(created_at)}
+
+def iter_user_bundles(user_id):
+    statement = (db.select(PromptBundle.id, PromptBundle.title, PromptBundle.description,
+                           PromptBundle.unique_link, PromptBundle.created_at, BundlePrompt.prompt_id)
+                 .outerjoin(BundlePrompt, BundlePrompt.bundle_id == PromptBundle.id)
+                 .where(PromptBundle.user_id == user_id)
+                 .order_by(PromptBundle.id, BundlePrompt.position))
+    for _, rows in itertools.groupby(stream_rows(statement), key=lambda row: row[0]):
+        rows = list(rows)
+        _, title, description, unique_link, created_at, _ = rows[0]
+        yield {
+            'title': title,
+            'description': description,
+            'unique_link': unique_link,
+            'created_at': export_value(created_at),
+            'prompt_ids': [row[5] for row in rows if row[5] is not None]
+        }
+
+def iter_table_rows(table):
+    statement = db.select(table).order_by(*table.primary_key.columns)
+    for row in stream_rows(statement):
+        yield {key: export_value(value) for key, value in row._mapping.items()}
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+def csv_lines(records, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+class StreamBuffer(io.RawIOBase):
+    """Unseekable sink that ZipFile writes into; drain() hands back what was written"""
+    
+    def __init__(self):
+        self.chunks = []
     
-    # Check if prompt is private
-    if prompt.visibility == 'private':
-        if 'user_id' not in session or session['user_id'] != prompt.user_id:
-            flash('This prompt is private!', 'error')
-            return redirect(url_for('explore'))
+    def writable(self):
+        return True
     
-    # Check if prompt is premium
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def zip_stream(files, flush_size=1 << 20):
+    """Yield a zip archive of (name, iterable of str) entries without buffering whole files"""
+    sink = StreamBuffer()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in files:
+            with archive.open(name, mode='w') as entry:
+                pending = 0
+                for chunk in chunks:
+                    data = chunk.encode('utf-8')
+                    entry.write(data)
+                    pending += len(data)
+                    if pending >= flush_size:
+                        pending = 0
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+def export_response(body, mimetype, filename):
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@main.route('/export/prompts.<fmt>')
+@login_required
+def export_prompts(fmt):
+    user_id = session['user_id']
+    if fmt == 'jsonl':
+        return export_response(jsonl_lines(iter_user_prompts(user_id)), 'application/x-ndjson', 'prompts.jsonl')
+    if fmt == 'csv':
+        return export_response(csv_lines(iter_user_prompts(user_id), EXPORT_PROMPT_FIELDS), 'text/csv', 'prompts.csv')
+    flash('Unknown export format!', 'error')
+    return redirect(url_for('main.dashboard'))
+
+@main.route('/export/library.zip')
+@login_required
+def export_library():
+    user_id = session['user_id']
+    files = [
+        ('prompts.jsonl', jsonl_lines(iter_user_prompts(user_id))),
+        ('prompts.csv', csv_lines(iter_user_prompts(user_id), EXPORT_PROMPT_FIELDS)),
+        ('favorites.jsonl', jsonl_lines(iter_user_favorites(user_id))),
+        ('bundles.jsonl', jsonl_lines(iter_user_bundles(user_id))),
+    ]
+    return export_response(zip_stream(files), 'application/zip', 'odbyte-library.zip')
+
+PREMIUM_PLANS = ('diamond', 'premium')
+
+def prompt_access_denial(prompt):
+    """Why the visitor may not see the whole prompt ('private', 'login' or 'upgrade'), or None if they may"""
+    # Private prompts are only visible to their owner
+    if prompt.visibility == 'private' and session.get('user_id') != prompt.user_id:
+        return 'private'
+    
+    # Approved premium prompts need a Diamond (or legacy Premium) plan
     if prompt.is_premium and prompt.premium_status == 'approved':
-        # Free users cannot view premium prompts
         if 'user_id' not in session:
-            flash('Please login to view premium prompts!', 'error')
-            return redirect(url_for('login'))
-        
-        user = User.query.get(session['user_id'])
-        if user.plan not in ['diamond', 'premium']:
-            flash('Upgrade to Diamond to view premium prompts!', 'error')
-            return redirect(url_for('pricing'))
+            return 'login'
+        flags = current_user_flags()
+        if not flags or flags['plan'] not in PREMIUM_PLANS:
+            return 'upgrade'
+    return None
+
+@main.route('/prompt/<int:id>')
+@replica_reads
+def view_prompt(id):
+    prompt = Prompt.query.options(db.undefer_group('body')).get_or_404(id)
     
-    is_favorited = False
-    if 'user_id' in session:
-        is_favorited = Favorite.query.filter_by(user_id=session['user_id'], prompt_id=id).first() is not None
+    denial = prompt_access_denial(prompt)
+    if denial == 'private':
+        flash('This prompt is private!', 'error')
+        return redirect(url_for('main.explore'))
+    if denial == 'login':
+        flash('Please login to view premium prompts!', 'error')
+        return redirect(url_for('main.login'))
+    if denial == 'upgrade':
+        flash('Upgrade to Diamond to view premium prompts!', 'error')
+        return redirect(url_for('main.pricing'))
+    
+    is_favorited = id in favorited_ids(session.get('user_id'), [id])
     
     return render_template('view_prompt.html', prompt=prompt, is_favorited=is_favorited)
     
-@app.route('/prompt/<int:id>/delete', methods=['POST'])
+@main.route('/prompt/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_prompt(id):
     prompt = Prompt.query.get_or_404(id)
     
     if prompt.user_id != session['user_id']:
         flash('Unauthorized access!', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     db.session.delete(prompt)
     db.session.commit()
+    invalidate_pages('prompts')
     flash('Prompt deleted successfully!', 'success')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/explore')
-def explore():
-    search = request.args.get('search', '')
-    category = request.args.get('category', '')
-    ai_model = request.args.get('ai_model', '')
-    show_premium = request.args.get('premium', '')
+def explore_query(args=None):
+    """Public prompts matching the explore filters in args (the query string by default)"""
+    args = request.args if args is None else args
+    search = args.get('search', '')
+    category = args.get('category', '')
+    ai_model = args.get('ai_model', '')
+    tag = args.get('tag', '')
+    show_premium = args.get('premium', '')
     
     # Start with public prompts
     query = Prompt.query.filter_by(visibility='public')
     
     # Apply filters
     if search:
-        query = query.filter(
-            (Prompt.title.contains(search)) | 
-            (Prompt.description.contains(search)) |
-            (Prompt.tags.contains(search))
-        )
+        query = apply_search(query, search)
     
     if category:
         query = query.filter_by(category=category)
@@ -419,140 +2465,1262 @@ def explore():
     if ai_model:
         query = query.filter_by(ai_model=ai_model)
     
+    tag_names = parse_tags(tag)[:1]
+    if tag_names:
+        tagged = db.select(PromptTag.prompt_id).join(Tag, Tag.id == PromptTag.tag_id).where(Tag.name == tag_names[0])
+        query = query.filter(Prompt.id.in_(tagged))
+    
     # Premium filter
     if show_premium == 'true':
         query = query.filter_by(is_premium=True, premium_status='approved')
     
-    prompts = query.order_by(Prompt.created_at.desc()).all()
-    
+    return query
+
+EXPLORE_SORTS = {
+    'newest': Prompt.created_at,
+    'popular': Prompt.favorite_count,
+    'trending': Prompt.trending_score,
+}
+
+def explore_results(args=None, options=(), per_page=PAGE_SIZE):
+    """(prompts, next_cursor) for one page of explore, filtered and sorted by args"""
+    args = request.args if args is None else args
+    query = explore_query(args).options(*options)
+    cursor = args.get('cursor')
+    if args.get('search'):
+        query = query.order_by(Prompt.created_at.desc(), Prompt.id.desc())
+        return offset_paginate(query, cursor, per_page)
+    sort_column = EXPLORE_SORTS.get(args.get('sort'), Prompt.created_at)
+    return keyset_paginate(query, sort_column, Prompt.id, cursor, per_page)
+
+def explore_page():
+    prompts, next_cursor = explore_results()
+    return prompts, next_page_urls('main.explore', 'main.explore_more', next_cursor)
+
+def explore_user_plan():
     # Check if user is logged in and their plan
-    user_plan = None
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        user_plan = user.plan if user else None
-    
-    categories = db.session.query(Prompt.category).filter_by(visibility='public').distinct().all()
-    ai_models = db.session.query(Prompt.ai_model).filter_by(visibility='public').distinct().all()
+    flags = current_user_flags()
+    return flags['plan'] if flags else None
+
+@main.route('/explore')
+@rate_limited('search', when=is_search)
+@cached_page('prompts')
+@replica_reads
+def explore():
+    prompts, next_page = explore_page()
+    user_plan = explore_user_plan()
+    facets = explore_facets()
     
     return render_template('explore.html', 
                          prompts=prompts, 
-                         categories=[c[0] for c in categories if c[0]], 
-                         ai_models=[m[0] for m in ai_models if m[0]],
-                         user_plan=user_plan)
+                         categories=facets['category'], 
+                         ai_models=facets['ai_model'],
+                         tags=facets['tag'],
+                         premium_count=dict(facets['premium']).get('true', 0),
+                         user_plan=user_plan,
+                         favorited=favorited_ids(session.get('user_id'), [prompt.id for prompt in prompts]),
+                         next_page=next_page)
 
-@app.route('/favorites')
+@main.route('/explore/more')
+@rate_limited('search', when=is_search)
+@replica_reads
+def explore_more():
+    prompts, next_page = explore_page()
+    return load_more_response('_explore_cards.html', next_page,
+                              prompts=prompts, user_plan=explore_user_plan(),
+                              favorited=favorited_ids(session.get('user_id'), [prompt.id for prompt in prompts]))
+
+@main.route('/favorites')
 @login_required
 def favorites():
-    user_favorites = Favorite.query.filter_by(user_id=session['user_id']).all()
+    user_favorites, next_cursor = keyset_paginate(favorites_query(), Favorite.created_at, Favorite.id,
+                                                  request.args.get('cursor'))
     favorite_prompts = [fav.prompt for fav in user_favorites]
-    return render_template('favorites.html', prompts=favorite_prompts)
+    return render_template('favorites.html', prompts=favorite_prompts,
+                           next_page=next_page_urls('main.favorites', 'main.favorites_more', next_cursor))
+
+def favorites_query():
+    # Cards show the prompt and its author, so load both in the same query
+    return Favorite.query.filter_by(user_id=session['user_id']).options(
+        db.joinedload(Favorite.prompt).joinedload(Prompt.author)
+    )
 
-@app.route('/favorite/<int:prompt_id>', methods=['POST'])
+@main.route('/favorites/more')
 @login_required
+def favorites_more():
+    user_favorites, next_cursor = keyset_paginate(favorites_query(), Favorite.created_at, Favorite.id,
+                                                  request.args.get('cursor'))
+    return load_more_response('_favorite_cards.html',
+                              next_page_urls('main.favorites', 'main.favorites_more', next_cursor),
+                              prompts=[fav.prompt for fav in user_favorites])
+
+# Favorite writes
+# Favorites are written with single core statements keyed on the unique
+# (user_id, prompt_id) index, so double-clicks from several workers can never
+# create duplicates: INSERT ... ON CONFLICT DO NOTHING adds, DELETE ...
+# RETURNING removes, and the RETURNING rows say exactly what changed for the
+# favorite_count and usage counters. Only public prompts, or the user's own,
+# can be favorited.
+FAVORITE_BATCH_LIMIT = 100
+
+PG_TOGGLE_FAVORITE = db.text("""
+    WITH removed AS (
+        DELETE FROM favorite WHERE user_id = :user_id AND prompt_id = :prompt_id
+        RETURNING prompt_id, created_at
+    ), added AS (
+        INSERT INTO favorite (user_id, prompt_id, created_at)
+        SELECT :user_id, prompt.id, :now FROM prompt
+        WHERE prompt.id = :prompt_id AND (prompt.visibility = 'public' OR prompt.user_id = :user_id)
+            AND NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (user_id, prompt_id) DO NOTHING
+        RETURNING prompt_id, created_at
+    )
+    SELECT prompt_id, created_at, -1 AS delta FROM removed
+    UNION ALL
+    SELECT prompt_id, created_at, 1 AS delta FROM added
+""")
+
+def favoritable_prompts(user_id, prompt_ids):
+    return db.select(Prompt.id).where(Prompt.id.in_(prompt_ids),
+                                      db.or_(Prompt.visibility == 'public', Prompt.user_id == user_id))
+
+def insert_favorites(user_id, prompt_ids):
+    """Favorite every allowed prompt in one statement; returns (prompt_id, created_at, +1) for new rows"""
+    connection = db.session.connection()
+    source = favoritable_prompts(user_id, prompt_ids).add_columns(
+        db.literal(user_id).label('user_id'), db.literal(datetime.utcnow(), db.DateTime).label('created_at'))
+    statement = (dialect_insert(Favorite.__table__, connection)
+                 .from_select(['prompt_id', 'user_id', 'created_at'], source)
+                 .on_conflict_do_nothing(index_elements=['user_id', 'prompt_id'])
+                 .returning(Favorite.prompt_id, Favorite.created_at))
+    return [(prompt_id, created_at, 1) for prompt_id, created_at in connection.execute(statement)]
+
+def delete_favorites(user_id, prompt_ids):
+    """Unfavorite prompts in one statement; returns (prompt_id, created_at, -1) for removed rows"""
+    statement = (db.delete(Favorite.__table__)
+                 .where(Favorite.user_id == user_id, Favorite.prompt_id.in_(prompt_ids))
+                 .returning(Favorite.prompt_id, Favorite.created_at))
+    return [(prompt_id, created_at, -1) for prompt_id, created_at in db.session.connection().execute(statement)]
+
+def toggle_favorite_row(user_id, prompt_id):
+    """Flip one favorite; returns [(prompt_id, created_at, delta)], empty if nothing could change"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(PG_TOGGLE_FAVORITE.columns(created_at=db.DateTime),
+                                  {'user_id': user_id, 'prompt_id': prompt_id, 'now': datetime.utcnow()})
+        return [tuple(row) for row in rows]
+    # SQLite has no data-modifying CTEs: try the delete, and insert only if there was nothing to delete
+    return delete_favorites(user_id, [prompt_id]) or insert_favorites(user_id, [prompt_id])
+
+def record_favorite_changes(user_id, changes):
+    """Apply (prompt_id, created_at, delta) favorite changes to favorite_count and the usage counters"""
+    if not changes:
+        return
+    table = Prompt.__table__
+    db.session.execute(db.update(table).where(table.c.id == db.bindparam('prompt_id'))
+                       .values(favorite_count=table.c.favorite_count + db.bindparam('delta')),
+                       [{'prompt_id': prompt_id, 'delta': delta} for prompt_id, _, delta in changes])
+    usage = Counter()
+    for _, created_at, delta in changes:
+        for key in usage_keys('favorites', user_id, created_at):
+            usage[key] += delta
+    apply_usage_deltas(db.session.connection(), usage)
+
+def favorited_ids(user_id, prompt_ids):
+    """The subset of prompt_ids the user has favorited, in one indexed lookup"""
+    prompt_ids = list(prompt_ids)
+    if not user_id or not prompt_ids:
+        return set()
+    rows = db.session.execute(db.select(Favorite.prompt_id)
+                              .where(Favorite.user_id == user_id, Favorite.prompt_id.in_(prompt_ids)))
+    return {row[0] for row in rows}
+
+def requested_prompt_ids(values, limit=FAVORITE_BATCH_LIMIT):
+    ids = []
+    for value in values:
+        if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+            ids.append(int(value))
+    return list(dict.fromkeys(ids))[:limit]
+
+@main.route('/favorite/<int:prompt_id>', methods=['POST'])
+@login_required
+@rate_limited('favorite')
 def toggle_favorite(prompt_id):
-    existing = Favorite.query.filter_by(user_id=session['user_id'], prompt_id=prompt_id).first()
+    changes = toggle_favorite_row(session['user_id'], prompt_id)
+    record_favorite_changes(session['user_id'], changes)
+    db.session.commit()
     
-    if existing:
-        db.session.delete(existing)
-        db.session.commit()
+    if changes and changes[0][2] < 0:
         return jsonify({'status': 'removed', 'message': 'Removed from favorites'})
-    else:
-        new_favorite = Favorite(user_id=session['user_id'], prompt_id=prompt_id)
-        db.session.add(new_favorite)
-        db.session.commit()
+    if changes or favorited_ids(session['user_id'], [prompt_id]):
+        # Nothing inserted but the row exists: a concurrent click got there first
         return jsonify({'status': 'added', 'message': 'Added to favorites'})
+    return jsonify({'status': 'error', 'message': 'Prompt not found'}), 404
 
-@app.route('/upgrade')
+@main.route('/favorites/batch', methods=['POST'])
+@login_required
+@rate_limited('favorite')
+def set_favorites():
+    """Set favorite state for many prompts: {"prompt_ids": [...], "favorited": true|false}"""
+    data = request.get_json(silent=True) or {}
+    prompt_ids = requested_prompt_ids(data.get('prompt_ids') or [])
+    favorited = bool(data.get('favorited', True))
+    
+    changes = []
+    if prompt_ids:
+        if favorited:
+            changes = insert_favorites(session['user_id'], prompt_ids)
+        else:
+            changes = delete_favorites(session['user_id'], prompt_ids)
+        record_favorite_changes(session['user_id'], changes)
+        db.session.commit()
+    
+    return jsonify({'favorited': favorited, 'changed': sorted(prompt_id for prompt_id, _, _ in changes)})
+
+@main.route('/favorites/lookup')
+@login_required
+def lookup_favorites():
+    """Which of ?ids=1,2,3 the user has favorited, for marking hearts on list pages"""
+    prompt_ids = requested_prompt_ids(request.args.get('ids', '').split(','))
+    return jsonify({'favorited': sorted(favorited_ids(session['user_id'], prompt_ids))})
+
+@main.route('/upgrade')
 @login_required
 def upgrade():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     if user.plan == 'premium':
         flash('You are already a Premium user!', 'info')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('upgrade.html', razorpay_key=RAZORPAY_KEY_ID)
 
-@app.route('/create-order', methods=['POST'])
+# API v1
+# /api/v1 serves prompts, search, shared bundles and favorites as compact JSON,
+# behind the same access rules as the HTML pages (prompt_access_denial): other
+# people's private prompts are not found, and an approved premium prompt needs
+# a Diamond plan for its description and content (lists mark it "locked").
+# ?fields=id,title,... picks the attributes returned; description and content
+# are deferred columns and are only fetched when asked for. Lists page with
+# ?cursor= (the previous page's next_cursor) and ?limit= up to API_MAX_LIMIT.
+# Every 200 carries an ETag over its body, so a client repeating a GET with
+# If-None-Match gets an empty 304 instead of the payload.
+API_MAX_LIMIT = 100
+
+API_PROMPT_FIELDS = {
+    'id': lambda prompt: prompt.id,
+    'title': lambda prompt: prompt.title,
+    'excerpt': lambda prompt: prompt.excerpt,
+    'description': lambda prompt: prompt.description,
+    'content': lambda prompt: prompt.content,
+    'tags': lambda prompt: parse_tags(prompt.tags),
+    'category': lambda prompt: prompt.category,
+    'ai_model': lambda prompt: prompt.ai_model,
+    'visibility': lambda prompt: prompt.visibility,
+    'premium': lambda prompt: bool(prompt.is_premium and prompt.premium_status == 'approved'),
+    'favorite_count': lambda prompt: prompt.favorite_count,
+    'created_at': lambda prompt: prompt.created_at.isoformat(),
+    'updated_at': lambda prompt: prompt.updated_at.isoformat() if prompt.updated_at else None,
+    'author': lambda prompt: {'id': prompt.author.id, 'name': prompt.author.name},
+    'favorited': None,  # Filled in by api_prompt_list with one lookup for the whole page
+}
+API_BODY_FIELDS = ('description', 'content')
+API_LIST_FIELDS = ('id', 'title', 'excerpt', 'tags', 'category', 'ai_model', 'premium', 'favorite_count',
+                   'created_at', 'author')
+
+# prompt_access_denial() reason -> (status, error) for a single prompt
+API_DENIALS = {
+    'private': (404, 'Prompt not found'),
+    'login': (401, 'Please login to view premium prompts!'),
+    'upgrade': (403, 'Upgrade to Diamond to view premium prompts!'),
+}
+
+def api_response(payload, status=200):
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    # Answers depend on who is logged in: let clients revalidate but never share them
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    if status == 200:
+        response.set_etag(hashlib.sha1(body).hexdigest())
+        response = response.make_conditional(request)
+    return response
+
+def api_error(status, message):
+    return api_response({'error': message}, status)
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return api_error(401, 'Login required')
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_fields(default):
+    """The ?fields= the client asked for (id always included), or default; aborts with 400 on unknown names"""
+    names = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    if not names:
+        return list(default)
+    unknown = [name for name in names if name not in API_PROMPT_FIELDS]
+    if unknown:
+        abort(api_error(400, f"Unknown fields: {', '.join(unknown)}"))
+    return list(dict.fromkeys(['id'] + names))
+
+def api_limit():
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    return min(max(limit, 1), API_MAX_LIMIT)
+
+def api_prompt_options(fields):
+    """Loader options fetching only what the fields need besides the always-loaded card columns"""
+    options = [db.undefer(getattr(Prompt, field)) for field in API_BODY_FIELDS if field in fields]
+    if 'author' in fields:
+        options.append(db.joinedload(Prompt.author).load_only(User.id, User.name))
+    return options
+
+def api_prompt_data(prompt, fields, favorited=(), denial=None):
+    data = {}
+    for field in fields:
+        if field == 'favorited':
+            data[field] = prompt.id in favorited
+        elif not (denial and field in API_BODY_FIELDS):
+            data[field] = API_PROMPT_FIELDS[field](prompt)
+    if denial:
+        data['locked'] = denial
+    return data
+
+def api_prompt_list(prompts, fields, favorited=None):
+    """Serialize a page of prompts; prompts the visitor may not open keep their metadata and are locked"""
+    if favorited is None and 'favorited' in fields:
+        favorited = favorited_ids(session.get('user_id'), [prompt.id for prompt in prompts])
+    return [api_prompt_data(prompt, fields, favorited or (), prompt_access_denial(prompt)) for prompt in prompts]
+
+@main.route('/api/v1/prompts')
+@rate_limited('search', when=is_search)
+@replica_reads
+def api_prompts():
+    """Public prompts with the explore filters: category, ai_model, tag, premium, sort and search"""
+    fields = api_fields(API_LIST_FIELDS)
+    prompts, next_cursor = explore_results(request.args, api_prompt_options(fields), api_limit())
+    return api_response({'data': api_prompt_list(prompts, fields), 'next_cursor': next_cursor})
+
+@main.route('/api/v1/search')
+@rate_limited('search')
+@replica_reads
+def api_search():
+    """Full-text search over public prompts: ?q= plus the /api/v1/prompts filters"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return api_error(400, 'Missing search query q')
+    args = request.args.to_dict()
+    args['search'] = query
+    fields = api_fields(API_LIST_FIELDS)
+    prompts, next_cursor = explore_results(args, api_prompt_options(fields), api_limit())
+    return api_response({'data': api_prompt_list(prompts, fields), 'next_cursor': next_cursor})
+
+@main.route('/api/v1/prompts/batch')
+@replica_reads
+def api_prompt_batch():
+    """Up to API_MAX_LIMIT prompts by ?ids=1,2,3 in one query, in the order asked for"""
+    ids = requested_prompt_ids(request.args.get('ids', '').split(','), API_MAX_LIMIT)
+    if not ids:
+        return api_error(400, 'Missing prompt ids')
+    fields = api_fields(API_LIST_FIELDS)
+    found = {prompt.id: prompt for prompt in
+             Prompt.query.options(*api_prompt_options(fields)).filter(Prompt.id.in_(ids))}
+    prompts = [found[id] for id in ids if id in found and prompt_access_denial(found[id]) != 'private']
+    returned = {prompt.id for prompt in prompts}
+    return api_response({'data': api_prompt_list(prompts, fields),
+                         'missing': [id for id in ids if id not in returned]})
+
+@main.route('/api/v1/prompts/<int:id>')
+@replica_reads
+def api_prompt(id):
+    fields = api_fields(API_PROMPT_FIELDS)
+    prompt = db.session.get(Prompt, id, options=api_prompt_options(fields))
+    denial = prompt_access_denial(prompt) if prompt else 'private'
+    if denial:
+        return api_error(*API_DENIALS[denial])
+    favorited = favorited_ids(session.get('user_id'), [id]) if 'favorited' in fields else ()
+    return api_response(api_prompt_data(prompt, fields, favorited))
+
+@main.route('/api/v1/bundles/<link>')
+@replica_reads
+def api_bundle(link):
+    """A shared bundle (the JSON of /b/<link>) with its prompts in order"""
+    bundle = (PromptBundle.query.options(db.joinedload(PromptBundle.author).load_only(User.id, User.name))
+              .filter_by(unique_link=link).first())
+    if bundle is None:
+        return api_error(404, 'Bundle not found')
+    fields = api_fields(API_LIST_FIELDS)
+    prompts = bundle.prompts_query().options(*api_prompt_options(fields)).all()
+    return api_response({
+        'id': bundle.id,
+        'title': bundle.title,
+        'description': bundle.description,
+        'link': bundle.unique_link,
+        'author': {'id': bundle.author.id, 'name': bundle.author.name},
+        'created_at': bundle.created_at.isoformat(),
+        'prompts': api_prompt_list(prompts, fields),
+    })
+
+@main.route('/api/v1/favorites')
+@api_login_required
+@replica_reads
+def api_favorites():
+    """The logged-in user's favorites, newest first, each with its favorited_at"""
+    fields = api_fields(API_LIST_FIELDS)
+    query = Favorite.query.filter_by(user_id=session['user_id']).options(
+        db.joinedload(Favorite.prompt).options(*api_prompt_options(fields)))
+    user_favorites, next_cursor = keyset_paginate(query, Favorite.created_at, Favorite.id,
+                                                  request.args.get('cursor'), api_limit())
+    prompts = [favorite.prompt for favorite in user_favorites]
+    data = api_prompt_list(prompts, fields, favorited={prompt.id for prompt in prompts})
+    for item, favorite in zip(data, user_favorites):
+        item['favorited_at'] = favorite.created_at.isoformat()
+    return api_response({'data': data, 'next_cursor': next_cursor})
+
+# Payments
+# Orders are created through the payment service on its own worker threads: the
+# request waits at most PAYMENT_ORDER_WAIT seconds and otherwise answers 202
+# with a URL to poll, so a slow gateway never pins a gunicorn worker for a
+# whole round trip. Each checkout click carries an Idempotency-Key, so retries
+# and double-clicks reuse one PaymentOrder. An order whose thread died (a crash,
+# a restart) is marked failed once it has been 'creating' for
+# PAYMENT_ORDER_EXPIRY seconds, so polling always ends. A payment is completed
+# by the checkout callback or the Razorpay webhook, whichever arrives first.
+PLAN_PRICES = {'monthly': 500, 'annual': 3900}  # $5 / $39 in cents
+PLAN_CURRENCY = 'USD'
+
+def finish_payment_order(payment_order_id, **values):
+    """Record the gateway's answer unless the order already left 'creating' (say, expired meanwhile)"""
+    db.session.execute(db.update(PaymentOrder)
+                       .where(PaymentOrder.id == payment_order_id, PaymentOrder.status == 'creating')
+                       .values(**values).execution_options(synchronize_session=False))
+    db.session.commit()
+
+def create_gateway_order(app, payment_order_id):
+    """Runs on a payment service thread: ask Razorpay for the order and record the answer"""
+    from payments import PaymentGatewayError
+    with app.app_context():
+        order = db.session.get(PaymentOrder, payment_order_id)
+        if order is None or order.status != 'creating':
+            return
+        key = order.idempotency_key
+        try:
+            gateway_order = get_payment_service().create_order(order.amount, order.currency, key,
+                                                         notes={'user_id': order.user_id, 'plan_type': order.plan_type})
+            finish_payment_order(payment_order_id, order_id=gateway_order['id'], status='created')
+        except PaymentGatewayError as e:
+            app.logger.warning('Razorpay order %s failed: %s', key, e)
+            finish_payment_order(payment_order_id, status='failed', error=str(e)[:500])
+        except Exception as e:
+            # Anything else would leave the order 'creating' and its client polling until it expires
+            app.logger.exception('Razorpay order %s failed', key)
+            db.session.rollback()
+            finish_payment_order(payment_order_id, status='failed', error=f'{type(e).__name__}: {e}'[:500])
+
+def expire_payment_order(order):
+    """Fail an order stuck in 'creating' for longer than PAYMENT_ORDER_EXPIRY"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['PAYMENT_ORDER_EXPIRY'])
+    if order.status != 'creating' or order.created_at >= cutoff:
+        return
+    finish_payment_order(order.id, status='failed', error='Expired while waiting for the gateway')
+    db.session.refresh(order)
+
+def payment_order_response(order):
+    expire_payment_order(order)
+    if order.status == 'creating':
+        return jsonify({'status': 'pending', 'poll_url': url_for('main.payment_order_status', id=order.id)}), 202
+    if order.status == 'failed':
+        return jsonify({'status': 'failed', 'error': 'The payment gateway is unavailable, please try again.'}), 502
+    return jsonify({
+        'status': order.status,
+        'order_id': order.order_id,
+        'amount': order.amount,
+        'currency': order.currency,
+        'key': RAZORPAY_KEY_ID,
+        'plan_type': order.plan_type
+    })
+
+@main.route('/create-order', methods=['POST'])
 @login_required
+@rate_limited('payment')
 def create_order():
-    data = request.get_json()
-    plan_type = data.get('plan_type', 'monthly')  # 'monthly' or 'annual'
-    
-    if plan_type == 'annual':
-        amount = 3900  # $39 in cents
-    else:
-        amount = 500  # $5 in cents
+    data = request.get_json(silent=True) or {}
+    plan_type = 'annual' if data.get('plan_type') == 'annual' else 'monthly'
+    client_key = request.headers.get('Idempotency-Key') or secrets.token_urlsafe(16)
+    key = f"{session['user_id']}:{client_key}"[:100]
     
-    order_data = {
-        'amount': amount,
-        'currency': 'USD',
-        'payment_capture': 1
-    }
+    order = PaymentOrder.query.filter_by(idempotency_key=key).first()
+    if order is None:
+        order = PaymentOrder(idempotency_key=key, user_id=session['user_id'], plan_type=plan_type,
+                             amount=PLAN_PRICES[plan_type], currency=PLAN_CURRENCY)
+        db.session.add(order)
+        try:
+            db.session.commit()
+        except db.exc.IntegrityError:
+            # The same click arrived twice at once; answer with the other request's order
+            db.session.rollback()
+            order = PaymentOrder.query.filter_by(idempotency_key=key).one()
+        else:
+            future = get_payment_service().submit(create_gateway_order, current_app._get_current_object(), order.id)
+            try:
+                future.result(timeout=current_app.config['PAYMENT_ORDER_WAIT'])
+            except TimeoutError:
+                pass
+            db.session.refresh(order)
     
-    order = razorpay_client.order.create(data=order_data)
+    return payment_order_response(order)
+
+@main.route('/create-order/<int:id>')
+@login_required
+def payment_order_status(id):
+    order = PaymentOrder.query.filter_by(id=id, user_id=session['user_id']).first_or_404()
+    return payment_order_response(order)
+
+def complete_payment(order, payment_id):
+    """Mark a PaymentOrder paid and upgrade its user, exactly once; returns False if already done"""
+    claimed = db.session.execute(
+        db.update(PaymentOrder)
+        .where(PaymentOrder.id == order.id, PaymentOrder.status != 'paid')
+        .values(status='paid', payment_id=payment_id, paid_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return False
     
-    return jsonify({
-        'order_id': order['id'],
-        'amount': amount,
-        'currency': 'USD',
-        'key': RAZORPAY_KEY_ID,
-        'plan_type': plan_type
-    })
-@app.route('/payment-success', methods=['POST'])
+    user = db.session.get(User, order.user_id)
+    user.plan = 'premium'
+    db.session.add(Payment(
+        payment_id=payment_id,
+        order_id=order.order_id,
+        amount=order.amount,
+        currency=order.currency,
+        status='success',
+        user_id=user.id
+    ))
+    db.session.commit()
+    invalidate_user_flags(user.id)
+    return True
+
+@main.route('/payment-success', methods=['POST'])
 @login_required
 def payment_success():
     payment_id = request.form.get('razorpay_payment_id')
     order_id = request.form.get('razorpay_order_id')
     signature = request.form.get('razorpay_signature')
     
-    try:
-        razorpay_client.utility.verify_payment_signature({
-            'razorpay_order_id': order_id,
-            'razorpay_payment_id': payment_id,
-            'razorpay_signature': signature
-        })
-        
-        user = User.query.get(session['user_id'])
-        user.plan = 'premium'
-        
-        payment = Payment(
-            payment_id=payment_id,
-            order_id=order_id,
-            amount=49900,
-            status='success',
-            user_id=user.id
-        )
-        
-        db.session.add(payment)
-        db.session.commit()
-        
-        session['user_plan'] = 'premium'
-        flash('Payment successful! Welcome to Premium!', 'success')
-        return redirect(url_for('payment_success_page'))
-    
-    except:
+    order = None
+    if get_payment_service().verify_payment_signature(order_id, payment_id, signature):
+        order = PaymentOrder.query.filter_by(order_id=order_id, user_id=session['user_id']).first()
+    if order is None:
         flash('Payment verification failed!', 'error')
-        return redirect(url_for('upgrade'))
+        return redirect(url_for('main.upgrade'))
+    
+    # The webhook may already have completed this order; either way the user is upgraded
+    complete_payment(order, payment_id)
+    session['user_plan'] = 'premium'
+    flash('Payment successful! Welcome to Premium!', 'success')
+    return redirect(url_for('main.payment_success_page'))
+
+@main.route('/webhooks/razorpay', methods=['POST'])
+def razorpay_webhook():
+    body = request.get_data()
+    if not get_payment_service().verify_webhook_signature(body, request.headers.get('X-Razorpay-Signature')):
+        return jsonify({'error': 'invalid signature'}), 400
+    
+    event = request.get_json(silent=True) or {}
+    if event.get('event') in ('payment.captured', 'order.paid'):
+        payment = event.get('payload', {}).get('payment', {}).get('entity', {})
+        order = PaymentOrder.query.filter_by(order_id=payment.get('order_id')).first()
+        if order is not None and payment.get('id'):
+            complete_payment(order, payment['id'])
+    return jsonify({'status': 'ok'})
 
-@app.route('/success')
+@main.route('/success')
 @login_required
 def payment_success_page():
     return render_template('success.html')
 
-# Initialize database tables on startup
-def init_db():
-    with app.app_context():
+# Background jobs
+# Slow or deferrable work (notifications, imports of large uploads, search
+# reindexing, trending recomputation) is queued as rows in the job table and
+# run by `flask worker`, so it needs nothing besides the database. enqueue()
+# only adds the row to the session: the job commits, or rolls back, together
+# with the write that asked for it. Workers claim due jobs with one conditional
+# UPDATE (FOR UPDATE SKIP LOCKED on Postgres), so several can share the queue,
+# and failures are retried with exponential backoff up to max_attempts. While a
+# job runs, a side thread bumps its heartbeat_at every JOB_HEARTBEAT_INTERVAL
+# seconds; a running job whose heartbeat is older than JOB_TIMEOUT belonged to
+# a worker that died and is requeued, however long the job itself may take.
+# Outcomes are only recorded by the worker that still holds the job. With
+# JOBS_IN_PROCESS=1 each web process runs a worker thread instead, for
+# deployments without a separate worker.
+@main.record_once
+def job_settings(state):
+    config = state.app.config
+    config.setdefault('JOB_TIMEOUT', int(os.environ.get('JOB_TIMEOUT', 600)))
+    config.setdefault('JOB_HEARTBEAT_INTERVAL', float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 30)))
+    config.setdefault('JOB_POLL_INTERVAL', float(os.environ.get('JOB_POLL_INTERVAL', 1)))
+    config.setdefault('JOBS_IN_PROCESS', os.environ.get('JOBS_IN_PROCESS') == '1')
+JOB_RETRY_DELAY = 30  # seconds before the first retry, doubled after each failure
+JOB_KEEP_DAYS = 7
+JOB_METRICS_WINDOW = timedelta(hours=1)
+NOTIFICATION_LIMIT = 5  # unread notifications shown on the dashboard
+JOB_HANDLERS = {}
+# Jobs the worker keeps scheduled by itself: name -> seconds between runs
+RECURRING_JOBS = {'recompute_trending': 300, 'purge_jobs': 86400}
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments for the handler
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Bumped by JobHeartbeat while the job runs
+    finished_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at', 'id'),
+        db.Index('ix_job_name_status', 'name', 'status'),
+    )
+
+class Notification(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    message = db.Column(db.String(500), nullable=False)
+    link = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_notification_user_id_read_at', 'user_id', 'read_at', 'created_at'),
+    )
+
+def job(name, max_attempts=3):
+    """Register a handler; it is called with the job's payload as keyword arguments"""
+    def decorator(f):
+        JOB_HANDLERS[name] = (f, max_attempts)
+        return f
+    return decorator
+
+def enqueue(name, payload=None, delay=0, run_at=None, max_attempts=None):
+    """Add a job to the current session; it is queued when the session commits"""
+    if name not in JOB_HANDLERS:
+        raise KeyError(f'Unknown job "{name}"')
+    row = Job(name=name, payload=json.dumps(payload or {}),
+              run_at=run_at or datetime.utcnow() + timedelta(seconds=delay),
+              max_attempts=max_attempts or JOB_HANDLERS[name][1])
+    db.session.add(row)
+    return row
+
+def notify(user_id, message, link=None):
+    """Queue an in-app notification for a user"""
+    return enqueue('notify_user', {'user_id': user_id, 'message': message, 'link': link})
+
+def claim_job(worker_id):
+    """Mark the next due job running for this worker and return it, or None"""
+    now = datetime.utcnow()
+    due = (db.select(Job.id).where(Job.status == 'queued', Job.run_at <= now)
+           .order_by(Job.run_at, Job.id).limit(1))
+    if db.session.get_bind().dialect.name == 'postgresql':
+        due = due.with_for_update(skip_locked=True)
+    claimed = db.session.scalars(
+        db.update(Job).where(Job.id == due.scalar_subquery(), Job.status == 'queued')
+        .values(status='running', attempts=Job.attempts + 1, started_at=now, heartbeat_at=now, locked_by=worker_id)
+        .returning(Job)
+        .execution_options(synchronize_session=False)).first()
+    db.session.commit()
+    return claimed
+
+def finish_job(job_id, worker_id, error=None):
+    """Record a job's outcome; a no-op returning None if worker_id no longer holds the job"""
+    row = db.session.get(Job, job_id, populate_existing=True)
+    now = datetime.utcnow()
+    values = {'locked_by': None}
+    if error is None:
+        values.update(status='done', finished_at=now)
+    elif row.attempts < row.max_attempts:
+        values.update(status='queued', run_at=now + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (row.attempts - 1)))
+    else:
+        values.update(status='failed', finished_at=now)
+    if error is not None:
+        values['last_error'] = error[-2000:]
+    finished = db.session.execute(
+        db.update(Job).where(Job.id == job_id, Job.status == 'running', Job.locked_by == worker_id)
+        .values(**values).execution_options(synchronize_session=False)).rowcount
+    if not finished:
+        db.session.rollback()
+        current_app.logger.warning('Job %s (%s) is no longer held by %s; not recording its outcome',
+                                   job_id, row.name, worker_id)
+        return None
+    if values['status'] != 'queued' and row.name in RECURRING_JOBS:
+        schedule_recurring(row.name)
+    db.session.commit()
+    return values['status']
+
+class JobHeartbeat:
+    """Bumps a running job's heartbeat_at from a side thread, on its own connection, until stopped"""
+    
+    def __init__(self, app, job_id, worker_id, interval):
+        self.app = app
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f'job-heartbeat-{job_id}', daemon=True)
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+    
+    def run(self):
+        table = Job.__table__
+        with self.app.app_context():
+            while not self.stopped.wait(self.interval):
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(db.update(table)
+                                           .where(table.c.id == self.job_id, table.c.locked_by == self.worker_id)
+                                           .values(heartbeat_at=datetime.utcnow()))
+                except Exception:
+                    # Busy database or similar: the next beat tries again well within JOB_TIMEOUT
+                    self.app.logger.warning('Heartbeat for job %s failed', self.job_id, exc_info=True)
+
+def run_job(row):
+    """Run one claimed job and record the outcome; returns the job's new status"""
+    job_id, name, payload, worker_id = row.id, row.name, json.loads(row.payload), row.locked_by
+    heartbeat = JobHeartbeat(current_app._get_current_object(), job_id, worker_id,
+                             current_app.config['JOB_HEARTBEAT_INTERVAL'])
+    try:
+        with heartbeat:
+            if name not in JOB_HANDLERS:
+                raise LookupError(f'No handler registered for job "{name}"')
+            JOB_HANDLERS[name][0](**payload)
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Job %s (%s) failed', job_id, name)
+        return finish_job(job_id, worker_id, error=f'{type(e).__name__}: {e}')
+    return finish_job(job_id, worker_id)
+
+def schedule_recurring(name):
+    """Queue the next run of a recurring job unless one is already waiting"""
+    waiting = db.session.query(Job.id).filter(Job.name == name, Job.status == 'queued').first()
+    if waiting is None:
+        enqueue(name, delay=RECURRING_JOBS[name])
+
+def ensure_recurring_jobs():
+    """Queue every recurring job that has no queued or running instance, due now"""
+    scheduled = {name for (name,) in db.session.query(Job.name).distinct()
+                 .filter(Job.name.in_(RECURRING_JOBS), Job.status.in_(('queued', 'running')))}
+    for name in RECURRING_JOBS:
+        if name not in scheduled:
+            enqueue(name)
+    db.session.commit()
+
+def requeue_stale_jobs():
+    """Give up on running jobs whose worker has sent no heartbeat for JOB_TIMEOUT"""
+    now = datetime.utcnow()
+    stale = db.and_(Job.status == 'running',
+                    db.func.coalesce(Job.heartbeat_at, Job.started_at)
+                    < now - timedelta(seconds=current_app.config['JOB_TIMEOUT']))
+    timeout = 'Timed out: worker stopped responding'
+    requeued = db.session.execute(
+        db.update(Job).where(stale, Job.attempts < Job.max_attempts)
+        .values(status='queued', run_at=now, locked_by=None, last_error=timeout)).rowcount
+    failed = db.session.execute(
+        db.update(Job).where(stale)
+        .values(status='failed', finished_at=now, locked_by=None, last_error=timeout)).rowcount
+    db.session.commit()
+    return requeued + failed
+
+def work(worker_id=None, burst=False, max_jobs=None, stop=None):
+    """Run jobs until stopped; with burst, return once no job is due"""
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    stop = stop or threading.Event()
+    ensure_recurring_jobs()
+    processed = 0
+    while not stop.is_set():
         try:
-            db.create_all()
-            print("=" * 50)
-            print("✅ Database tables created successfully!")
-            print("=" * 50)
-        except Exception as e:
-            print("=" * 50)
-            print(f"❌ Error creating database tables: {e}")
-            print("=" * 50)
+            row = claim_job(worker_id)
+            if row is None:
+                if burst:
+                    break
+                requeue_stale_jobs()
+                stop.wait(current_app.config['JOB_POLL_INTERVAL'])
+                continue
+            run_job(row)
+        except Exception:
+            # Database unavailable or similar: keep the worker alive and try again
+            db.session.rollback()
+            current_app.logger.exception('Job worker %s hit an error', worker_id)
+            stop.wait(current_app.config['JOB_POLL_INTERVAL'])
+            continue
+        processed += 1
+        if max_jobs and processed >= max_jobs:
+            break
+    db.session.remove()
+    return processed
+
+job_thread = None
+job_thread_lock = threading.Lock()
+
+def start_job_thread(app):
+    """Start this process's in-process worker thread, once"""
+    global job_thread
+    with job_thread_lock:
+        if job_thread is not None and job_thread.is_alive():
+            return job_thread
+
+        def run():
+            with app.app_context():
+                work()
+
+        job_thread = threading.Thread(target=run, name='job-worker', daemon=True)
+        job_thread.start()
+        return job_thread
+
+@main.before_app_request
+def start_in_process_worker():
+    if current_app.config['JOBS_IN_PROCESS'] and job_thread is None:
+        start_job_thread(current_app._get_current_object())
+
+def job_metrics(now=None):
+    """Queue depth by status, age of the oldest due job, and wait/run times of recent jobs per name"""
+    now = now or datetime.utcnow()
+    depth = {status: 0 for status in ('queued', 'running', 'done', 'failed')}
+    depth.update(db.session.query(Job.status, db.func.count()).group_by(Job.status))
+    oldest_due = (db.session.query(db.func.min(Job.run_at))
+                  .filter(Job.status == 'queued', Job.run_at <= now).scalar())
+    recent = (db.session.query(Job.name, Job.status, Job.run_at, Job.started_at, Job.finished_at)
+              .filter(Job.status.in_(('done', 'failed')), Job.finished_at >= now - JOB_METRICS_WINDOW))
+    by_name = {}
+    for name, status, run_at, started_at, finished_at in recent:
+        stats = by_name.setdefault(name, {'done': 0, 'failed': 0, 'wait': [], 'run': []})
+        stats[status] += 1
+        if started_at:
+            stats['wait'].append(max((started_at - run_at).total_seconds(), 0))
+            stats['run'].append(max((finished_at - started_at).total_seconds(), 0))
+    jobs = {}
+    for name, stats in sorted(by_name.items()):
+        waits, runs = stats['wait'], stats['run']
+        jobs[name] = {
+            'done': stats['done'],
+            'failed': stats['failed'],
+            'avg_wait_seconds': round(sum(waits) / len(waits), 3) if waits else None,
+            'max_wait_seconds': round(max(waits), 3) if waits else None,
+            'avg_run_seconds': round(sum(runs) / len(runs), 3) if runs else None,
+        }
+    return {
+        'depth': depth,
+        'oldest_due_seconds': round((now - oldest_due).total_seconds(), 3) if oldest_due else 0,
+        'window_seconds': int(JOB_METRICS_WINDOW.total_seconds()),
+        'jobs': jobs,
+    }
+
+@job('notify_user')
+def notify_user_job(user_id, message, link=None):
+    db.session.add(Notification(user_id=user_id, message=message, link=link))
+
+@job('notify_admins')
+def notify_admins_job(message, link=None):
+    admin_ids = db.session.scalars(db.select(User.id).where(User.is_admin == True)).all()
+    db.session.add_all(Notification(user_id=admin_id, message=message, link=link) for admin_id in admin_ids)
+
+@job('import_prompts', max_attempts=1)
+def import_prompts_job(user_id, path, import_format, link=None):
+    # A retry would insert the chunks that already committed a second time, so this runs once
+    user = db.session.get(User, user_id)
+    try:
+        with open(path, 'rb') as stream:
+            records = iter_csv_records(stream) if import_format == 'csv' else iter_json_records(stream)
+            remaining = max(prompt_limit_for(user.plan) - monthly_usage(user.id, 'prompts'), 0)
+            report = import_prompts(user, records, remaining=remaining)
+        db.session.add(Notification(user_id=user_id, link=link, message=(
+            f"Bulk import finished: {report['imported']} imported, {report['failed']} failed, "
+            f"{report['over_limit']} over your plan limit.")))
+    except Exception:
+        db.session.rollback()
+        db.session.add(Notification(user_id=user_id, link=link,
+                                    message='Bulk import failed. Please check the file and try again.'))
+        db.session.commit()
+        raise
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+@job('recompute_trending')
+def recompute_trending_job():
+    recompute_trending()
+    db.session.commit()
+    invalidate_pages('prompts')
 
-# Run initialization
-init_db()
+@job('recount_favorites')
+def recount_favorites_job():
+    recount_favorites()
+
+@job('refresh_facets')
+def refresh_facets_job():
+    refresh_facets()
+    db.session.commit()
+    invalidate_pages('prompts')
+
+@job('reconcile_usage')
+def reconcile_usage_job():
+    reconcile_usage()
+
+@job('rebuild_search_index', max_attempts=1)
+def rebuild_search_index_job():
+    rebuild_search_index()
+
+@job('purge_jobs')
+def purge_jobs_job(days=JOB_KEEP_DAYS):
+    db.session.execute(db.delete(Job).where(Job.status.in_(('done', 'failed')),
+                                            Job.finished_at < datetime.utcnow() - timedelta(days=days)))
+
+# Schema migrations
+# db.create_all() only creates missing tables, so changes to existing tables
+# (new indexes, columns, data moves) are versioned migrations recorded in
+# schema_migration. Each one must be idempotent: on a fresh database
+# create_all has already built the final schema and the migration only
+# records itself.
+class SchemaMigration(db.Model):
+    version = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def create_missing_indexes(table, *names):
+    """Create the named indexes of a model table; a migration lists only the indexes it introduces,
+    since the model may already have indexes on columns a later migration adds"""
+    bind = db.session.connection()
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        indexes[name].create(bind, checkfirst=True)
+
+def add_missing_column(table, column):
+    """ALTER TABLE ... ADD COLUMN for a model column the live table does not have yet"""
+    bind = db.session.connection()
+    if column.name in {c['name'] for c in db.inspect(bind).get_columns(table.name)}:
+        return
+    column_type = column.type.compile(dialect=bind.dialect)
+    default = ''
+    if column.server_default is not None:
+        default = f' DEFAULT {column.server_default.arg}'
+    bind.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}'))
+
+def migrate_unique_favorites():
+    # Concurrent double-clicks could insert the same favorite twice; keep the oldest row
+    keep = db.select(db.func.min(Favorite.id)).group_by(Favorite.user_id, Favorite.prompt_id)
+    db.session.execute(db.delete(Favorite).where(Favorite.id.not_in(keep)))
+    create_missing_indexes(Favorite.__table__, 'uq_favorite_user_id_prompt_id')
+
+def migrate_hot_query_indexes():
+    create_missing_indexes(Prompt.__table__, 'ix_prompt_visibility_created_at', 'ix_prompt_visibility_category_created_at',
+                           'ix_prompt_visibility_ai_model_created_at', 'ix_prompt_user_id_created_at',
+                           'ix_prompt_premium_status_created_at')
+    create_missing_indexes(Favorite.__table__, 'ix_favorite_user_id_created_at', 'ix_favorite_prompt_id')
+    create_missing_indexes(PromptBundle.__table__, 'ix_prompt_bundle_user_id_created_at')
+    create_missing_indexes(BundlePrompt.__table__, 'ix_bundle_prompt_bundle_position', 'ix_bundle_prompt_prompt_id')
+
+def migrate_facets():
+    # create_all has made the facet and tag tables; fill them from existing prompts
+    refresh_facets()
+
+def migrate_usage_counters():
+    reconcile_usage()
+
+def migrate_ranking_columns():
+    add_missing_column(Prompt.__table__, Prompt.__table__.c.favorite_count)
+    add_missing_column(Prompt.__table__, Prompt.__table__.c.trending_score)
+    create_missing_indexes(Prompt.__table__, 'ix_prompt_visibility_favorite_count', 'ix_prompt_visibility_trending_score')
+    create_missing_indexes(Favorite.__table__, 'ix_favorite_created_at')
+    recount_favorites(touch=False)  # updated_at arrives in 0008
+    recompute_trending()
+
+def migrate_prompt_excerpt():
+    add_missing_column(Prompt.__table__, Prompt.__table__.c.excerpt)
+    # The SQL twin of prompt_excerpt(), on the prompt table as of this migration (no updated_at yet)
+    prompt = db.table('prompt', db.column('excerpt', db.Text), db.column('description', db.Text))
+    db.session.execute(db.update(prompt).where(prompt.c.excerpt.is_(None)).values(excerpt=db.case(
+        (db.func.length(prompt.c.description) > EXCERPT_LENGTH,
+         db.func.rtrim(db.func.substr(prompt.c.description, 1, EXCERPT_LENGTH), type_=db.Text) + '...'),
+        else_=prompt.c.description)))
+
+def migrate_prompt_updated_at():
+    add_missing_column(Prompt.__table__, Prompt.__table__.c.updated_at)
+    db.session.execute(db.update(Prompt).where(Prompt.updated_at.is_(None))
+                       .values(updated_at=Prompt.created_at).execution_options(synchronize_session=False))
+
+def migrate_search_index():
+    # Earlier versions created prompt_fts without indexing the prompts already there
+    if search_backend() == 'fts5':
+        db.session.execute(db.text(SQLITE_SEARCH_REBUILD))
+
+def migrate_job_heartbeat():
+    add_missing_column(Job.__table__, Job.__table__.c.heartbeat_at)
+
+MIGRATIONS = [
+    ('0001_bundle_prompt_rows', migrate_bundle_prompt_ids),
+    ('0002_unique_favorites', migrate_unique_favorites),
+    ('0003_hot_query_indexes', migrate_hot_query_indexes),
+    ('0004_facets', migrate_facets),
+    ('0005_usage_counters', migrate_usage_counters),
+    ('0006_ranking_columns', migrate_ranking_columns),
+    ('0007_prompt_excerpt', migrate_prompt_excerpt),
+    ('0008_prompt_updated_at', migrate_prompt_updated_at),
+    ('0009_search_index_backfill', migrate_search_index),
+    ('0010_job_heartbeat', migrate_job_heartbeat),
+]
+
+def pending_migrations():
+    applied = {row[0] for row in db.session.query(SchemaMigration.version)}
+    return [(version, migration) for version, migration in MIGRATIONS if version not in applied]
+
+def upgrade_db():
+    """Apply pending migrations in order, each in its own transaction"""
+    applied = []
+    for version, migration in pending_migrations():
+        try:
+            migration()
+            db.session.add(SchemaMigration(version=version))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+# Hot query shapes and the EXPLAIN check that keeps them on indexes
+def hot_queries():
+    sample_date = datetime(2025, 1, 1)
+    return {
+        'explore': Prompt.query.filter_by(visibility='public')
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'explore_next_page': Prompt.query.filter_by(visibility='public')
+            .filter(db.or_(Prompt.created_at < sample_date,
+                           db.and_(Prompt.created_at == sample_date, Prompt.id < 1000)))
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'explore_category': Prompt.query.filter_by(visibility='public', category='Coding')
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'explore_ai_model': Prompt.query.filter_by(visibility='public', ai_model='ChatGPT')
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'explore_tag': Prompt.query.filter_by(visibility='public')
+            .filter(Prompt.id.in_(db.select(PromptTag.prompt_id).join(Tag, Tag.id == PromptTag.tag_id)
+                                  .where(Tag.name == 'marketing')))
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'explore_facets': FacetCount.query.filter(FacetCount.facet.in_(('category', 'ai_model', 'premium')),
+                                                  FacetCount.count > 0),
+        'explore_top_tags': FacetCount.query.filter(FacetCount.facet == 'tag', FacetCount.count > 0)
+            .order_by(FacetCount.count.desc()).limit(EXPLORE_TAG_LIMIT),
+        'explore_popular': Prompt.query.filter_by(visibility='public')
+            .order_by(Prompt.favorite_count.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'explore_trending': Prompt.query.filter_by(visibility='public')
+            .order_by(Prompt.trending_score.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'trending_window': db.session.query(Favorite.prompt_id, Favorite.created_at)
+            .filter(Favorite.created_at >= sample_date),
+        'dashboard': Prompt.query.filter_by(user_id=1)
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'prompt_count': db.session.query(db.func.count(Prompt.id)).filter_by(user_id=1),
+        'admin_queue': Prompt.query.filter_by(premium_status='pending')
+            .order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(PAGE_SIZE),
+        'moderation_counts': db.session.query(Prompt.premium_status, db.func.count())
+            .filter(Prompt.premium_status.in_(('pending', 'approved'))).group_by(Prompt.premium_status),
+        'favorites': Favorite.query.filter_by(user_id=1)
+            .order_by(Favorite.created_at.desc(), Favorite.id.desc()).limit(PAGE_SIZE),
+        'is_favorited': Favorite.query.filter_by(user_id=1, prompt_id=1),
+        'bundles': PromptBundle.query.filter_by(user_id=1).order_by(PromptBundle.created_at.desc()),
+        'bundle_prompts': Prompt.query.join(BundlePrompt, BundlePrompt.prompt_id == Prompt.id)
+            .filter(BundlePrompt.bundle_id == 1).order_by(BundlePrompt.position),
+        'job_claim': Job.query.filter(Job.status == 'queued', Job.run_at <= sample_date)
+            .order_by(Job.run_at, Job.id).limit(1),
+        'notifications': Notification.query.filter_by(user_id=1, read_at=None)
+            .order_by(Notification.created_at.desc()).limit(NOTIFICATION_LIMIT),
+    }
+
+def explain_query(query):
+    """Return the plan lines the database reports for an ORM query"""
+    bind = db.session.connection()
+    sql = str(query.statement.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True}))
+    if bind.dialect.name == 'sqlite':
+        return [row[-1] for row in bind.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+    return [row[0] for row in bind.execute(db.text('EXPLAIN ' + sql))]
+
+def plan_problems(plan, dialect):
+    """Plan lines showing a full table scan or a sort the index should have avoided"""
+    problems = []
+    for line in plan:
+        if dialect == 'sqlite':
+            if (line.startswith('SCAN ') and ' USING ' not in line) or 'TEMP B-TREE' in line:
+                problems.append(line)
+        elif 'Seq Scan' in line or line.strip().startswith('Sort '):
+            problems.append(line)
+    return problems
+
+def check_query_plans():
+    """Map each hot query to the plan lines that show it is not using an index"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        # Tiny tables make sequential scans cheapest; ask whether an index is usable at all
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+    results = {name: plan_problems(explain_query(query), dialect) for name, query in hot_queries().items()}
+    db.session.rollback()
+    return results
+
+# Schema setup, run by `flask init-db` (or db-upgrade) before the app is started
+def init_db():
+    """Create missing tables and the search index, then apply pending migrations"""
+    db.create_all()
+    init_search()
+    return upgrade_db()
+
+@main.cli.command('init-db')
+def init_db_command():
+    """Create the database schema and apply pending migrations"""
+    applied = init_db()
+    click.echo(f'Database ready ({search_backend()} search); '
+               + (f'applied {len(applied)} migration(s): {", ".join(applied)}' if applied else 'no migrations pending'))
+
+@main.cli.command('precompile-templates')
+def precompile_templates_command():
+    """Compile every template into the Jinja bytecode cache, e.g. while building a release"""
+    names = precompile_templates(current_app)
+    directory = current_app.config['JINJA_BYTECODE_CACHE_DIR']
+    click.echo(f'Compiled {len(names)} templates' + (f' into {directory}' if directory else ' (bytecode cache disabled)'))
+
+@main.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations"""
+    applied = init_db()
+    click.echo(f'Applied {len(applied)} migration(s): {", ".join(applied)}' if applied else 'Database is up to date')
+
+@main.cli.command('db-status')
+def db_status_command():
+    """List schema migrations and whether they have been applied"""
+    pending = {version for version, _ in pending_migrations()}
+    for version, _ in MIGRATIONS:
+        click.echo(f'{"pending" if version in pending else "applied"}  {version}')
+
+@main.cli.command('sync-replica')
+def sync_replica_command():
+    """Copy the SQLite primary onto the SQLite replica bind, to try replica routing locally"""
+    replica = db.engines.get('replica')
+    if replica is None or {db.engine.dialect.name, replica.dialect.name} != {'sqlite'}:
+        raise click.ClickException('sync-replica needs SQLite DATABASE_URL and DATABASE_REPLICA_URL')
+    source, target = db.engine.raw_connection(), replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        source.close()
+        target.close()
+    click.echo(f'Copied {db.engine.url.database} to {replica.url.database}')
+
+@main.cli.command('check-query-plans')
+def check_query_plans_command():
+    """EXPLAIN every hot query and fail if one scans a table or sorts without an index"""
+    failures = 0
+    for name, problems in check_query_plans().items():
+        click.echo(f'{"FAIL" if problems else "ok  "}  {name}')
+        for line in problems:
+            click.echo(f'        {line}')
+        failures += bool(problems)
+    if failures:
+        raise SystemExit(1)
+
+@main.cli.command('export-db')
+@click.argument('output', type=click.Path(dir_okay=False))
+def export_db_command(output):
+    """Back up every table to a zip of JSONL files, streaming rows from the database"""
+    files = [(f'{table.name}.jsonl', jsonl_lines(iter_table_rows(table))) for table in db.metadata.sorted_tables]
+    with open(output, 'wb') as f:
+        for chunk in zip_stream(files):
+            f.write(chunk)
+    click.echo(f'Database exported to {output}')
+
+@main.cli.command('refresh-facets')
+def refresh_facets_command():
+    """Recount explore facets and re-parse prompt tags from the prompt table"""
+    refresh_facets()
+    db.session.commit()
+    invalidate_pages('prompts')
+    counts = db.session.query(FacetCount.facet, db.func.count()).filter(FacetCount.count > 0).group_by(FacetCount.facet)
+    click.echo('Facets refreshed: ' + ', '.join(f'{count} {facet}' for facet, count in counts))
+
+@main.cli.command('reconcile-usage')
+def reconcile_usage_command():
+    """Recompute per-user usage counters from the prompt, bundle and favorite tables"""
+    before = {(row.user_id, row.metric, row.period): row.count for row in UsageCounter.query}
+    after = reconcile_usage()
+    db.session.commit()
+    drifted = {key for key in set(before) | set(after) if before.get(key, 0) != after.get(key, 0)}
+    click.echo(f'Reconciled {len(after)} counter(s), {len(drifted)} had drifted')
+
+@main.cli.command('recompute-trending')
+def recompute_trending_command():
+    """Recompute trending scores from recent favorites now (the worker also does this periodically)"""
+    trending = recompute_trending()
+    db.session.commit()
+    invalidate_pages('prompts')
+    click.echo(f'{trending} prompt(s) trending')
+
+@main.cli.command('recount-favorites')
+def recount_favorites_command():
+    """Repair Prompt.favorite_count from the favorite table"""
+    drifted = recount_favorites()
+    db.session.commit()
+    click.echo(f'Fixed favorite counts on {drifted} prompt(s)')
+
+@main.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from the prompt table"""
+    backend = rebuild_search_index()
+    click.echo(f'Search index rebuilt ({backend})')
+
+@main.cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once no job is due instead of waiting for more.')
+@click.option('--max-jobs', type=int, default=None, help='Exit after running this many jobs.')
+def worker_command(burst, max_jobs):
+    """Run queued background jobs; SIGTERM or Ctrl-C stops after the current job"""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    click.echo(f'Worker started ({", ".join(sorted(JOB_HANDLERS))})')
+    processed = work(burst=burst, max_jobs=max_jobs, stop=stop)
+    click.echo(f'Worker stopped after {processed} job(s)')
+
+@main.cli.command('enqueue-job')
+@click.argument('name', type=click.Choice(sorted(JOB_HANDLERS)))
+@click.option('--payload', default='{}', help='JSON object of keyword arguments for the job.')
+@click.option('--delay', type=int, default=0, help='Seconds to wait before the job is due.')
+def enqueue_job_command(name, payload, delay):
+    """Queue a background job by name"""
+    row = enqueue(name, json.loads(payload), delay=delay)
+    db.session.commit()
+    click.echo(f'Queued job {row.id} ({name})')
+
+@main.cli.command('retry-failed-jobs')
+@click.option('--name', default=None, help='Only retry jobs with this name.')
+def retry_failed_jobs_command(name):
+    """Queue failed jobs again with a fresh set of attempts"""
+    query = db.update(Job).where(Job.status == 'failed')
+    if name:
+        query = query.where(Job.name == name)
+    retried = db.session.execute(query.values(status='queued', attempts=0, run_at=datetime.utcnow(),
+                                              finished_at=None)).rowcount
+    db.session.commit()
+    click.echo(f'Requeued {retried} job(s)')
+
+@main.cli.command('job-stats')
+def job_stats_command():
+    """Print queue depth and recent job latency"""
+    click.echo(json.dumps(job_metrics(), indent=2))
 
 # Add these new routes to your app.py
 
@@ -561,151 +3729,223 @@ from datetime import datetime
 
 # Add these routes BEFORE the "if __name__ == '__main__':" line
 
-@app.route('/about')
+@main.route('/about')
 def about():
     return render_template('about.html')
 
-@app.route('/contact')
+@main.route('/contact')
 def contact():
     return render_template('contact.html')
 
-@app.route('/privacy-policy')
+@main.route('/privacy-policy')
 def privacy_policy():
     return render_template('privacy_policy.html')
 
-@app.route('/terms-of-service')
+@main.route('/terms-of-service')
 def terms_of_service():
     return render_template('terms_of_service.html')
 
 
-@app.route('/newsletter')
+@main.route('/newsletter')
 def newsletter():
     return render_template('newsletter.html')
     
-@app.route('/pricing')
+@main.route('/pricing')
 def pricing():
     return render_template('pricing.html')
 
-@app.route('/newsletter/subscribe', methods=['POST'])
+@main.route('/newsletter/subscribe', methods=['POST'])
 def newsletter_subscribe():
     email = request.form.get('email')
     # Here you can add logic to save email to database
     # For now, just flash a success message
     flash('Thanks for subscribing! Check your inbox for confirmation.', 'success')
-    return redirect(url_for('newsletter'))
+    return redirect(url_for('main.newsletter'))
 
-@app.route('/blog')
-def blog():
-    posts = []
-    blog_dir = Path('blog_posts')
-    
-    # If folder doesn't exist, show empty
-    if not blog_dir.exists():
-        return render_template('blog.html', posts=[])
-    
-    # Read all .md files
-    for file in sorted(blog_dir.glob('*.md'), reverse=True):
+# Blog
+# Posts are parsed and rendered once and kept in memory. The directory is
+# re-scanned at most every BLOG_REFRESH_INTERVAL seconds and reloaded only when
+# a file's mtime or size changed; unchanged bodies reuse their rendered HTML.
+@main.record_once
+def blog_settings(state):
+    config = state.app.config
+    config.setdefault('BLOG_DIR', os.path.join(state.app.root_path, 'blog_posts'))
+    config.setdefault('BLOG_REFRESH_INTERVAL', float(os.environ.get('BLOG_REFRESH_INTERVAL', 5)))
+
+BLOG_DATE_FORMATS = ('%B %d, %Y', '%Y-%m-%d', '%d %B %Y')
+
+def parse_post_date(value):
+    for date_format in BLOG_DATE_FORMATS:
         try:
-            with open(file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-                # Split metadata and content
-                if content.startswith('---'):
-                    parts = content.split('---', 2)
-                    if len(parts) >= 3:
-                        metadata_text = parts[1]
-                        post_content = parts[2]
-                        
-                        # Parse metadata
-                        metadata = {}
-                        for line in metadata_text.strip().split('\n'):
-                            if ':' in line:
-                                key, value = line.split(':', 1)
-                                metadata[key.strip()] = value.strip()
-                        
-                        posts.append({
-                            'title': metadata.get('title', 'Untitled'),
-                            'slug': metadata.get('slug', ''),
-                            'date': metadata.get('date', ''),
-                            'author': metadata.get('author', 'ODByte Team'),
-                            'category': metadata.get('category', 'General'),
-                            'excerpt': metadata.get('excerpt', ''),
-                            'content': markdown.markdown(post_content, extensions=['fenced_code', 'codehilite'])
-                        })
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
+            return datetime.strptime(value, date_format)
+        except ValueError:
             continue
-    
-    return render_template('blog.html', posts=posts)
+    return datetime.min
 
-@app.route('/blog/<slug>')
-def blog_post(slug):
-    blog_dir = Path('blog_posts')
+class BlogIndex:
+    """Blog posts keyed by slug plus a newest-first list"""
     
-    if not blog_dir.exists():
-        flash('Blog post not found!', 'error')
-        return redirect(url_for('blog'))
+    def __init__(self, directory, refresh_interval=5.0):
+        self.directory = Path(directory)
+        self.refresh_interval = refresh_interval
+        self.posts = []
+        self.by_slug = {}
+        self._signature = None
+        self._rendered = {}  # sha1 of the Markdown body -> HTML
+        self._markdown = None
+        self._checked_at = None
+        self._lock = threading.Lock()
     
-    # Find post by slug
-    for file in blog_dir.glob('*.md'):
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-                if content.startswith('---'):
-                    parts = content.split('---', 2)
-                    if len(parts) >= 3:
-                        metadata_text = parts[1]
-                        post_content = parts[2]
-                        
-                        metadata = {}
-                        for line in metadata_text.strip().split('\n'):
-                            if ':' in line:
-                                key, value = line.split(':', 1)
-                                metadata[key.strip()] = value.strip()
-                        
-                        if metadata.get('slug') == slug:
-                            post = {
-                                'title': metadata.get('title', 'Untitled'),
-                                'slug': metadata.get('slug', ''),
-                                'date': metadata.get('date', ''),
-                                'author': metadata.get('author', 'ODByte Team'),
-                                'category': metadata.get('category', 'General'),
-                                'excerpt': metadata.get('excerpt', ''),
-                                'content': markdown.markdown(post_content, extensions=['fenced_code', 'codehilite'])
-                            }
-                            return render_template('blog_post_template.html', post=post)
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
-            continue
+    def _scan(self):
+        if not self.directory.exists():
+            return ()
+        files = []
+        for file in self.directory.glob('*.md'):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                # Deleted or renamed between the glob and the stat
+                continue
+            files.append((file.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(files))
+    
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        
+        signature = self._scan()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature != self._signature:
+                self._load(signature)
+                self._signature = signature
+                invalidate_pages('blog')
+    
+    def _load(self, signature):
+        posts = []
+        rendered = {}
+        for name, _, _ in signature:
+            file = self.directory / name
+            try:
+                post = self._parse(file.read_text(encoding='utf-8'), rendered)
+            except Exception:
+                logger.exception('Error reading blog post', extra={'blog_file': str(file)})
+                continue
+            if post:
+                posts.append((parse_post_date(post['date']), name, post))
+        
+        posts.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        self.posts = [post for _, _, post in posts]
+        self.by_slug = {post['slug']: post for post in reversed(self.posts) if post['slug']}
+        self._rendered = rendered
+    
+    def _render(self, text):
+        # Called under self._lock; the renderer (and the markdown import) is built on first use and reused
+        if self._markdown is None:
+            import markdown
+            self._markdown = markdown.Markdown(extensions=['fenced_code', 'codehilite'])
+        return self._markdown.reset().convert(text)
     
-    flash('Blog post not found!', 'error')
-    return redirect(url_for('blog'))
+    def _parse(self, content, rendered):
+        # Split metadata and content
+        if not content.startswith('---'):
+            return None
+        parts = content.split('---', 2)
+        if len(parts) < 3:
+            return None
+        metadata_text = parts[1]
+        post_content = parts[2]
+        
+        # Parse metadata
+        metadata = {}
+        for line in metadata_text.strip().split('\n'):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                metadata[key.strip()] = value.strip()
+        
+        digest = hashlib.sha1(post_content.encode('utf-8')).hexdigest()
+        html = self._rendered.get(digest) or rendered.get(digest)
+        if html is None:
+            html = self._render(post_content)
+        rendered[digest] = html
+        
+        return {
+            'title': metadata.get('title', 'Untitled'),
+            'slug': metadata.get('slug', ''),
+            'date': metadata.get('date', ''),
+            'author': metadata.get('author', 'ODByte Team'),
+            'category': metadata.get('category', 'General'),
+            'excerpt': metadata.get('excerpt', ''),
+            'content': html
+        }
+    
+    def all(self):
+        self.refresh()
+        return self.posts
+    
+    def recent(self, count):
+        return self.all()[:count]
+    
+    def get(self, slug):
+        self.refresh()
+        return self.by_slug.get(slug)
+
+def get_blog_index():
+    """The app's BlogIndex; posts are loaded on the first request that needs them"""
+    extensions = current_app.extensions
+    if 'blog_index' not in extensions:
+        config = current_app.config
+        extensions.setdefault('blog_index', BlogIndex(config['BLOG_DIR'], config['BLOG_REFRESH_INTERVAL']))
+    return extensions['blog_index']
+
+@main.before_app_request
+def refresh_blog_index():
+    # Runs ahead of the page cache so edited posts invalidate cached blog pages
+    if request.endpoint in ('main.index', 'main.blog', 'main.blog_post'):
+        get_blog_index().refresh()
+
+@main.route('/blog')
+@cached_page('blog')
+def blog():
+    return render_template('blog.html', posts=get_blog_index().all())
+
+@main.route('/blog/<slug>')
+def blog_post(slug):
+    post = get_blog_index().get(slug)
+    if post is None:
+        flash('Blog post not found!', 'error')
+        return redirect(url_for('main.blog'))
+    return render_template('blog_post_template.html', post=post)
+
 # Bundle Routes
-@app.route('/bundles')
+@main.route('/bundles')
 @login_required
 def bundles():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     user_bundles = PromptBundle.query.filter_by(user_id=user.id).order_by(PromptBundle.created_at.desc()).all()
     
-    bundle_count = len(user_bundles)
-    max_bundles = 30 if user.plan == 'diamond' else 3
+    bundle_count = monthly_usage(user.id, 'bundles')
+    max_bundles = bundle_limit_for(user.plan)
     
     return render_template('bundles.html', user=user, bundles=user_bundles, 
-                         bundle_count=bundle_count, max_bundles=max_bundles)
+                         bundle_count=bundle_count, max_bundles=max_bundles,
+                         prompt_counts=bundle_prompt_counts(user_bundles))
 
-@app.route('/bundle/new', methods=['GET', 'POST'])
+@main.route('/bundle/new', methods=['GET', 'POST'])
 @login_required
 def new_bundle():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
-    current_bundle_count = PromptBundle.query.filter_by(user_id=user.id).count()
-    max_bundles = 30 if user.plan == 'diamond' else 3
+    current_bundle_count = monthly_usage(user.id, 'bundles')
+    max_bundles = bundle_limit_for(user.plan)
     
     if current_bundle_count >= max_bundles:
         plan_name = "Diamond" if user.plan == 'diamond' else "Free"
         flash(f'{plan_name} plan limit reached! You can create {max_bundles} bundles per month.', 'error')
-        return redirect(url_for('bundles'))
+        return redirect(url_for('main.bundles'))
     
     if request.method == 'POST':
         title = request.form.get('title')
@@ -716,163 +3956,299 @@ def new_bundle():
             title=title,
             description=description,
             unique_link=generate_bundle_link(),
-            user_id=user.id,
-            prompt_ids=','.join(selected_prompts) if selected_prompts else ''
+            user_id=user.id
         )
+        new_bundle.set_prompts(owned_prompt_ids(user.id, selected_prompts))
         
         db.session.add(new_bundle)
         db.session.commit()
+        invalidate_pages('bundles')
         
         flash(f'Bundle created successfully! ({current_bundle_count + 1}/{max_bundles} bundles used)', 'success')
-        return redirect(url_for('view_bundle', bundle_id=new_bundle.id))
+        return redirect(url_for('main.view_bundle', bundle_id=new_bundle.id))
     
     user_prompts = Prompt.query.filter_by(user_id=user.id).order_by(Prompt.created_at.desc()).all()
     
     return render_template('new_bundle.html', user=user, prompts=user_prompts, 
                          bundle_count=current_bundle_count, max_bundles=max_bundles)
 
-@app.route('/bundle/<int:bundle_id>')
+@main.route('/bundle/<int:bundle_id>')
 @login_required
 def view_bundle(bundle_id):
     bundle = PromptBundle.query.get_or_404(bundle_id)
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     if bundle.user_id != session['user_id']:
         flash('Unauthorized access!', 'error')
-        return redirect(url_for('bundles'))
+        return redirect(url_for('main.bundles'))
     
     prompts = bundle.get_prompts()
-    share_link = url_for('view_shared_bundle', link=bundle.unique_link, _external=True)
+    share_link = url_for('main.view_shared_bundle', link=bundle.unique_link, _external=True)
     
     return render_template('view_bundle.html', bundle=bundle, prompts=prompts, 
                          user=user, share_link=share_link)
 
-@app.route('/b/<link>')
+@main.route('/b/<link>')
+@cached_page('prompts', 'bundles')
+@replica_reads
 def view_shared_bundle(link):
     """Public route to view shared bundles"""
-    bundle = PromptBundle.query.filter_by(unique_link=link).first_or_404()
-    prompts = bundle.get_prompts()
-    author = User.query.get(bundle.user_id)
+    bundle = PromptBundle.query.options(db.joinedload(PromptBundle.author)).filter_by(unique_link=link).first_or_404()
+    prompts = bundle.get_prompts(full=True)
+    author = bundle.author
     
     return render_template('shared_bundle.html', bundle=bundle, prompts=prompts, author=author)
 
-@app.route('/bundle/<int:bundle_id>/edit', methods=['GET', 'POST'])
+@main.route('/bundle/<int:bundle_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_bundle(bundle_id):
     bundle = PromptBundle.query.get_or_404(bundle_id)
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     if bundle.user_id != session['user_id']:
         flash('Unauthorized access!', 'error')
-        return redirect(url_for('bundles'))
+        return redirect(url_for('main.bundles'))
     
     if request.method == 'POST':
         bundle.title = request.form.get('title')
         bundle.description = request.form.get('description')
         selected_prompts = request.form.getlist('prompts')
-        bundle.prompt_ids = ','.join(selected_prompts) if selected_prompts else ''
+        bundle.set_prompts(owned_prompt_ids(user.id, selected_prompts))
         
         db.session.commit()
+        invalidate_pages('bundles')
         flash('Bundle updated successfully!', 'success')
-        return redirect(url_for('view_bundle', bundle_id=bundle.id))
+        return redirect(url_for('main.view_bundle', bundle_id=bundle.id))
     
     user_prompts = Prompt.query.filter_by(user_id=user.id).order_by(Prompt.created_at.desc()).all()
-    current_prompt_ids = [int(id) for id in bundle.prompt_ids.split(',') if id]
+    current_prompt_ids = set(bundle.get_prompt_ids())
     
     return render_template('edit_bundle.html', bundle=bundle, prompts=user_prompts, 
                          current_prompt_ids=current_prompt_ids, user=user)
 
-@app.route('/bundle/<int:bundle_id>/delete', methods=['POST'])
+@main.route('/bundle/<int:bundle_id>/delete', methods=['POST'])
 @login_required
 def delete_bundle(bundle_id):
     bundle = PromptBundle.query.get_or_404(bundle_id)
     
     if bundle.user_id != session['user_id']:
         flash('Unauthorized access!', 'error')
-        return redirect(url_for('bundles'))
+        return redirect(url_for('main.bundles'))
     
     db.session.delete(bundle)
     db.session.commit()
+    invalidate_pages('bundles')
     flash('Bundle deleted successfully!', 'success')
-    return redirect(url_for('bundles'))
+    return redirect(url_for('main.bundles'))
     
-@app.route('/prompt/<int:id>/submit-premium', methods=['POST'])
+@main.route('/prompt/<int:id>/submit-premium', methods=['POST'])
 @login_required
 def submit_premium(id):
-    user = User.query.get(session['user_id'])
+    user = current_user()
     prompt = Prompt.query.get_or_404(id)
     
     # Check if user owns the prompt
     if prompt.user_id != session['user_id']:
         flash('Unauthorized access!', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     # Check if user is Diamond
     if user.plan not in ['diamond', 'premium']:
         flash('Only Diamond users can submit premium prompts!', 'error')
-        return redirect(url_for('pricing'))
+        return redirect(url_for('main.pricing'))
     
     # Check if already submitted
     if prompt.premium_status != 'none':
         flash('This prompt has already been submitted for premium review!', 'info')
-        return redirect(url_for('view_prompt', id=id))
+        return redirect(url_for('main.view_prompt', id=id))
     
     # Submit for review
     prompt.premium_status = 'pending'
+    enqueue('notify_admins', {'message': f'"{prompt.title}" was submitted for premium review.',
+                              'link': url_for('main.admin_panel')})
     db.session.commit()
     
     flash('Prompt submitted for premium review! You\'ll be notified once approved.', 'success')
-    return redirect(url_for('view_prompt', id=id))
+    return redirect(url_for('main.view_prompt', id=id))
    
-@app.route('/admin')
+# Moderation
+# Approve, reject and remove are set-based: moderate_prompts() updates every
+# selected prompt not already in the target state with one UPDATE, and since
+# that bypasses the ORM flush it adjusts the explore facets itself and queues
+# the owners' notifications. The queues load only the card columns plus an
+# excerpt of content cut in SQL, never the whole prompt.
+MODERATION_ACTIONS = {
+    'approve': {'premium_status': 'approved', 'is_premium': True, 'visibility': 'public'},
+    'reject': {'premium_status': 'rejected', 'is_premium': False},
+    'remove': {'premium_status': 'none', 'is_premium': False},
+}
+MODERATION_MESSAGES = {
+    'approve': ('Premium prompt "{}" approved!', '{} premium prompts approved!', 'success',
+                'Your prompt "{}" was approved as premium!'),
+    'reject': ('Premium prompt "{}" rejected.', '{} premium prompts rejected.', 'info',
+               'Your prompt "{}" was not approved as premium.'),
+    'remove': ('Premium status removed from "{}".', 'Premium status removed from {} prompts.', 'info',
+               'Premium status was removed from your prompt "{}".'),
+}
+MODERATION_BATCH_LIMIT = 500
+ADMIN_EXCERPT_LENGTH = 200
+
+ADMIN_QUEUE_TEMPLATES = {
+    'pending': '_admin_pending_cards.html',
+    'approved': '_admin_approved_cards.html',
+}
+
+def moderate_prompts(action, prompt_ids):
+    """Apply a moderation action to many prompts at once; returns the (id, title) pairs that changed"""
+    values = MODERATION_ACTIONS[action]
+    columns = [Prompt.id, Prompt.title, Prompt.user_id] + [getattr(Prompt, name) for name in FACET_SOURCE_COLUMNS]
+    needs_change = db.and_(Prompt.id.in_(prompt_ids), Prompt.premium_status != values['premium_status'])
+    selected = db.select(*columns).where(needs_change)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        selected = selected.with_for_update()
+    rows = db.session.execute(selected).all()
+    if not rows:
+        return []
+    
+    # The condition is repeated so a concurrent moderator's change is not counted twice
+    changed = set(db.session.scalars(
+        db.update(Prompt).where(Prompt.id.in_([row.id for row in rows]), needs_change)
+        .values(**values).returning(Prompt.id)
+        .execution_options(synchronize_session=False)))
+    rows = [row for row in rows if row.id in changed]
+    
+    deltas = Counter()
+    for row in rows:
+        before = row._asdict()
+        deltas.subtract(prompt_facet_values(before))
+        deltas.update(prompt_facet_values(dict(before, **values)))
+    apply_facet_deltas(db.session.connection(), deltas)
+    
+    message = MODERATION_MESSAGES[action][3]
+    for row in rows:
+        notify(row.user_id, message.format(row.title), url_for('main.view_prompt', id=row.id))
+    return [(row.id, row.title) for row in rows]
+
+def moderation_response(action, prompt_ids):
+    changed = moderate_prompts(action, prompt_ids)
+    db.session.commit()
+    if changed:
+        invalidate_pages('prompts')
+    
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        return jsonify({'action': action, 'changed': sorted(prompt_id for prompt_id, _ in changed)})
+    
+    one, many, category, _ = MODERATION_MESSAGES[action]
+    if len(changed) == 1:
+        flash(one.format(changed[0][1]), category)
+    elif changed:
+        flash(many.format(len(changed)), category)
+    else:
+        flash('Nothing to change: the selected prompts are already in that state.', 'info')
+    return redirect(url_for('main.admin_panel'))
+
+def moderation_counts():
+    counts = dict(db.session.query(Prompt.premium_status, db.func.count())
+                  .filter(Prompt.premium_status.in_(ADMIN_QUEUE_TEMPLATES)).group_by(Prompt.premium_status))
+    return {status: counts.get(status, 0) for status in ADMIN_QUEUE_TEMPLATES}
+
+def admin_queue_page(status, cursor):
+    query = (Prompt.query.filter_by(premium_status=status)
+             .options(db.load_only(Prompt.id, Prompt.title, Prompt.description, Prompt.excerpt,
+                                   Prompt.category, Prompt.created_at, Prompt.user_id),
+                      db.with_expression(Prompt.content_excerpt,
+                                         db.func.substr(Prompt.content, 1, ADMIN_EXCERPT_LENGTH + 1)),
+                      db.joinedload(Prompt.author).load_only(User.name)))
+    return keyset_paginate(query, Prompt.created_at, Prompt.id, cursor)
+
+def admin_next_page_urls(status, next_cursor):
+    if not next_cursor:
+        return None
+    args = request.args.to_dict()
+    args[f'{status}_cursor'] = next_cursor
+    return {'page': url_for('main.admin_panel', **args),
+            'more': url_for('main.admin_more', queue=status, cursor=next_cursor)}
+
+@main.route('/admin')
 @admin_required
 def admin_panel():
-    user = User.query.get(session['user_id'])
+    user = current_user()
+    counts = moderation_counts()
     
     # Get pending premium prompts
-    pending_prompts = Prompt.query.filter_by(premium_status='pending').order_by(Prompt.created_at.desc()).all()
+    pending_prompts, pending_next = admin_queue_page('pending', request.args.get('pending_cursor'))
     
     # Get all premium prompts
-    approved_prompts = Prompt.query.filter_by(premium_status='approved').order_by(Prompt.created_at.desc()).all()
+    approved_prompts, approved_next = admin_queue_page('approved', request.args.get('approved_cursor'))
     
     return render_template('admin_panel.html', user=user, 
                          pending_prompts=pending_prompts, 
-                         approved_prompts=approved_prompts)
+                         approved_prompts=approved_prompts,
+                         pending_count=counts['pending'],
+                         approved_count=counts['approved'],
+                         excerpt_length=ADMIN_EXCERPT_LENGTH,
+                         pending_next_page=admin_next_page_urls('pending', pending_next),
+                         approved_next_page=admin_next_page_urls('approved', approved_next))
 
-@app.route('/admin/prompt/<int:id>/approve', methods=['POST'])
+@main.route('/admin/more/<queue>')
+@admin_required
+def admin_more(queue):
+    if queue not in ADMIN_QUEUE_TEMPLATES:
+        return jsonify({'error': 'Unknown queue'}), 404
+    prompts, next_cursor = admin_queue_page(queue, request.args.get('cursor'))
+    return load_more_response(ADMIN_QUEUE_TEMPLATES[queue], admin_next_page_urls(queue, next_cursor),
+                              prompts=prompts, excerpt_length=ADMIN_EXCERPT_LENGTH)
+
+@main.route('/admin/cache-stats')
+@admin_required
+def cache_stats():
+    return jsonify(page_cache_stats)
+
+@main.route('/admin/db-stats')
+@admin_required
+def db_stats():
+    return jsonify(engines=pool_status(), routing=db_routing_stats)
+
+@main.route('/admin/jobs')
+@admin_required
+def admin_job_stats():
+    return jsonify(job_metrics())
+
+@main.route('/admin/moderate', methods=['POST'])
+@admin_required
+def moderate():
+    """Approve, reject or remove every selected prompt: form or JSON {"action": ..., "prompt_ids": [...]}"""
+    data = request.get_json(silent=True) or {}
+    action = data.get('action') or request.form.get('action')
+    if action not in MODERATION_ACTIONS:
+        if data:
+            return jsonify({'error': 'Unknown action'}), 400
+        flash('Unknown moderation action.', 'error')
+        return redirect(url_for('main.admin_panel'))
+    prompt_ids = requested_prompt_ids(data.get('prompt_ids') or request.form.getlist('prompt_ids'),
+                                      limit=MODERATION_BATCH_LIMIT)
+    return moderation_response(action, prompt_ids)
+
+@main.route('/admin/prompt/<int:id>/approve', methods=['POST'])
 @admin_required
 def approve_premium(id):
-    prompt = Prompt.query.get_or_404(id)
-    prompt.premium_status = 'approved'
-    prompt.is_premium = True
-    prompt.visibility = 'public'  # Make it public so it appears in explore
-    db.session.commit()
-    
-    flash(f'Premium prompt "{prompt.title}" approved!', 'success')
-    return redirect(url_for('admin_panel'))
+    db.first_or_404(db.select(Prompt.id).where(Prompt.id == id))
+    return moderation_response('approve', [id])
 
-@app.route('/admin/prompt/<int:id>/reject', methods=['POST'])
+@main.route('/admin/prompt/<int:id>/reject', methods=['POST'])
 @admin_required
 def reject_premium(id):
-    prompt = Prompt.query.get_or_404(id)
-    prompt.premium_status = 'rejected'
-    prompt.is_premium = False
-    db.session.commit()
-    
-    flash(f'Premium prompt "{prompt.title}" rejected.', 'info')
-    return redirect(url_for('admin_panel'))
+    db.first_or_404(db.select(Prompt.id).where(Prompt.id == id))
+    return moderation_response('reject', [id])
 
-@app.route('/admin/prompt/<int:id>/remove-premium', methods=['POST'])
+@main.route('/admin/prompt/<int:id>/remove-premium', methods=['POST'])
 @admin_required
 def remove_premium(id):
-    prompt = Prompt.query.get_or_404(id)
-    prompt.premium_status = 'none'
-    prompt.is_premium = False
-    db.session.commit()
-    
-    flash(f'Premium status removed from "{prompt.title}".', 'info')
-    return redirect(url_for('admin_panel'))
-
+    db.first_or_404(db.select(Prompt.id).where(Prompt.id == id))
+    return moderation_response('remove', [id])
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        init_db()
     app.run(debug=True)
@@ -0,0 +1,103 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database so they never touch
+odbyte.db. Run them from the repository root, e.g.
+
+    python -m benchmarks.search --sizes 10000 100000
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORDS = (
+    'marketing email seo blog python code review refactor summary story '
+    'outline tweet linkedin product launch landing page copy headline essay '
+    'translate explain debug sql api design resume cover letter interview '
+    'research paper abstract poem lyrics recipe workout plan budget travel '
+    'itinerary lesson quiz tutor persona brainstorm ideas strategy pitch'
+).split()
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'te', 'vo', 'zi', 'pa', 'do', 'fe', 'gu', 'hi', 'jo', 'be']
+
+
+def build_vocabulary(size=20000, seed=7):
+    """Common English prompt words followed by a long tail of synthetic ones"""
+    rng = random.Random(seed)
+    vocabulary = list(WORDS)
+    seen = set(vocabulary)
+    while len(vocabulary) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+
+VOCABULARY = build_vocabulary()
+
+CATEGORIES = ['Writing', 'Coding', 'Marketing', 'Education', 'Business', 'Creative']
+AI_MODELS = ['ChatGPT', 'Claude', 'Gemini', 'Midjourney', 'Llama']
+
+
+def load_app(db_path=None):
+    """Build the app on a temporary database with its schema created"""
+    if db_path is None:
+        handle, db_path = tempfile.mkstemp(prefix='odbyte-bench-', suffix='.db')
+        os.close(handle)
+        os.unlink(db_path)
+    import app as odbyte
+    # Benchmarks hammer routes from one address, which the rate limiter would rightly refuse
+    app = odbyte.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'RATE_LIMIT_BACKEND': 'none'})
+    with app.app_context():
+        odbyte.init_db()
+    return odbyte, app, db_path
+
+
+def sentence(rng, words):
+    # Cubing the uniform sample skews picks towards the head of the vocabulary
+    return ' '.join(VOCABULARY[int(len(VOCABULARY) * rng.random() ** 3)] for _ in range(words))
+
+
+def seed_prompts(odbyte, app, count, start=0, user_id=1, seed=42, chunk=10000, content_words=80):
+    """Insert `count` synthetic public prompts using executemany batches"""
+    rng = random.Random(seed + start)
+    Prompt = odbyte.Prompt
+    base = datetime(2025, 1, 1)
+    with app.app_context():
+        if not odbyte.db.session.get(odbyte.User, user_id):
+            odbyte.db.session.add(odbyte.User(id=user_id, name='Bench', email=f'bench{user_id}@example.com',
+                                              password='x', plan='diamond'))
+            odbyte.db.session.commit()
+        for offset in range(start, start + count, chunk):
+            rows = [{
+                'title': sentence(rng, 4).title(),
+                'description': sentence(rng, 20),
+                'content': sentence(rng, content_words),
+                'tags': ', '.join(rng.sample(WORDS, 3)),
+                'category': rng.choice(CATEGORIES),
+                'ai_model': rng.choice(AI_MODELS),
+                'visibility': 'public' if rng.random() < 0.9 else 'private',
+                'created_at': base + timedelta(seconds=i),
+                'user_id': user_id,
+            } for i in range(offset, min(offset + chunk, start + count))]
+            for row in rows:
+                row['excerpt'] = odbyte.prompt_excerpt(row['description'])
+            odbyte.db.session.execute(odbyte.db.insert(Prompt), rows)
+            odbyte.db.session.commit()
+        # Raw inserts bypass the ORM hooks that keep facet counts and tags current
+        odbyte.refresh_facets()
+        odbyte.db.session.commit()
+
+
+def timed(fn, repeat=5):
+    """Run fn `repeat` times and return (median seconds, last result)"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
@@ -0,0 +1,239 @@
+"""Deterministic synthetic dataset: users, prompts, favorites, bundles and payments.
+
+    python -m benchmarks.dataset --db /tmp/odbyte-large.db --scale large
+    python -m benchmarks.dataset --db /tmp/odbyte.db --users 5000 --prompts 50000
+
+The same seed and sizes always produce the same rows. Prompt ownership and
+favorites are skewed towards low ids, so user 1 has a heavy dashboard and
+the oldest prompts are the popular ones. Rows go in with executemany batches
+and the derived tables (facets, usage counters, favorite counts, trending
+scores) are rebuilt once at the end. Every user's password is "bench".
+"""
+import argparse
+import json
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks.common import AI_MODELS, CATEGORIES, WORDS, load_app, sentence
+
+SCALES = {
+    'small': {'users': 1000, 'prompts': 10000},
+    'medium': {'users': 10000, 'prompts': 100000},
+    'large': {'users': 100000, 'prompts': 1000000},
+}
+
+BENCH_PASSWORD = 'bench'
+START = datetime(2025, 1, 1)
+END = START + timedelta(days=365)  # "now" for the dataset: trending is computed as of this moment
+FAVORITE_WINDOW_DAYS = 60
+
+
+def bench_email(user_id):
+    return f'user{user_id}@bench.test'
+
+
+def skewed_id(rng, count, power):
+    """1..count, with low ids picked far more often the larger `power` is"""
+    return 1 + int(count * rng.random() ** power)
+
+
+def spread(rng, start, days):
+    return start + timedelta(seconds=int(rng.random() * days * 86400))
+
+
+def insert_batches(odbyte, model, rows, chunk):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk:
+            odbyte.db.session.execute(odbyte.db.insert(model), batch)
+            odbyte.db.session.commit()
+            batch = []
+    if batch:
+        odbyte.db.session.execute(odbyte.db.insert(model), batch)
+        odbyte.db.session.commit()
+
+
+def user_rows(rng, users, password):
+    for user_id in range(1, users + 1):
+        roll = rng.random()
+        yield {
+            'id': user_id,
+            'name': f'{sentence(rng, 1).title()} {sentence(rng, 1).title()}',
+            'email': bench_email(user_id),
+            'password': password,
+            'plan': 'diamond' if user_id == 1 or roll < 0.1 else 'free',
+            'is_admin': user_id == 1,
+            'created_at': spread(rng, START, 365),
+        }
+
+
+def prompt_rows(rng, users, prompts, public_ids, content_words):
+    for prompt_id in range(1, prompts + 1):
+        description = sentence(rng, 20)
+        visibility = 'public' if rng.random() < 0.9 else 'private'
+        roll = rng.random()
+        premium_status = 'approved' if roll < 0.02 else 'pending' if roll < 0.025 else 'none'
+        if visibility == 'public':
+            public_ids.append(prompt_id)
+        yield {
+            'id': prompt_id,
+            'title': sentence(rng, 4).title(),
+            'description': description,
+            'content': sentence(rng, content_words),
+            'tags': ', '.join(rng.sample(WORDS, 3)),
+            'category': rng.choice(CATEGORIES),
+            'ai_model': rng.choice(AI_MODELS),
+            'visibility': visibility,
+            'is_premium': premium_status != 'none',
+            'premium_status': premium_status,
+            'created_at': START + timedelta(seconds=prompt_id * 365 * 86400 // prompts),
+            'user_id': skewed_id(rng, users, 2),
+        }
+
+
+def favorite_rows(rng, users, public_ids, per_user):
+    for user_id in range(1, users + 1):
+        count = min(int(rng.expovariate(1 / per_user)), 500, len(public_ids)) if per_user else 0
+        picked = set()
+        while len(picked) < count:
+            picked.add(public_ids[skewed_id(rng, len(public_ids), 3) - 1])
+        for prompt_id in sorted(picked):
+            yield {'user_id': user_id, 'prompt_id': prompt_id,
+                   'created_at': spread(rng, END - timedelta(days=FAVORITE_WINDOW_DAYS), FAVORITE_WINDOW_DAYS)}
+
+
+def bundle_rows(rng, users, public_ids, bundle_share, links):
+    bundle_id = 0
+    for user_id in range(1, users + 1):
+        if user_id != 1 and rng.random() >= bundle_share:
+            continue
+        for _ in range(rng.randint(1, 3)):
+            bundle_id += 1
+            size = min(rng.randint(3, 12), len(public_ids))
+            links.extend({'bundle_id': bundle_id, 'prompt_id': prompt_id, 'position': position}
+                         for position, prompt_id in enumerate(rng.sample(public_ids, size)))
+            yield {
+                'id': bundle_id,
+                'title': sentence(rng, 3).title(),
+                'description': sentence(rng, 12),
+                'unique_link': f'bench-{bundle_id}',
+                'user_id': user_id,
+                'created_at': spread(rng, START, 365),
+            }
+
+
+def payment_rows(rng, odbyte, paid_users):
+    for user_id in paid_users:
+        amount = rng.choice(list(odbyte.PLAN_PRICES.values()))
+        yield {
+            'payment_id': f'pay_bench{user_id}',
+            'order_id': f'order_bench{user_id}',
+            'amount': amount,
+            'currency': odbyte.PLAN_CURRENCY,
+            'status': 'success',
+            'user_id': user_id,
+            'created_at': spread(rng, START, 365),
+        }
+
+
+def seed_dataset(odbyte, app, users, prompts, favorites_per_user=10, bundle_share=0.05,
+                 content_words=80, seed=42, chunk=10000):
+    """Fill an empty database; returns the dataset description stored next to benchmark results"""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    public_ids = array('l')
+    with app.app_context():
+        if odbyte.db.session.scalar(odbyte.db.select(odbyte.db.func.count()).select_from(odbyte.User)):
+            raise SystemExit('The benchmark database already has users; pass a new --db path')
+
+        password = generate_password_hash(BENCH_PASSWORD)
+        insert_batches(odbyte, odbyte.User, user_rows(rng, users, password), chunk)
+
+        rows = prompt_rows(rng, users, prompts, public_ids, content_words)
+        insert_batches(odbyte, odbyte.Prompt,
+                       (dict(row, excerpt=odbyte.prompt_excerpt(row['description'])) for row in rows), chunk)
+
+        insert_batches(odbyte, odbyte.Favorite, favorite_rows(rng, users, public_ids, favorites_per_user), chunk)
+
+        links = []
+        insert_batches(odbyte, odbyte.PromptBundle, bundle_rows(rng, users, public_ids, bundle_share, links), chunk)
+        insert_batches(odbyte, odbyte.BundlePrompt, links, chunk)
+
+        paid_users = odbyte.db.session.scalars(odbyte.db.select(odbyte.User.id)
+                                               .where(odbyte.User.plan != 'free').order_by(odbyte.User.id)).all()
+        insert_batches(odbyte, odbyte.Payment, payment_rows(rng, odbyte, paid_users), chunk)
+
+        # Raw inserts bypass the ORM hooks that keep these tables and columns current
+        odbyte.refresh_facets()
+        odbyte.reconcile_usage()
+        odbyte.recount_favorites()
+        odbyte.recompute_trending(now=END)
+        odbyte.db.session.commit()
+
+        count = odbyte.db.func.count()
+        return {
+            'seed': seed,
+            'users': users,
+            'prompts': prompts,
+            'public_prompts': len(public_ids),
+            'favorites': odbyte.db.session.scalar(odbyte.db.select(count).select_from(odbyte.Favorite)),
+            'bundles': odbyte.db.session.scalar(odbyte.db.select(count).select_from(odbyte.PromptBundle)),
+            'bundle_prompts': len(links),
+            'payments': len(paid_users),
+            'content_words': content_words,
+            'seconds': round(time.perf_counter() - started, 1),
+        }
+
+
+def describe_path(db_path):
+    return f'{db_path}.json'
+
+
+def load_description(db_path):
+    """The description seed_dataset() wrote for this database, if any"""
+    try:
+        with open(describe_path(db_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument('--scale', choices=sorted(SCALES), help='preset users/prompts sizes')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--prompts', type=int, default=10000)
+    parser.add_argument('--favorites-per-user', type=float, default=10)
+    parser.add_argument('--bundle-share', type=float, default=0.05, help='fraction of users with bundles')
+    parser.add_argument('--content-words', type=int, default=80)
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def build(odbyte, app, db_path, args):
+    sizes = {'users': args.users, 'prompts': args.prompts, **SCALES.get(args.scale, {})}
+    description = seed_dataset(odbyte, app, favorites_per_user=args.favorites_per_user,
+                               bundle_share=args.bundle_share, content_words=args.content_words,
+                               seed=args.seed, **sizes)
+    with open(describe_path(db_path), 'w') as f:
+        json.dump(description, f, indent=2)
+    return description
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='SQLite file to create (default: a temporary file)')
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    odbyte, app, db_path = load_app(args.db)
+    description = build(odbyte, app, db_path, args)
+    print(f'database: {db_path}')
+    print(json.dumps(description, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Bytes read from the database and peak memory per list request.
+
+    python -m benchmarks.list_payload --prompts 2000 --content-words 600
+
+Every list route is requested as a logged-in Diamond user, once as the app
+now runs (description and content deferred, cards read Prompt.excerpt) and
+once with every ORM query undeferring the 'body' group, which is how the list
+views loaded prompts before. "db bytes" replays each SELECT the request ran
+and adds up the size of the values it returns; "peak KiB" is the Python heap
+high-water mark during the request (tracemalloc), a per-request stand-in for
+RSS, which only ever grows. Process max RSS is printed at the end.
+"""
+import argparse
+import resource
+import tracemalloc
+
+from benchmarks.common import load_app, seed_prompts
+
+ROUTES = [
+    '/',
+    '/explore',
+    '/explore/more',
+    '/dashboard',
+    '/favorites',
+    '/bundles',
+    '/bundle/1',
+    '/bundle/new',
+    '/bundle/1/edit',
+    '/b/bench-bundle',
+]
+
+
+def value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    return 8
+
+
+def measure(client, odbyte, undefer):
+    db = odbyte.db
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    def load_bodies(state):
+        if not (undefer and state.is_select):
+            return
+        mappers = {mapper.class_ for mapper in state.all_mappers}
+        if odbyte.Prompt in mappers:
+            state.statement = state.statement.options(db.undefer(odbyte.Prompt.description),
+                                                      db.undefer(odbyte.Prompt.content))
+        elif odbyte.Favorite in mappers:
+            state.statement = state.statement.options(db.defaultload(odbyte.Favorite.prompt).undefer_group('body'))
+
+    results = {}
+    with client.application.app_context():
+        db.event.listen(db.Engine, 'before_cursor_execute', record)
+        db.event.listen(db.Session, 'do_orm_execute', load_bodies)
+        try:
+            for route in ROUTES:
+                client.get(route)  # warm caches and the Jinja environment
+                statements.clear()
+                tracemalloc.start()
+                response = client.get(route)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                assert response.status_code == 200, (route, response.status_code)
+                replay = list(statements)
+                with db.engine.connect() as connection:
+                    size = sum(value_size(value)
+                               for statement, parameters in replay
+                               for row in connection.exec_driver_sql(statement, parameters)
+                               for value in row)
+                results[route] = (size, peak, len(replay))
+        finally:
+            db.event.remove(db.Session, 'do_orm_execute', load_bodies)
+            db.event.remove(db.Engine, 'before_cursor_execute', record)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prompts', type=int, default=2000)
+    parser.add_argument('--content-words', type=int, default=600, help='words of content per prompt')
+    args = parser.parse_args()
+
+    odbyte, app, db_path = load_app()
+    app.config['SQL_QUERY_BUDGETS'] = {}
+    seed_prompts(odbyte, app, args.prompts, content_words=args.content_words)
+    with app.app_context():
+        bundle = odbyte.PromptBundle(title='Bench', unique_link='bench-bundle', user_id=1)
+        bundle.set_prompts(range(1, 21))
+        odbyte.db.session.add(bundle)
+        odbyte.db.session.add_all(odbyte.Favorite(user_id=1, prompt_id=prompt_id) for prompt_id in range(1, 25))
+        odbyte.db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['user_plan'] = 'diamond'
+
+    full = measure(client, odbyte, undefer=True)
+    lean = measure(client, odbyte, undefer=False)
+
+    print(f'database: {db_path} ({args.prompts} prompts, {args.content_words} words of content each)')
+    print(f'{"route":<18}{"full db KiB":>12}{"lean db KiB":>12}{"full peak KiB":>15}{"lean peak KiB":>15}')
+    for route in ROUTES:
+        print(f'{route:<18}{full[route][0] / 1024:>12.1f}{lean[route][0] / 1024:>12.1f}'
+              f'{full[route][1] / 1024:>15.1f}{lean[route][1] / 1024:>15.1f}')
+    print(f'process max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
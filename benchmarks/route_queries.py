@@ -0,0 +1,75 @@
+"""SQL statements per request for every main route, with and without the user flags cache.
+
+    python -m benchmarks.route_queries --prompts 500
+
+Each route is requested twice per mode as a logged-in admin on the Diamond
+plan: the first request warms the flags cache, the second is what a returning
+visitor costs. With --no-cache, USER_FLAGS_TTL is 0 so every request that
+checks the plan or admin flag reads the user row.
+"""
+import argparse
+
+from benchmarks.common import load_app, seed_prompts
+
+ROUTES = [
+    '/',
+    '/explore',
+    '/explore?category=Coding',
+    '/explore/more',
+    '/dashboard',
+    '/favorites',
+    '/bundles',
+    '/prompt/1',
+    '/prompt/2',
+    '/upgrade',
+    '/bulk-upload',
+    '/admin',
+    '/admin/more/pending',
+    '/admin/cache-stats',
+]
+
+
+def measure(client, odbyte, ttl):
+    client.application.config['USER_FLAGS_TTL'] = ttl
+    odbyte.user_flags_cache.clear()
+    counts = {}
+    for route in ROUTES:
+        client.get(route)
+        response = client.get(route)
+        counts[route] = int(response.headers.get('X-SQL-Queries', 0))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--prompts', type=int, default=500)
+    args = parser.parse_args()
+
+    odbyte, app, db_path = load_app()
+    app.config['TESTING'] = True
+    app.config['SQL_QUERY_BUDGETS'] = {}
+
+    with app.app_context():
+        odbyte.db.session.add(odbyte.User(id=1, name='Bench', email='bench1@example.com', password='x',
+                                          plan='diamond', is_admin=True))
+        odbyte.db.session.commit()
+    seed_prompts(odbyte, app, args.prompts)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['user_plan'] = 'diamond'
+
+    uncached = measure(client, odbyte, 0)
+    cached = measure(client, odbyte, 30)
+
+    print(f'database: {db_path}')
+    print(f'{"route":<28}{"no cache":>10}{"cache":>8}')
+    for route in ROUTES:
+        print(f'{route:<28}{uncached[route]:>10}{cached[route]:>8}')
+    saved = sum(uncached.values()) - sum(cached.values())
+    print(f'{"total":<28}{sum(uncached.values()):>10}{sum(cached.values()):>8}  ({saved} fewer statements)')
+
+
+if __name__ == '__main__':
+    main()
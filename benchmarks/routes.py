@@ -0,0 +1,368 @@
+"""Latency, throughput, SQL statements and memory for every main route on a seeded dataset.
+
+    python -m benchmarks.dataset --db /tmp/odbyte.db --scale medium
+    python -m benchmarks.routes micro --db /tmp/odbyte.db --requests 50 --output micro.json
+    python -m benchmarks.routes load --db /tmp/odbyte.db --workers 4 --concurrency 16 --output load.json
+    python -m benchmarks.routes compare before.json after.json
+
+micro drives the Flask test client in this process: each route is requested
+once to warm up, --requests times for latency, then once more under
+tracemalloc for peak Python memory. load starts gunicorn (gunicorn.conf.py,
+preloaded and warmed) on the same database and keeps --concurrency client
+threads busy on each route for --duration seconds; memory is the peak summed
+RSS of the workers. Logged-in routes run as the bench users, user 1 being the
+heaviest. Both modes report p50/p95/p99 latency, throughput and the most SQL
+statements any request ran (X-SQL-Queries), and save everything as JSON;
+compare prints the change between two saved runs.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import quote
+
+from benchmarks.common import load_app
+from benchmarks.dataset import BENCH_PASSWORD, add_dataset_arguments, bench_email, build, load_description
+
+# (name, path, logged in); {placeholders} are filled from the dataset by resolve_routes()
+ROUTES = [
+    ('index', '/', False),
+    ('explore', '/explore', False),
+    ('explore_popular', '/explore?sort=popular&category=Coding', False),
+    ('explore_search', '/explore?search=' + quote('python debug'), False),
+    ('view_prompt', '/prompt/{prompt_id}', False),
+    ('shared_bundle', '/b/{bundle_link}', False),
+    ('blog', '/blog', False),
+    ('blog_post', '/blog/{blog_slug}', False),
+    ('pricing', '/pricing', False),
+    ('explore_member', '/explore', True),
+    ('dashboard', '/dashboard', True),
+    ('favorites', '/favorites', True),
+    ('bundles', '/bundles', True),
+    ('api_prompts', '/api/v1/prompts', False),
+    ('api_prompts_content', '/api/v1/prompts?fields=title,content', False),
+    ('api_search', '/api/v1/search?q=' + quote('python debug'), False),
+    ('api_prompt', '/api/v1/prompts/{prompt_id}', False),
+    ('api_bundle', '/api/v1/bundles/{bundle_link}', False),
+    ('api_favorites', '/api/v1/favorites', True),
+]
+
+# The app as the load server runs it: X-SQL-Queries on, budgets never raise, no rate limits
+SERVER_APP = "app:create_app({'TESTING': True, 'SQL_QUERY_BUDGETS': {}, 'RATE_LIMIT_BACKEND': 'none'})"
+LOGIN_USERS = 50
+
+
+def resolve_routes(odbyte, app, names=None):
+    with app.app_context():
+        Prompt = odbyte.Prompt
+        values = {
+            'prompt_id': odbyte.db.session.scalar(
+                odbyte.db.select(Prompt.id).where(Prompt.visibility == 'public', Prompt.is_premium.is_(False))
+                .order_by(Prompt.favorite_count.desc(), Prompt.id).limit(1)),
+            'bundle_link': odbyte.db.session.scalar(
+                odbyte.db.select(odbyte.PromptBundle.unique_link).order_by(odbyte.PromptBundle.id).limit(1)),
+            'blog_slug': next((post['slug'] for post in odbyte.get_blog_index().all() if post['slug']), None),
+        }
+    routes = []
+    for name, path, logged_in in ROUTES:
+        if names and name not in names:
+            continue
+        placeholders = [key for key in values if f'{{{key}}}' in path]
+        if any(values[key] is None for key in placeholders):
+            print(f'skipping {name}: the dataset has no {", ".join(placeholders)}', file=sys.stderr)
+            continue
+        routes.append((name, path.format(**values), logged_in))
+    return routes
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'requests': 0, 'errors': errors}
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput_rps': round(len(ordered) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 2),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+        'queries': max(queries) if queries else None,
+    }
+
+
+def run_micro(odbyte, app, routes, args):
+    app.config['TESTING'] = True
+    app.config['SQL_QUERY_BUDGETS'] = {}
+    if args.no_page_cache:
+        app.config['PAGE_CACHE_TTL'] = 0
+
+    anonymous = app.test_client()
+    member = app.test_client()
+    with member.session_transaction() as session:
+        session['user_id'] = 1
+        session['user_plan'] = 'diamond'
+
+    results = {}
+    for name, path, logged_in in routes:
+        client = member if logged_in else anonymous
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            before = time.perf_counter()
+            response = client.get(path)
+            latencies.append(time.perf_counter() - before)
+            queries.append(int(response.headers.get('X-SQL-Queries', 0)))
+            errors += response.status_code != 200
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        client.get(path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[name] = dict(summarize(latencies, queries, errors, elapsed),
+                             path=path, logged_in=logged_in, peak_memory_kib=round(peak / 1024, 1))
+        print_row(name, results[name])
+    return results
+
+
+def children_rss_kib(parent_pid):
+    """Summed VmRSS of parent_pid's child processes, from /proc (Linux only)"""
+    total = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            if ppid != parent_pid:
+                continue
+            with open(f'/proc/{entry}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration, ValueError, IndexError):
+            continue
+    return total
+
+
+def start_server(db_path, args):
+    import requests
+
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads), PAGE_CACHE_TTL='0' if args.no_page_cache else
+               os.environ.get('PAGE_CACHE_TTL', '60'))
+    log = tempfile.NamedTemporaryFile(prefix='odbyte-gunicorn-', suffix='.log', delete=False)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                '--bind', f'127.0.0.1:{args.port}', SERVER_APP],
+                               env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{args.port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'gunicorn exited with {process.returncode}; see {log.name}')
+        try:
+            if requests.get(f'{url}/pricing', timeout=1).status_code == 200:
+                return process, url, log.name
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f'gunicorn did not answer within 60s; see {log.name}')
+
+
+def run_load(routes, url, args, server_pid=None):
+    import requests
+
+    def client_session(index, logged_in):
+        http = requests.Session()
+        if logged_in:
+            response = http.post(f'{url}/login', allow_redirects=False, data={
+                'email': bench_email(1 + index % LOGIN_USERS), 'password': BENCH_PASSWORD})
+            assert response.status_code == 302 and 'session' in http.cookies, 'login failed'
+        return http
+
+    results = {}
+    for name, path, logged_in in routes:
+        sessions = [client_session(index, logged_in) for index in range(args.concurrency)]
+        sessions[0].get(url + path)
+        latencies, queries, errors = [], [], [0]
+        lock = threading.Lock()
+        peak_rss = [children_rss_kib(server_pid) if server_pid else 0]
+        done = threading.Event()
+
+        def hammer(http, deadline):
+            local_latencies, local_queries, local_errors = [], [], 0
+            while time.perf_counter() < deadline:
+                before = time.perf_counter()
+                try:
+                    response = http.get(url + path, allow_redirects=False)
+                except requests.RequestException:
+                    local_errors += 1
+                    continue
+                local_latencies.append(time.perf_counter() - before)
+                if response.status_code != 200:
+                    local_errors += 1
+                if 'X-SQL-Queries' in response.headers:
+                    local_queries.append(int(response.headers['X-SQL-Queries']))
+            with lock:
+                latencies.extend(local_latencies)
+                queries.extend(local_queries)
+                errors[0] += local_errors
+
+        def sample_memory():
+            while not done.wait(0.1):
+                peak_rss[0] = max(peak_rss[0], children_rss_kib(server_pid))
+
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        if server_pid:
+            sampler.start()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        threads = [threading.Thread(target=hammer, args=(http, deadline)) for http in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        if server_pid:
+            sampler.join()
+        for http in sessions:
+            http.close()
+
+        results[name] = dict(summarize(latencies, queries, errors[0], elapsed), path=path, logged_in=logged_in,
+                             peak_rss_kib=peak_rss[0] if server_pid else None)
+        print_row(name, results[name])
+    return results
+
+
+def print_header():
+    print(f'{"route":<18}{"reqs":>7}{"err":>5}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"sql":>5}{"mem KiB":>10}')
+
+
+def print_row(name, row):
+    if not row['requests']:
+        print(f'{name:<18}{0:>7}{row["errors"]:>5}')
+        return
+    memory = row.get('peak_memory_kib', row.get('peak_rss_kib'))
+    print(f'{name:<18}{row["requests"]:>7}{row["errors"]:>5}{row["throughput_rps"]:>9.1f}'
+          f'{row["p50_ms"]:>9.2f}{row["p95_ms"]:>9.2f}{row["p99_ms"]:>9.2f}'
+          f'{row["queries"] if row["queries"] is not None else "-":>5}{memory if memory is not None else "-":>10}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(results, args, db_path):
+    report = {
+        'mode': args.mode,
+        'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'database': db_path,
+        'dataset': load_description(db_path),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('mode', 'output')},
+        'routes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'results: {args.output}')
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f'{before_path} ({before["revision"]}, {before["mode"]}) -> {after_path} ({after["revision"]}, {after["mode"]})')
+    if before.get('dataset') != after.get('dataset'):
+        print('warning: the runs used different datasets')
+    metrics = ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries']
+    print(f'{"route":<18}' + ''.join(f'{metric:>22}' for metric in metrics))
+    for name, old in before['routes'].items():
+        new = after['routes'].get(name)
+        if new is None:
+            continue
+        cells = []
+        for metric in metrics:
+            a, b = old.get(metric), new.get(metric)
+            if a is None or b is None:
+                cells.append(f'{"-":>22}')
+                continue
+            change = f'{(b - a) / a * 100:+.0f}%' if a else ''
+            cells.append(f'{f"{a:g} -> {b:g} {change}":>22}')
+        print(f'{name:<18}' + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    modes = parser.add_subparsers(dest='mode', required=True)
+    for mode in ('micro', 'load'):
+        sub = modes.add_parser(mode)
+        sub.add_argument('--db', help='database built by benchmarks.dataset (default: seed a temporary one)')
+        sub.add_argument('--routes', nargs='+', help='only these route names')
+        sub.add_argument('--no-page-cache', action='store_true', help='render anonymous pages every time')
+        sub.add_argument('--output', default=f'bench-{mode}.json')
+        add_dataset_arguments(sub)
+    modes.choices['micro'].add_argument('--requests', type=int, default=50)
+    load = modes.choices['load']
+    load.add_argument('--url', help='benchmark this running server instead of starting gunicorn')
+    load.add_argument('--workers', type=int, default=2)
+    load.add_argument('--threads', type=int, default=4)
+    load.add_argument('--port', type=int, default=8765)
+    load.add_argument('--concurrency', type=int, default=8)
+    load.add_argument('--duration', type=float, default=10, help='seconds per route')
+    compare_parser = modes.add_parser('compare')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    args = parser.parse_args()
+
+    if args.mode == 'compare':
+        return compare(args.before, args.after)
+
+    odbyte, app, db_path = load_app(args.db)
+    if load_description(db_path) is None:
+        print(f'seeding {db_path}...')
+        build(odbyte, app, db_path, args)
+    routes = resolve_routes(odbyte, app, args.routes)
+    print(f'database: {db_path} {json.dumps(load_description(db_path))}')
+    print_header()
+
+    if args.mode == 'micro':
+        results = run_micro(odbyte, app, routes, args)
+    elif args.url:
+        results = run_load(routes, args.url.rstrip('/'), args)
+    else:
+        server, url, log_path = start_server(db_path, args)
+        try:
+            results = run_load(routes, url, args, server_pid=server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        os.unlink(log_path)
+    save(results, args, db_path)
+
+
+if __name__ == '__main__':
+    main()
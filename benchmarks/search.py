@@ -0,0 +1,45 @@
+"""Explore search latency: legacy LIKE scan vs the full-text index.
+
+    python -m benchmarks.search --sizes 10000 100000 1000000
+"""
+import argparse
+
+from benchmarks.common import VOCABULARY, load_app, seed_prompts, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--terms', nargs='+', default=['python debug', 'itinerary', VOCABULARY[2000], VOCABULARY[15000]])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    odbyte, app, db_path = load_app()
+    Prompt = odbyte.Prompt
+    print(f'database: {db_path} (search backend: {app.config["SEARCH_BACKEND"]})')
+    print(f'{"rows":>9} {"term":<18} {"like ms":>9} {"index ms":>9} {"hits":>8}')
+
+    seeded = 0
+    for size in sorted(args.sizes):
+        seed_prompts(odbyte, app, size - seeded, start=seeded)
+        seeded = size
+        with app.app_context():
+            for term in args.terms:
+                def legacy():
+                    return Prompt.query.filter_by(visibility='public').filter(
+                        (Prompt.title.contains(term)) |
+                        (Prompt.description.contains(term)) |
+                        (Prompt.tags.contains(term))
+                    ).order_by(Prompt.created_at.desc()).limit(50).all()
+
+                def indexed():
+                    query = odbyte.apply_search(Prompt.query.filter_by(visibility='public'), term)
+                    return query.order_by(Prompt.created_at.desc()).limit(50).all()
+
+                like_time, _ = timed(legacy, args.repeat)
+                index_time, hits = timed(indexed, args.repeat)
+                print(f'{size:>9} {term:<18} {like_time * 1000:>9.1f} {index_time * 1000:>9.1f} {len(hits):>8}')
+
+
+if __name__ == '__main__':
+    main()
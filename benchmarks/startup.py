@@ -0,0 +1,68 @@
+"""Startup cost: importing app.py, create_app() and the first requests a worker serves.
+
+    python -m benchmarks.startup --runs 5
+
+Every run is a fresh interpreter, as a newly started worker would be. "cold"
+serves the first requests straight after create_app(); "warm" calls
+warm_up() first, as the preloading gunicorn master does before forking, so
+its first-request numbers are what a forked worker pays.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import load_app
+
+ROUTES = ['/', '/explore', '/blog', '/pricing']
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app as odbyte
+imported = time.perf_counter()
+app = odbyte.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1]})
+created = time.perf_counter()
+if sys.argv[2] == 'warm':
+    odbyte.warm_up(app)
+ready = time.perf_counter()
+client = app.test_client()
+timings = {'import': imported - started, 'create_app': created - imported, 'warm_up': ready - created}
+for route in sys.argv[3:]:
+    before = time.perf_counter()
+    status = client.get(route).status_code
+    assert status == 200, (route, status)
+    timings[route] = time.perf_counter() - before
+print(json.dumps(timings))
+'''
+
+
+def run(database_url, mode):
+    output = subprocess.run([sys.executable, '-c', CHILD, database_url, mode, *ROUTES],
+                            check=True, capture_output=True, text=True, cwd=os.getcwd()).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    _, app, db_path = load_app()
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+
+    results = {mode: [run(database_url, mode) for _ in range(args.runs)] for mode in ('cold', 'warm')}
+    print(f'database: {db_path} (median of {args.runs} fresh processes)')
+    print(f'{"ms":<16}{"cold":>10}{"warm":>10}')
+    for key in ['import', 'create_app', 'warm_up'] + ROUTES:
+        cold, warm = (statistics.median(sample[key] for sample in results[mode]) * 1000 for mode in ('cold', 'warm'))
+        print(f'{key:<16}{cold:>10.1f}{warm:>10.1f}')
+    first = {mode: statistics.median(sum(sample[route] for route in ROUTES) for sample in results[mode]) * 1000
+             for mode in ('cold', 'warm')}
+    print(f'{"first requests":<16}{first["cold"]:>10.1f}{first["warm"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
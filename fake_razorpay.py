@@ -0,0 +1,171 @@
+"""A local stand-in for the Razorpay orders API, for development and tests.
+
+    python fake_razorpay.py --port 9010 --latency 0.5 --fail-first 2
+    RAZORPAY_API_URL=http://127.0.0.1:9010/v1 flask --app app run
+
+Orders live in memory. Retried POSTs carrying the same Idempotency-Key get
+the original order back, --latency delays every answer and --fail-first
+answers the first N requests with 503 to exercise the client's retries.
+sign_payment() and webhook() produce the signatures real Razorpay would.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeRazorpay:
+    def __init__(self, key_id='rzp_test_your_key_id', key_secret='your_key_secret',
+                 webhook_secret='your_webhook_secret', host='127.0.0.1', port=0, latency=0, fail_first=0):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.webhook_secret = webhook_secret
+        self.latency = latency
+        self.fail_first = fail_first
+        self.orders = {}
+        self.orders_by_key = {}
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sign_payment(self, order_id, payment_id):
+        """The razorpay_signature checkout would post back for this payment"""
+        return hmac.new(self.key_secret.encode(), f'{order_id}|{payment_id}'.encode(), hashlib.sha256).hexdigest()
+
+    def webhook(self, event, order_id, payment_id=None):
+        """(body, X-Razorpay-Signature) for a payment webhook about order_id"""
+        order = self.orders[order_id]
+        payment_id = payment_id or f'pay_{secrets.token_hex(7)}'
+        body = json.dumps({
+            'entity': 'event',
+            'event': event,
+            'payload': {
+                'payment': {'entity': {'id': payment_id, 'order_id': order_id, 'amount': order['amount'],
+                                       'currency': order['currency'], 'status': 'captured'}},
+                'order': {'entity': dict(order, status='paid')},
+            },
+            'created_at': int(time.time()),
+        }).encode()
+        signature = hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        return body, signature
+
+    def create_order(self, data, idempotency_key=None):
+        with self._lock:
+            if idempotency_key and idempotency_key in self.orders_by_key:
+                return self.orders[self.orders_by_key[idempotency_key]]
+            order = {
+                'id': f'order_{secrets.token_hex(7)}',
+                'entity': 'order',
+                'amount': data['amount'],
+                'amount_paid': 0,
+                'currency': data.get('currency', 'INR'),
+                'receipt': data.get('receipt'),
+                'notes': data.get('notes') or {},
+                'status': 'created',
+                'created_at': int(time.time()),
+            }
+            self.orders[order['id']] = order
+            if idempotency_key:
+                self.orders_by_key[idempotency_key] = order['id']
+            return order
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _error(self, status, description):
+                self._reply(status, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': description}})
+
+            def _begin(self):
+                with fake._lock:
+                    fake.request_count += 1
+                    failing = fake.request_count <= fake.fail_first
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if failing:
+                    self._error(503, 'Service unavailable')
+                    return False
+                expected = 'Basic ' + base64.b64encode(f'{fake.key_id}:{fake.key_secret}'.encode()).decode()
+                if self.headers.get('Authorization') != expected:
+                    self._error(401, 'The api key provided is invalid')
+                    return False
+                return True
+
+            def do_POST(self):
+                if not self._begin():
+                    return
+                if self.path.rstrip('/') != '/v1/orders':
+                    return self._error(404, 'The requested URL was not found on the server.')
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    data = json.loads(self.rfile.read(length) or b'{}')
+                    int(data['amount'])
+                except (ValueError, KeyError, TypeError):
+                    return self._error(400, 'The amount field is required.')
+                self._reply(200, fake.create_order(data, self.headers.get('Idempotency-Key')))
+
+            def do_GET(self):
+                if not self._begin():
+                    return
+                prefix = '/v1/orders/'
+                order = fake.orders.get(self.path[len(prefix):]) if self.path.startswith(prefix) else None
+                if order is None:
+                    return self._error(404, 'The id provided does not exist')
+                self._reply(200, order)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9010)
+    parser.add_argument('--latency', type=float, default=0, help='seconds to wait before every answer')
+    parser.add_argument('--fail-first', type=int, default=0, help='answer the first N requests with 503')
+    parser.add_argument('--key-id', default='rzp_test_your_key_id')
+    parser.add_argument('--key-secret', default='your_key_secret')
+    parser.add_argument('--webhook-secret', default='your_webhook_secret')
+    args = parser.parse_args()
+
+    fake = FakeRazorpay(args.key_id, args.key_secret, args.webhook_secret, args.host, args.port,
+                        args.latency, args.fail_first)
+    print(f'Fake Razorpay listening on {fake.url}')
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
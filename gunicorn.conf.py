@@ -0,0 +1,23 @@
+"""Gunicorn settings: preload the app in the master so workers fork warm.
+
+    flask --app app init-db
+    gunicorn
+
+The master imports app.py, builds the app and runs warm_up() once; every
+worker then forks with the payment client, blog index and compiled templates
+already in memory (shared copy-on-write) instead of paying for them on its
+first request.
+"""
+import os
+
+wsgi_app = 'app:create_app()'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = True
+
+
+def when_ready(server):
+    from app import warm_up
+    warm_up(server.app.wsgi())
@@ -0,0 +1,101 @@
+"""Razorpay payment gateway client.
+
+All gateway calls go through one pooled requests.Session with strict
+connect/read timeouts and retries with exponential backoff, so a slow or
+flaky gateway costs a bounded amount of worker time. Checkout and webhook
+signatures are HMACs checked locally and never touch the network. Point
+api_url at fake_razorpay.py to run everything offline.
+"""
+import hashlib
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_API_URL = 'https://api.razorpay.com/v1'
+
+
+class PaymentGatewayError(Exception):
+    """The gateway could not be reached, timed out or rejected the request"""
+
+
+class RazorpayService:
+    def __init__(self, key_id, key_secret, webhook_secret=None, api_url=DEFAULT_API_URL,
+                 connect_timeout=3.05, read_timeout=10, retries=3, backoff=0.5,
+                 pool_size=10, max_workers=4):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.webhook_secret = webhook_secret
+        self.api_url = api_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_workers = max_workers
+        self._executor = None
+
+        # Connection failures and 429/5xx answers are retried with backoff. A read
+        # timeout is not: the gateway may already have acted on the request.
+        retry = Retry(total=retries, connect=retries, read=0, status=retries,
+                      backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({'GET', 'POST'}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.auth = (key_id, key_secret)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _request(self, method, path, idempotency_key=None, **kwargs):
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else {}
+        try:
+            response = self.session.request(method, f'{self.api_url}{path}', headers=headers,
+                                            timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise PaymentGatewayError(f'{method} {path} failed: {e}') from e
+
+        if response.status_code >= 400:
+            try:
+                description = response.json()['error']['description']
+            except (ValueError, KeyError, TypeError):
+                description = response.text[:200]
+            raise PaymentGatewayError(f'{method} {path} returned {response.status_code}: {description}')
+        return response.json()
+
+    def create_order(self, amount, currency, receipt, notes=None):
+        """Create a gateway order; the receipt doubles as the idempotency key for retries"""
+        return self._request('POST', '/orders', idempotency_key=receipt, json={
+            'amount': amount,
+            'currency': currency,
+            'receipt': receipt,
+            'notes': notes or {},
+            'payment_capture': 1,
+        })
+
+    def fetch_order(self, order_id):
+        return self._request('GET', f'/orders/{order_id}')
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn on the service's worker threads, off the request thread; returns a Future"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='razorpay')
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def _signature(self, secret, message):
+        return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        """Check the signature checkout hands back for order_id|payment_id"""
+        if not (order_id and payment_id and signature):
+            return False
+        expected = self._signature(self.key_secret, f'{order_id}|{payment_id}'.encode())
+        return hmac.compare_digest(expected, signature)
+
+    def verify_webhook_signature(self, body, signature):
+        """Check X-Razorpay-Signature against the raw webhook body"""
+        if not (self.webhook_secret and signature):
+            return False
+        return hmac.compare_digest(self._signature(self.webhook_secret, body), signature)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
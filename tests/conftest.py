@@ -0,0 +1,66 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app as odbyte
+
+
+def make_app(directory, **config):
+    """A TESTING app on a fresh SQLite database in directory, with an admin and a free user"""
+    app = odbyte.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory / "odbyte.db"}',
+        'PAGE_CACHE_BACKEND': 'none',
+        'RATE_LIMIT_BACKEND': 'none',
+        'JINJA_BYTECODE_CACHE_DIR': None,
+        **config,
+    })
+    with app.app_context():
+        odbyte.init_db()
+        odbyte.db.session.add_all([
+            odbyte.User(name='Admin', email='admin@example.com', password=generate_password_hash('pw'),
+                        plan='diamond', is_admin=True),
+            odbyte.User(name='Free', email='free@example.com', password=generate_password_hash('pw')),
+        ])
+        odbyte.db.session.commit()
+    return app
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    app = make_app(tmp_path_factory.mktemp('db'))
+    yield app
+    with app.app_context():
+        for engine in odbyte.db.engines.values():
+            engine.dispose()
+
+
+def login(client, email):
+    response = client.post('/login', data={'email': email, 'password': 'pw'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app.test_client(), 'admin@example.com')
+
+
+@pytest.fixture(scope='module')
+def seeded(app):
+    """A page and a half of public prompts, a private and a pending premium one, favorites and a bundle"""
+    admin_client = login(app.test_client(), 'admin@example.com')
+    for i in range(odbyte.PAGE_SIZE + 6):
+        admin_client.post('/prompt/new', data={
+            'title': f'Debugging prompt {i}', 'description': 'Finds the bug', 'content': 'You are a debugger',
+            'tags': 'python, debug', 'category': 'Coding', 'ai_model': 'ChatGPT', 'visibility': 'public'})
+    admin_client.post('/prompt/new', data={
+        'title': 'Private notes', 'description': 'Mine', 'content': 'x', 'tags': 'notes',
+        'category': 'Writing', 'ai_model': 'Claude', 'visibility': 'private'})
+    admin_client.post('/prompt/2/submit-premium')
+    admin_client.post('/prompt/3/submit-premium')
+    admin_client.post('/admin/prompt/3/approve')
+    for prompt_id in (1, 2, 3, 4):
+        admin_client.post(f'/favorite/{prompt_id}')
+    admin_client.post('/bundle/new', data={'title': 'Debugging kit', 'description': 'd', 'prompts': ['1', '2', '3']})
+    with app.app_context():
+        return {'bundle_link': odbyte.PromptBundle.query.one().unique_link}
@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+import app as odbyte
+
+PRETTY_ARRAY = '''[
+  {
+    "title": "First", "description": "d", "content": "c"
+  },
+  {
+    "title": bad,
+    "description": "contains }], and brackets"
+  },
+  {
+    "title": "Third", "description": "d", "content": "c"
+  }
+]
+'''
+
+
+def parse(text, **kwargs):
+    return [(number, str(value) if isinstance(value, Exception) else value['title'])
+            for number, value in odbyte.iter_json_records(io.BytesIO(text.encode()), **kwargs)]
+
+
+@pytest.mark.parametrize('chunk_size', [65536, 3])
+def test_minified_array_resumes_at_next_element(chunk_size):
+    records = parse('[{"title":"a"},{"title": bad},{"title":"c"}]', chunk_size=chunk_size)
+    assert records == [(1, 'a'), (2, 'Invalid JSON: Expecting value'), (3, 'c')]
+
+
+@pytest.mark.parametrize('chunk_size', [65536, 5])
+def test_pretty_printed_array_reports_one_error_per_element(chunk_size):
+    records = parse(PRETTY_ARRAY, chunk_size=chunk_size)
+    assert records == [(1, 'First'), (2, 'Invalid JSON: Expecting value'), (3, 'Third')]
+
+
+@pytest.mark.parametrize('chunk_size', [65536, 4])
+def test_jsonl_resumes_on_next_line(chunk_size):
+    records = parse('{"title":"a"}\n{"title": bad}\n{"title":"c"}\n', chunk_size=chunk_size)
+    assert records == [(1, 'a'), (2, 'Invalid JSON: Expecting value'), (3, 'c')]
+
+
+def upload(client, data, filename):
+    response = client.post('/bulk-upload', data={'bulk_file': (io.BytesIO(data.encode()), filename)},
+                           content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_upload_json_array_reports_bad_element(admin_client):
+    report = upload(admin_client, PRETTY_ARRAY, 'prompts.json')
+    assert report['imported'] == 2 and report['failed'] == 1
+    assert report['errors'] == [{'record': 2, 'error': 'Invalid JSON: Expecting value'}]
+
+
+def test_upload_jsonl_reports_bad_lines(admin_client):
+    lines = [json.dumps({'title': 'Good', 'description': 'd', 'content': 'c'}), '{"title": bad}',
+             json.dumps({'title': 'No body'}), json.dumps({'title': 'Also good', 'description': 'd', 'content': 'c'})]
+    report = upload(admin_client, '\n'.join(lines), 'prompts.jsonl')
+    assert report['imported'] == 2 and report['failed'] == 2
+    assert report['errors'] == [{'record': 2, 'error': 'Invalid JSON: Expecting value'},
+                                {'record': 3, 'error': 'Missing description'}]
+
+
+def test_upload_csv_reports_bad_rows_by_line(admin_client):
+    rows = ('title,description,content,visibility\n'
+            'Good,d,c,public\n'
+            ',d,c,public\n'
+            'Hidden,d,c,secret\n'
+            'Also good,d,c,private\n')
+    report = upload(admin_client, rows, 'prompts.csv')
+    assert report['imported'] == 2 and report['failed'] == 2
+    assert report['errors'] == [{'record': 3, 'error': 'Missing title'},
+                                {'record': 4, 'error': 'Unknown visibility "secret"'}]
@@ -0,0 +1,115 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as odbyte
+
+db = odbyte.db
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        db.session.execute(db.delete(odbyte.Job))
+        db.session.commit()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    
+    def flaky(**payload):
+        calls.append(payload)
+        raise RuntimeError('boom')
+    
+    monkeypatch.setitem(odbyte.JOB_HANDLERS, 'flaky', (flaky, 3))
+    monkeypatch.setitem(odbyte.JOB_HANDLERS, 'noop', (lambda: None, 2))
+    return calls
+
+
+def queue(name, **kwargs):
+    row = odbyte.enqueue(name, **kwargs)
+    db.session.commit()
+    return row.id
+
+
+def get(job_id):
+    return db.session.get(odbyte.Job, job_id, populate_existing=True)
+
+
+def make_stale(job_id):
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    db.session.execute(db.update(odbyte.Job).where(odbyte.Job.id == job_id)
+                       .values(started_at=long_ago, heartbeat_at=long_ago))
+    db.session.commit()
+
+
+def test_failed_job_retries_with_backoff_until_max_attempts(ctx, calls):
+    job_id = queue('flaky', payload={'x': 1})
+    for attempt, delay in ((1, odbyte.JOB_RETRY_DELAY), (2, odbyte.JOB_RETRY_DELAY * 2)):
+        before = datetime.utcnow()
+        assert odbyte.run_job(odbyte.claim_job('w1')) == 'queued'
+        row = get(job_id)
+        assert row.attempts == attempt and row.locked_by is None and 'boom' in row.last_error
+        assert before + timedelta(seconds=delay) <= row.run_at <= datetime.utcnow() + timedelta(seconds=delay)
+        # Not due yet, so nothing to claim until the backoff has passed
+        assert odbyte.claim_job('w1') is None
+        row.run_at = datetime.utcnow()
+        db.session.commit()
+    
+    assert odbyte.run_job(odbyte.claim_job('w1')) == 'failed'
+    row = get(job_id)
+    assert row.attempts == 3 and row.finished_at is not None
+    assert calls == [{'x': 1}] * 3
+
+
+def test_job_with_expired_heartbeat_is_requeued(ctx, calls):
+    stale_id = queue('noop')
+    live_id = queue('noop')
+    odbyte.claim_job('w1')
+    odbyte.claim_job('w2')
+    make_stale(stale_id)
+    # Started long ago but still beating: the job is slow, not abandoned
+    db.session.execute(db.update(odbyte.Job).where(odbyte.Job.id == live_id)
+                       .values(started_at=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+    
+    assert odbyte.requeue_stale_jobs() == 1
+    stale, live = get(stale_id), get(live_id)
+    assert stale.status == 'queued' and stale.locked_by is None and 'Timed out' in stale.last_error
+    assert live.status == 'running' and live.locked_by == 'w2'
+    
+    # Out of attempts, a stale job fails instead
+    odbyte.claim_job('w3')
+    make_stale(stale_id)
+    assert odbyte.requeue_stale_jobs() == 1
+    assert get(stale_id).status == 'failed'
+
+
+def test_worker_that_lost_the_job_cannot_finish_it(ctx, calls):
+    job_id = queue('noop')
+    odbyte.claim_job('w1')
+    make_stale(job_id)
+    odbyte.requeue_stale_jobs()
+    assert odbyte.claim_job('w2').id == job_id
+    
+    assert odbyte.finish_job(job_id, 'w1') is None
+    assert odbyte.finish_job(job_id, 'w1', error='late failure') is None
+    row = get(job_id)
+    assert row.status == 'running' and row.locked_by == 'w2' and row.last_error.startswith('Timed out')
+    assert odbyte.finish_job(job_id, 'w2') == 'done'
+
+
+def test_heartbeat_only_bumps_the_holders_job(app, ctx, calls):
+    job_id = queue('noop')
+    odbyte.claim_job('w1')
+    make_stale(job_id)
+    with odbyte.JobHeartbeat(app, job_id, 'w2', interval=0.01):
+        time.sleep(0.1)
+    assert get(job_id).heartbeat_at < datetime.utcnow() - timedelta(minutes=30)
+    with odbyte.JobHeartbeat(app, job_id, 'w1', interval=0.01):
+        time.sleep(0.1)
+    assert get(job_id).heartbeat_at > datetime.utcnow() - timedelta(minutes=1)
+    assert odbyte.requeue_stale_jobs() == 0
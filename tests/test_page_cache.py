@@ -0,0 +1,82 @@
+import pytest
+
+import app as odbyte
+from conftest import login, make_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path, PAGE_CACHE_BACKEND='fake')
+    admin = login(app.test_client(), 'admin@example.com')
+    admin.post('/prompt/new', data={
+        'title': 'Cached prompt', 'description': 'd', 'content': 'c', 'tags': 'cache', 'category': 'Coding',
+        'ai_model': 'Claude', 'visibility': 'public'})
+    yield app
+    with app.app_context():
+        odbyte.db.engine.dispose()
+
+
+def stats_delta(before):
+    return {key: value - before[key] for key, value in odbyte.page_cache_stats.items()}
+
+
+def test_store_is_the_fake_shared_cache(app):
+    with app.app_context():
+        assert isinstance(odbyte.get_page_cache(), odbyte.FakeSharedCache)
+
+
+def test_second_anonymous_request_is_a_hit(app):
+    client = app.test_client()
+    before = dict(odbyte.page_cache_stats)
+    first = client.get('/explore')
+    second = client.get('/explore')
+    assert first.status_code == second.status_code == 200
+    assert second.data == first.data and b'Cached prompt' in second.data
+    delta = stats_delta(before)
+    assert delta['misses'] == 1 and delta['hits'] == 1
+    assert second.headers['X-SQL-Queries'] == '0'
+
+
+def test_etag_answers_304(app):
+    client = app.test_client()
+    etag = client.get('/explore').headers['ETag']
+    before = dict(odbyte.page_cache_stats)
+    response = client.get('/explore', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and not response.data
+    assert stats_delta(before)['not_modified'] == 1
+    assert client.get('/explore', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_cached_pages_vary_on_cookie(app):
+    response = app.test_client().get('/explore')
+    assert 'Cookie' in response.vary
+
+
+def test_logged_in_requests_bypass_the_cache(app):
+    client = login(app.test_client(), 'free@example.com')
+    before = dict(odbyte.page_cache_stats)
+    client.get('/explore')
+    client.get('/explore')
+    delta = stats_delta(before)
+    assert delta['bypassed'] == 2 and delta['hits'] == delta['misses'] == 0
+
+
+def test_editing_a_prompt_invalidates_cached_pages(app):
+    client = app.test_client()
+    etag = client.get('/explore').headers['ETag']
+    with app.app_context():
+        generation = odbyte.get_page_cache().get_counter('generation:prompts')
+        prompt_id = odbyte.Prompt.query.filter_by(title='Cached prompt').one().id
+    
+    response = login(app.test_client(), 'admin@example.com').post(f'/prompt/{prompt_id}/edit', data={
+        'title': 'Edited prompt', 'description': 'd', 'content': 'c', 'tags': 'cache', 'category': 'Coding',
+        'ai_model': 'Claude', 'visibility': 'public'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert odbyte.get_page_cache().get_counter('generation:prompts') == generation + 1
+    
+    before = dict(odbyte.page_cache_stats)
+    response = client.get('/explore', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and b'Edited prompt' in response.data
+    assert response.headers['ETag'] != etag
+    assert stats_delta(before)['misses'] == 1
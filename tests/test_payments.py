@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+import app as odbyte
+from conftest import login
+from fake_razorpay import FakeRazorpay
+from payments import RazorpayService
+
+
+@pytest.fixture(scope='module')
+def fake():
+    fake = FakeRazorpay(key_id=odbyte.RAZORPAY_KEY_ID, key_secret=odbyte.RAZORPAY_KEY_SECRET, webhook_secret='whsec')
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(autouse=True)
+def gateway(app, fake, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'payment_service', RazorpayService(
+        odbyte.RAZORPAY_KEY_ID, odbyte.RAZORPAY_KEY_SECRET, webhook_secret=fake.webhook_secret,
+        api_url=fake.url, backoff=0.01))
+    fake.latency = 0
+    fake.fail_first = 0
+
+
+def create_order(client, key, plan='monthly'):
+    return client.post('/create-order', json={'plan_type': plan}, headers={'Idempotency-Key': key})
+
+
+def poll(client, response, timeout=5):
+    deadline = time.monotonic() + timeout
+    while response.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.05)
+        response = client.get(response.get_json()['poll_url'])
+    return response
+
+
+def payment_count(app, order_id):
+    with app.app_context():
+        return odbyte.Payment.query.filter_by(order_id=order_id).count()
+
+
+def test_create_order(admin_client, fake):
+    response = create_order(admin_client, 'create')
+    assert response.status_code == 200
+    order = response.get_json()
+    assert order['status'] == 'created' and order['amount'] == odbyte.PLAN_PRICES['monthly']
+    assert fake.orders[order['order_id']]['amount'] == order['amount']
+
+
+def test_retry_with_same_key_returns_same_order(admin_client, fake):
+    # The first two gateway requests fail with 503 and are retried under the same Idempotency-Key
+    fake.fail_first = fake.request_count + 2
+    first = create_order(admin_client, 'retry', plan='annual')
+    assert first.status_code == 200
+    orders = len(fake.orders)
+    second = create_order(admin_client, 'retry', plan='annual')
+    assert second.get_json()['order_id'] == first.get_json()['order_id']
+    assert len(fake.orders) == orders
+
+
+def test_gateway_down_fails_order_after_pending(app, admin_client, fake, monkeypatch):
+    monkeypatch.setitem(app.config, 'PAYMENT_ORDER_WAIT', 0.01)
+    fake.latency = 0.1
+    fake.fail_first = fake.request_count + 100
+    response = create_order(admin_client, 'down')
+    assert response.status_code == 202 and response.get_json()['status'] == 'pending'
+    response = poll(admin_client, response)
+    assert response.status_code == 502 and response.get_json()['status'] == 'failed'
+
+
+def test_webhook_and_callback_complete_order_once(app, fake):
+    client = login(app.test_client(), 'free@example.com')
+    order_id = create_order(client, 'pay').get_json()['order_id']
+    body, signature = fake.webhook('payment.captured', order_id, 'pay_1')
+    headers = {'X-Razorpay-Signature': signature, 'Content-Type': 'application/json'}
+    
+    assert app.test_client().post('/webhooks/razorpay', data=body, headers=headers).status_code == 200
+    assert app.test_client().post('/webhooks/razorpay', data=body, headers=headers).status_code == 200
+    response = client.post('/payment-success', data={'razorpay_payment_id': 'pay_1', 'razorpay_order_id': order_id,
+                                                     'razorpay_signature': fake.sign_payment(order_id, 'pay_1')})
+    assert response.status_code == 302 and response.location.endswith('/success')
+    
+    assert payment_count(app, order_id) == 1
+    with app.app_context():
+        assert odbyte.User.query.filter_by(email='free@example.com').one().plan == 'premium'
+
+
+def test_webhook_with_bad_signature_is_rejected(app, admin_client, fake):
+    order_id = create_order(admin_client, 'forged').get_json()['order_id']
+    body, _ = fake.webhook('payment.captured', order_id)
+    response = app.test_client().post('/webhooks/razorpay', data=body,
+                                      headers={'X-Razorpay-Signature': 'forged', 'Content-Type': 'application/json'})
+    assert response.status_code == 400
+    assert payment_count(app, order_id) == 0
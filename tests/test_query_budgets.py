@@ -0,0 +1,65 @@
+import pytest
+
+import app as odbyte
+from conftest import login
+
+
+def sql_queries(response):
+    assert response.status_code == 200, (response.request.path, response.status_code)
+    return int(response.headers['X-SQL-Queries'])
+
+
+@pytest.mark.parametrize('path', [
+    '/',
+    '/explore',
+    '/explore?category=Coding&sort=popular',
+    '/explore?search=debug',
+    '/explore/more',
+    '/dashboard',
+    '/dashboard/more',
+    '/favorites',
+    '/favorites/more',
+    '/bundles',
+    '/bundle/1',
+    '/admin',
+    '/admin/more/pending',
+    '/admin/more/approved',
+    '/api/v1/prompts',
+    '/api/v1/search?q=debug',
+    '/api/v1/prompts/batch?ids=1,2,3',
+    '/api/v1/prompts/1',
+    '/api/v1/favorites',
+])
+def test_logged_in_routes_stay_within_budget(admin_client, seeded, path):
+    # Over budget raises QueryBudgetExceeded under TESTING, failing the request
+    assert sql_queries(admin_client.get(path)) > 0
+
+
+@pytest.mark.parametrize('path', ['/', '/explore', '/explore/more', '/api/v1/prompts', '/api/v1/prompts/4'])
+def test_anonymous_routes_stay_within_budget(app, seeded, path):
+    sql_queries(app.test_client().get(path))
+
+
+def test_shared_bundle_stays_within_budget(app, seeded):
+    link = seeded['bundle_link']
+    sql_queries(app.test_client().get(f'/b/{link}'))
+    sql_queries(app.test_client().get(f'/api/v1/bundles/{link}'))
+
+
+def test_free_user_sees_premium_prompt_within_budget(app, seeded):
+    client = login(app.test_client(), 'free@example.com')
+    sql_queries(client.get('/dashboard'))
+    assert client.get('/api/v1/prompts/3').status_code == 403
+
+
+def test_budget_overrun_raises(app, admin_client, seeded, monkeypatch):
+    monkeypatch.setitem(app.config, 'SQL_QUERY_BUDGETS', {**app.config['SQL_QUERY_BUDGETS'], 'main.explore': 0})
+    with pytest.raises(odbyte.QueryBudgetExceeded, match='main.explore ran'):
+        admin_client.get('/explore')
+
+
+def test_budget_overrun_only_warns_outside_testing(app, admin_client, seeded, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, 'SQL_QUERY_BUDGETS', {**app.config['SQL_QUERY_BUDGETS'], 'main.explore': 0})
+    monkeypatch.setattr(app, 'testing', False)
+    assert admin_client.get('/explore').status_code == 200
+    assert 'main.explore ran' in caplog.text
@@ -0,0 +1,14 @@
+import app as odbyte
+
+
+def test_hot_queries_use_indexes(app):
+    with app.app_context():
+        plans = odbyte.check_query_plans()
+    assert plans
+    assert {name: problems for name, problems in plans.items() if problems} == {}
+
+
+def test_check_query_plans_command(app):
+    result = app.test_cli_runner().invoke(args=['check-query-plans'])
+    assert result.exit_code == 0, result.output
+    assert 'FAIL' not in result.output
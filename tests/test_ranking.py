@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import app as odbyte
+from conftest import login
+
+db = odbyte.db
+
+
+def test_recount_favorites_rebuilds_cached_cards(app):
+    client = login(app.test_client(), 'admin@example.com')
+    client.post('/prompt/new', data={
+        'title': 'Counted prompt', 'description': 'd', 'content': 'c', 'tags': 'count', 'category': 'Coding',
+        'ai_model': 'Claude', 'visibility': 'public'})
+    with app.app_context():
+        prompt = odbyte.Prompt.query.filter_by(title='Counted prompt').one()
+        prompt_id, updated_at = prompt.id, prompt.updated_at
+    assert '❤️' not in client.get('/explore').get_data(as_text=True)
+    
+    # A favorite written behind favorite_count's back, as after a crash or a manual fix
+    with app.app_context():
+        db.session.add(odbyte.Favorite(user_id=2, prompt_id=prompt_id, created_at=datetime.utcnow()))
+        db.session.commit()
+        assert odbyte.recount_favorites() == 1
+        assert odbyte.recompute_trending() == 1
+        db.session.commit()
+        prompt = db.session.get(odbyte.Prompt, prompt_id)
+        assert prompt.favorite_count == 1 and prompt.trending_score > 0
+        assert prompt.updated_at > updated_at
+    
+    assert '❤️ 1' in client.get('/explore').get_data(as_text=True)
@@ -0,0 +1,60 @@
+import pytest
+
+import app as odbyte
+from conftest import login, make_app
+
+SEARCH_LIMITS = {'anonymous': '2/minute', 'default': '3/minute', 'diamond': '5/minute'}
+
+
+@pytest.fixture
+def app(tmp_path):
+    limits = {**odbyte.RATE_LIMIT_DEFAULTS, 'search': SEARCH_LIMITS}
+    app = make_app(tmp_path, RATE_LIMIT_BACKEND='fake', RATE_LIMITS=limits)
+    yield app
+    with app.app_context():
+        odbyte.db.engine.dispose()
+
+
+def search_until_limited(client, limit=20):
+    """Number of searches allowed before the first 429, and that 429"""
+    for allowed in range(limit):
+        response = client.get('/api/v1/search?q=debug')
+        if response.status_code == 429:
+            return allowed, response
+        assert response.status_code == 200
+    raise AssertionError(f'No 429 after {limit} requests')
+
+
+def test_store_is_the_fake_shared_store(app):
+    with app.app_context():
+        assert isinstance(odbyte.get_rate_limit_store(), odbyte.FakeSharedRateLimitStore)
+
+
+@pytest.mark.parametrize('email, allowed', [('admin@example.com', 5), ('free@example.com', 3)])
+def test_limit_follows_the_users_plan(app, email, allowed):
+    assert search_until_limited(login(app.test_client(), email))[0] == allowed
+
+
+def test_limited_response_has_retry_after(app):
+    client = login(app.test_client(), 'free@example.com')
+    _, response = search_until_limited(client)
+    # 3/minute refills a token every 20 seconds
+    assert response.headers['Retry-After'] == '20'
+    assert response.get_json() == {'error': 'Too many requests, try again in 20 seconds.'}
+    html = client.get('/api/v1/search?q=debug', headers={'Accept': 'text/html'})
+    assert html.status_code == 429 and html.mimetype == 'text/plain'
+
+
+def test_users_have_separate_buckets(app):
+    search_until_limited(login(app.test_client(), 'free@example.com'))
+    assert login(app.test_client(), 'admin@example.com').get('/api/v1/search?q=debug').status_code == 200
+
+
+def test_anonymous_requests_share_a_bucket_per_ip(app):
+    allowed, response = search_until_limited(app.test_client())
+    assert allowed == 2 and response.headers['Retry-After'] == '30'
+    # A new client from the same address gets the same bucket, another address its own
+    assert app.test_client().get('/api/v1/search?q=debug').status_code == 429
+    other = app.test_client()
+    other.environ_base['REMOTE_ADDR'] = '10.0.0.2'
+    assert search_until_limited(other)[0] == 2
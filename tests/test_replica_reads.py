@@ -0,0 +1,76 @@
+import pytest
+
+import app as odbyte
+from conftest import login, make_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path, DATABASE_REPLICA_URL=f'sqlite:///{tmp_path / "replica.db"}',
+                   PAGE_CACHE_BACKEND='local', PAGE_CACHE_TTL=60)
+    sync_replica(app)
+    yield app
+    with app.app_context():
+        for engine in odbyte.db.engines.values():
+            engine.dispose()
+
+
+def sync_replica(app):
+    result = app.test_cli_runner().invoke(args=['sync-replica'])
+    assert result.exit_code == 0, result.output
+
+
+def new_prompt(client, title):
+    response = client.post('/prompt/new', data={
+        'title': title, 'description': 'd', 'content': 'c', 'tags': 'replica', 'category': 'Coding',
+        'ai_model': 'Claude', 'visibility': 'public'})
+    assert response.status_code == 302
+    with client.application.app_context():
+        return odbyte.Prompt.query.filter_by(title=title).one().id
+
+
+def test_reads_go_to_replica_until_this_browser_writes(app):
+    writer = login(app.test_client(), 'admin@example.com')
+    prompt_id = new_prompt(writer, 'Fresh prompt')
+    
+    # The writer is pinned to the primary and sees its own write
+    before = dict(odbyte.db_routing_stats)
+    response = writer.get(f'/prompt/{prompt_id}')
+    assert response.status_code == 200 and b'Fresh prompt' in response.data
+    assert odbyte.db_routing_stats['sticky_requests'] == before['sticky_requests'] + 1
+    
+    # Another browser reads the replica, which has not caught up
+    reader = app.test_client()
+    assert reader.get(f'/prompt/{prompt_id}').status_code == 404
+    assert odbyte.db_routing_stats['replica_reads'] > before['replica_reads']
+    
+    # Once the sticky window ends the writer reads the replica too
+    with writer.session_transaction() as session:
+        session['read_primary_until'] = 0
+    assert writer.get(f'/prompt/{prompt_id}').status_code == 404
+    
+    sync_replica(app)
+    assert reader.get(f'/prompt/{prompt_id}').status_code == 200
+
+
+def test_page_from_lagging_replica_is_not_cached_after_invalidation(app):
+    reader = app.test_client()
+    assert reader.get('/explore').status_code == 200
+    new_prompt(login(app.test_client(), 'admin@example.com'), 'Fresh prompt')
+    
+    before = dict(odbyte.page_cache_stats)
+    response = reader.get('/explore')
+    assert b'Fresh prompt' not in response.data
+    assert odbyte.page_cache_stats['replica_skipped'] == before['replica_skipped'] + 1
+    
+    sync_replica(app)
+    assert b'Fresh prompt' in reader.get('/explore').data
+    
+    # Once the invalidation is older than REPLICA_STICKY_SECONDS, replica pages are cached again
+    with app.app_context():
+        odbyte.get_page_cache().delete('invalidated:prompts')
+    before = dict(odbyte.page_cache_stats)
+    reader.get('/explore')
+    assert b'Fresh prompt' in reader.get('/explore').data
+    assert odbyte.page_cache_stats['hits'] == before['hits'] + 1
+    assert odbyte.page_cache_stats['replica_skipped'] == before['replica_skipped']